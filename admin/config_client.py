@@ -68,10 +68,17 @@ if __name__ == '__main__':
     parser.add_option("--list", action="store_true", help="Lists all available config items.")
     parser.add_option("--set", help="Sets the config item for the given key with the given value (KEY=VALUE).")
     parser.add_option("--interactive", action="store_true", help="Starts this client in an interactive shell mode.")
+    parser.add_option("--snapshot", help="Lists the config items from the given snapshot file (e.g. deploy/config.snapshot) instead of asking the server. Only works on the AM's host.")
     parser.add_option("--cert", help="Specifies the certificate which is used to connect. (in PEM format, defaults to 'admin-cert.pem')", default="admin-cert.pem")
     parser.add_option("--key", help="Specifies the private key used to sign the messages sent. (in PEM format, defaults to 'admin-key.pem')", default="admin-key.pem")
     opts, args = parser.parse_args(sys.argv)
 
+    if opts.snapshot: # read the snapshot directly, no need to connect to the server
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'plugins', 'configdb'))
+        from configsnapshot import ConfigSnapshot
+        print_configs(ConfigSnapshot(opts.snapshot).items(), False)
+        sys.exit(0)
+
     if len(args) == 1:
         print "Assuming default host %s" % (DEFAULT_HOST_AND_PORT,)
         host_name = DEFAULT_HOST_AND_PORT
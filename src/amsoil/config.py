@@ -11,14 +11,31 @@ SRC_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
 ROOT_PATH = os.path.normpath(os.path.join(SRC_PATH, '..'))
 PLUGINS_PATH = os.path.join(SRC_PATH, 'plugins')
 
+##Plugins
+PLUGIN_SETUP_THREADS = 1 # number of threads which run independent setup() methods concurrently (1 runs them one after another, see pluginmanager.py before increasing it)
+PLUGIN_INDEX_PATH = "%s/deploy/plugin_index.json" % (ROOT_PATH,) # cache of the manifests and the load order, rebuilt automatically when a plugin changes
+
+##Metrics
+SERVICE_METRICS = False # if True, all calls of methods marked with @serviceinterface are counted and timed (see amsoil/core/metrics.py)
+
 ##Logging
 LOG_LEVEL = logging.DEBUG
 LOG_FORMAT = "%(asctime)s [%(levelname)s] - %(message)s"
 LOG_FILE = "%s/log/amsoil.log" % (ROOT_PATH,)
+LOG_QUEUE = True # write the log file from a background thread (see amsoil/core/log.py)
+LOG_QUEUE_SIZE = 10000 # maximum number of records waiting to be written
+LOG_QUEUE_POLICY = 'block' # if the queue is full: 'block' the caller, 'drop_debug' records (block for others) or drop and 'count' the records
+LOG_FLUSH_RECORDS = 200 # write a batch when this many records are waiting...
+LOG_FLUSH_INTERVAL = 0.5 # ...or when the first record of the batch is this old (in seconds)
+STARTUP_PROFILE_FILE = "%s/log/startup_profile.json" % (ROOT_PATH,) # written when main.py is started with --profile-startup
 
 ##CONFIGDB
 CONFIGDB_PATH = "%s/deploy/config.db" % (ROOT_PATH,)
 CONFIGDB_ENGINE = "sqlite:///%s" % (CONFIGDB_PATH,)
+CONFIGDB_CACHE_STALENESS = 1.0 # seconds until the config service notices changes made by other processes (see ConfigDB)
+CONFIGDB_SNAPSHOT_PATH = "%s/deploy/config.snapshot" % (ROOT_PATH,) # read-only copy of the config, written after changes (None disables it)
+CONFIGDB_SNAPSHOT_DELAY = 1.0 # seconds between a change and the export of the snapshot, all changes made meanwhile are written at once
+CONFIGDB_SNAPSHOT_ROLES = ['worker', 'admin'] # processes with these roles read the config from the snapshot (if it exists) instead of the database
 IS_MULTIPROCESS = True
 
 ##IPC related parameters
@@ -1,3 +1,20 @@
+import sys
+
+from amsoil import config
+
 def serviceinterface(func):
+  """
+  Marks the given method/function as part of a service's interface.
+  If SERVICE_METRICS is enabled in config.py, the calls are recorded in the metrics registry (see amsoil.core.metrics).
+  """
+  if config.SERVICE_METRICS:
+    from amsoil.core import metrics
+    func = metrics.instrument(func, _interfaceName(func, sys._getframe(1)))
   func._serviceinterface = True
   return func
+
+def _interfaceName(func, callerFrame):
+  """Returns "ClassName.method" if the decorator is used in a class body (the caller's frame is the class body), otherwise "module.function"."""
+  if ('__module__' in callerFrame.f_locals) and (callerFrame.f_code.co_name != '<module>'):
+    return "%s.%s" % (callerFrame.f_code.co_name, func.__name__)
+  return "%s.%s" % (func.__module__, func.__name__)
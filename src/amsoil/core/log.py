@@ -9,6 +9,20 @@ whereby SOMENAME represents an optional prefix for the logging messages (e.g. 'x
 Configuration
 Please see the config.py file in the root/src-folder.
 
+Asynchronous writing
+If LOG_QUEUE is enabled in the config.py, the logging calls do not write to the log file themselves.
+The records are put into a queue (see QueueHandler) and a background thread writes them in batches to the log file.
+A batch is written when LOG_FLUSH_RECORDS records are waiting or LOG_FLUSH_INTERVAL seconds have passed since the first record of the batch.
+The message (including its arguments and the exception's traceback) is rendered before the record is queued.
+LOG_QUEUE_POLICY determines what happens if the queue is full (LOG_QUEUE_SIZE records):
+    'block' the logging call waits until there is space in the queue (no record is lost)
+    'drop_debug' DEBUG records are dropped, all other records wait for space
+    'count' the record is dropped
+Dropped records are counted and the count is written to the log with the next batch.
+When the process exits, all queued records are written. The background thread does not survive a fork (e.g. by the pre-forked server or flup).
+Hence, the handler compares the current pid with the one of its background thread and starts a new thread in a forked process before
+the first record is queued (no fork site needs to call anything).
+
 Rationale
 After long discussions logging is a core service.
 The main reason for having logging as a core service is that the pluginmanager should be
@@ -17,6 +31,10 @@ edit the log config (level, file, etc.). If you had a plugin for it, the config-
 when the pluginmanager loads.
 """
 import logging, logging.handlers
+import os
+import threading
+import Queue
+import time
 
 from amsoil import config
 
@@ -39,11 +57,173 @@ class PrefixAdapter(logging.LoggerAdapter):
     def process(self, msg, kwargs):
         prefix = self.extra["prefix"]
         return ("[%s] %s" % (prefix, msg), kwargs)
-        
+
+POLICY_BLOCK = 'block'
+POLICY_DROP_DEBUG = 'drop_debug'
+POLICY_COUNT = 'count'
+
+FLUSH_TIMEOUT = 5.0 # seconds to wait for the background thread when flushing/closing
+
+class QueueHandler(logging.Handler):
+    """
+    Handler which queues the records, so a background thread can write them in batches to the {target} (a RotatingFileHandler).
+    Please see the module documentation for the parameters.
+    """
+    def __init__(self, target, queueSize, policy, flushRecords, flushInterval):
+        logging.Handler.__init__(self)
+        if not policy in (POLICY_BLOCK, POLICY_DROP_DEBUG, POLICY_COUNT):
+            raise ValueError("unknown log queue policy %s" % (policy,))
+        self._target = target
+        self._queueSize = queueSize
+        self._policy = policy
+        self._flushRecords = flushRecords
+        self._flushInterval = flushInterval
+        self._forkLock = threading.Lock() # only held while restarting the background thread
+        self._startWriter()
+
+    def _startWriter(self):
+        self._pid = os.getpid()
+        self._queue = Queue.Queue(self._queueSize)
+        self._dropped = 0
+        self._reportedDropped = 0
+        self._writer = threading.Thread(target=self._write, name='log writer')
+        self._writer.daemon = True
+        self._writer.start()
+
+    @property
+    def dropped(self):
+        """The number of records which have been dropped because the queue was full."""
+        return self._dropped
+
+    def handle(self, record):
+        self._checkFork() # before acquiring the handler's lock, which may have been held during the fork
+        return logging.Handler.handle(self, record)
+
+    def emit(self, record):
+        try:
+            self._prepare(record)
+        except:
+            self.handleError(record)
+            return
+        if (self._policy == POLICY_BLOCK) or ((self._policy == POLICY_DROP_DEBUG) and (record.levelno > logging.DEBUG)):
+            self._queue.put(record)
+            return
+        try:
+            self._queue.put_nowait(record)
+        except Queue.Full:
+            self._dropped += 1 # not exact if two threads drop at the same time, but good enough for the report
+
+    def _prepare(self, record):
+        """Renders the message and the traceback now, the arguments may have changed until the record is written."""
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._target.formatter.formatException(record.exc_info)
+            record.exc_info = None
+
+    def flush(self):
+        """Blocks until all records queued so far have been written (at most FLUSH_TIMEOUT seconds)."""
+        self._checkFork()
+        if not self._writer.is_alive():
+            return
+        written = threading.Event()
+        self._queue.put(written)
+        written.wait(FLUSH_TIMEOUT)
+
+    def close(self):
+        """Writes the remaining records and stops the background thread."""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(FLUSH_TIMEOUT)
+        self._target.close()
+        logging.Handler.close(self)
+
+    def _checkFork(self):
+        """Restarts the background thread if this is a forked process (the queue and the locks are replaced, since they may have been held during the fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._forkLock:
+            if self._pid == os.getpid(): # another thread of this process was faster
+                return
+            self.createLock()
+            self._target.createLock()
+            self._startWriter()
+
+    def _write(self):
+        """Runs in the background thread. Collects the records and writes them in batches."""
+        batch = []
+        batchStart = None
+        while True:
+            try:
+                if batch:
+                    item = self._queue.get(True, max(0, batchStart + self._flushInterval - time.time()))
+                else:
+                    item = self._queue.get()
+            except Queue.Empty:
+                item = False # time to write the batch
+            if isinstance(item, logging.LogRecord):
+                if not batch:
+                    batchStart = time.time()
+                batch.append(item)
+                if len(batch) < self._flushRecords:
+                    continue
+            self._writeBatch(batch)
+            batch = []
+            if isinstance(item, threading._Event):
+                item.set()
+            elif item is None:
+                return
+
+    def _writeBatch(self, records):
+        """Writes the records with one write call (rotates the file if needed)."""
+        lines = []
+        for record in records:
+            try:
+                line = self._target.format(record)
+                if isinstance(line, unicode):
+                    line = line.encode('utf-8')
+                lines.append(line)
+            except:
+                self.handleError(record)
+        dropped = self._dropped
+        if dropped != self._reportedDropped:
+            lines.append(self._target.format(logging.makeLogRecord({ 'name' : LOGGER_NAME, 'levelno' : logging.WARNING, 'levelname' : 'WARNING',
+                'msg' : "[log] %i log records have been dropped, because the log queue was full" % (dropped - self._reportedDropped,) })))
+            self._reportedDropped = dropped
+        if not lines:
+            return
+        text = "\n".join(lines) + "\n"
+        target = self._target
+        target.acquire()
+        try:
+            if target.stream is None:
+                target.stream = target._open()
+            if (target.maxBytes > 0) and (target.stream.tell() + len(text) >= target.maxBytes):
+                target.doRollover()
+            target.stream.write(text)
+            target.stream.flush()
+        except:
+            self.handleError(records[0] if records else None)
+        finally:
+            target.release()
+
+def afterFork():
+    """Restarts the background thread right away in a forked process (optional, the handler notices the fork itself, see module documentation)."""
+    if isinstance(lhandle, QueueHandler):
+        lhandle._checkFork()
+
+def flush():
+    """Writes all log records which have been queued so far (e.g. before the process exits via os._exit)."""
+    lhandle.flush()
+
 # initialziation
-lhandle = logging.handlers.RotatingFileHandler(config.LOG_FILE, maxBytes = 1000000)
+fhandle = logging.handlers.RotatingFileHandler(config.LOG_FILE, maxBytes = 1000000)
+fhandle.setFormatter(logging.Formatter(config.LOG_FORMAT))
+if config.LOG_QUEUE:
+    lhandle = QueueHandler(fhandle, config.LOG_QUEUE_SIZE, config.LOG_QUEUE_POLICY, config.LOG_FLUSH_RECORDS, config.LOG_FLUSH_INTERVAL)
+else:
+    lhandle = fhandle
 lhandle.setLevel(config.LOG_LEVEL)
-lhandle.setFormatter(logging.Formatter(config.LOG_FORMAT))
 logger = getLogger()
 logger.addHandler(lhandle)
 logger.setLevel(config.LOG_LEVEL)
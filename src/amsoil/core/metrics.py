@@ -0,0 +1,125 @@
+"""
+This module provides an in-process registry for service-call metrics.
+If SERVICE_METRICS is enabled in config.py, each method/function which is decorated with @serviceinterface records
+its number of calls, the number of calls which raised an exception, the number of calls currently running and a latency histogram.
+The metrics are kept per name, which is "ClassName.method" for methods and "module.function" for functions.
+They are collected per process (e.g. the RPC server and the worker have their own registry).
+
+Plugins can access the registry via the metrics service (see the metrics plugin).
+
+Example code:
+    import amsoil.core.pluginmanager as pm
+    metrics = pm.getService('metrics')
+    for name, metric in metrics.snapshot().iteritems():
+        print name, metric['count'], metric['errors'], metric['total'] / max(1, metric['count'])
+    print metrics.get('ConfigDB.get')['histogram'] # [(0.001, 120), (0.005, 3), ..., (None, 0)]
+"""
+import time
+import threading
+import functools
+
+# upper bounds of the latency histogram's buckets (in seconds), slower calls are counted in an additional bucket (with the bound None)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+_metrics = {}
+_metricsLock = threading.Lock()
+
+class _Metric(object):
+    """Internal class which holds the numbers for one name. Please use snapshot() or get() to read them."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.inFlight = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def enter(self):
+        with self._lock:
+            self.inFlight += 1
+
+    def leave(self, duration, failed):
+        bucket = len(LATENCY_BUCKETS)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                bucket = index
+                break
+        with self._lock:
+            self.inFlight -= 1
+            self.count += 1
+            if failed:
+                self.errors += 1
+            self.total += duration
+            self.max = max(self.max, duration)
+            self.buckets[bucket] += 1
+
+    def asDict(self):
+        with self._lock:
+            return {
+                'count' : self.count,
+                'errors' : self.errors,
+                'in_flight' : self.inFlight,
+                'total' : self.total,
+                'max' : self.max,
+                'histogram' : zip(list(LATENCY_BUCKETS) + [None], self.buckets) }
+
+def _metric(name):
+    with _metricsLock:
+        if not name in _metrics:
+            _metrics[name] = _Metric()
+        return _metrics[name]
+
+def instrument(func, name):
+    """
+    Returns a wrapper for {func} which records each call under the given {name}.
+    This is used by the @serviceinterface decorator, there should not be a need to call this directly.
+    """
+    metric = _metric(name)
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        metric.enter()
+        failed = True
+        startTime = time.time()
+        try:
+            result = func(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            metric.leave(time.time() - startTime, failed)
+    return wrapper
+
+def names():
+    """Returns the names of all instrumented methods/functions."""
+    with _metricsLock:
+        return _metrics.keys()
+
+def get(name):
+    """
+    Returns the metrics for the given {name} as dict or None if there is no instrumented method/function with this name.
+    {'count' : calls, 'errors' : calls which raised, 'in_flight' : currently running calls, 'total' : sum of latencies (sec), 'max' : maximum latency (sec),
+     'histogram' : [(upper bound in sec, calls), ..., (None, calls slower than the last bound)]}
+    """
+    with _metricsLock:
+        metric = _metrics.get(name)
+    if metric is None:
+        return None
+    return metric.asDict()
+
+def snapshot():
+    """Returns a dict with the metrics (see get()) of all instrumented methods/functions by name."""
+    with _metricsLock:
+        metrics = _metrics.items()
+    return dict([(name, metric.asDict()) for name, metric in metrics])
+
+def reset():
+    """Resets the numbers of all metrics (the calls which are currently running are still counted as in flight)."""
+    with _metricsLock:
+        metrics = _metrics.values()
+    for metric in metrics:
+        with metric._lock:
+            metric.count = 0
+            metric.errors = 0
+            metric.total = 0.0
+            metric.max = 0.0
+            metric.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
@@ -15,6 +15,13 @@ Each plugin need a manifest (see below) and a module called plugin at root level
 Plugin Setup
 After resolving the dependencies (determined by the manifest) of the plugin, the setup() method of the plugin module is called.
 This would be a good place to register the plugin's services.
+The dependency graph is built once from the loads-after entries of all manifests. By default, the setup() methods are called one after
+another in this order. If PLUGIN_SETUP_THREADS (config.py) is larger than 1, plugins whose loads-after services are all available are
+set up concurrently on a small thread pool. Only enable this if the setup() methods of all deployed plugins can run in parallel:
+a setup() method must not rely on any service which is not listed in its plugin's loads-after.
+Please note that the parallel mode does not make the start of the plugins in this repository faster: their setup() methods mostly
+import modules and Python 2 holds a global import lock while importing, so the setups are serialized anyway.
+It only helps setups which wait for I/O outside of imports (e.g. a request to a remote server).
 
 Manifests
 Each plugin in the plugins directory requires a file named "MANIFEST.json".
@@ -26,11 +33,35 @@ Example:
     "implements" : ["authorization"],
     "loads-after" : ["config"],
     "requires" : ["policy"],
-    "multi-process-supported" : false
+    "multi-process-supported" : false,
+    "lazy" : true,
+    "roles" : ["rpc", "worker"]
     
-    (The last line is optional)
+    (The last three lines are optional)
     -> The plugin needs the config service when its setup() method is called.
     -> It will register the service authorization and somewhere in its code it will use the policy service.
+    -> The plugin is only loaded when one of its services is used for the first time (see Lazy Plugins below).
+    -> The plugin is needed by the RPC server process and by the worker process (see Roles below).
+
+Lazy Plugins
+A plugin which sets "lazy" to true in its manifest is not loaded during init, unless another (non-lazy) plugin needs it during
+its setup (via loads-after). Instead, the plugin (and all the plugins it loads after) is loaded and set up when one of its services
+is retrieved via getService for the first time. This saves startup time and memory in processes which never use the plugin.
+getService(name, lazy=True) returns a lightweight proxy for a service which has not been loaded yet. The plugin behind the proxy
+is loaded on the first attribute access (or call) of the proxy.
+
+Plugin Index
+Reading all manifests on each start is slow on slow (e.g. network-mounted) volumes. Hence, init writes a plugin index (see PLUGIN_INDEX_PATH in config.py),
+which contains the manifests, the resolved load order, the service-to-plugin map and the path of each plugin's bootstrap module.
+On the next start the index is used instead of walking the plugins directory. It is rebuilt automatically if the modification time
+of the plugins directory or of one of the manifests has changed (i.e. a plugin was added, removed or its manifest was changed).
+The index is not specific to a role, roles are applied after loading it.
+
+Roles
+AMsoil runs different kinds of processes (e.g. the RPC server and the worker), which do not need all plugins.
+init can be given a role (e.g. ROLE_RPC or ROLE_WORKER). Then, only the plugins which list the role in their manifest's "roles"
+are considered, plus all plugins they (transitively) load after or require. All other plugins are ignored and their services are not available.
+A plugin without "roles" belongs to every role. If no role is given to init, all plugins are considered.
 """
 
 
@@ -40,9 +71,13 @@ import traceback
 import os, os.path
 import json
 import imp
+import time
+import threading
+import Queue
 
 from amsoil import config
 from amsoil.core.exception import CoreException
+from amsoil.core import profiler
 
 import amsoil.core.log
 logger=amsoil.core.log.getLogger('pluginmanager')
@@ -89,15 +124,29 @@ class ServiceNameNotFoundInManifestError(PluginException):
 
 _pluginList = []
 _serviceRegistry = {}
-_currentSetupPluginInfo = None # in order to avoid passing pluginInfos to the setup methods of plugins, we remember
-# a reference to the current pluginInfo during the plugin setup. If there is not setup method being called this variable should be None.
+_serviceRegistryLock = threading.Lock()
+_serviceProviders = {} # service name -> pluginInfo of the plugin which implements the service
+_deferredServices = {} # service name -> pluginInfo of the lazy plugin which has not been loaded yet
+_deferredLock = threading.RLock() # held while setting up lazy plugins (reentrant, because a setup may retrieve other lazy services)
+_deferredSetups = set() # pluginInfos of the lazy plugins which are being set up (by the thread holding _deferredLock)
+_role = None # the role given to init (None if all plugins are loaded)
+_setupContext = threading.local() # in order to avoid passing pluginInfos to the setup methods of plugins, we remember
+# a reference to the current pluginInfo during the plugin setup (in _setupContext.pluginInfo). If there is not setup method being called
+# by the current thread this attribute should be None. Since setup methods may run concurrently, the reference is kept per thread.
 # This is a pure convenience for the plugin-developer, so he does not have to pass the pluginInfo back to registerService
 # (registerService needs info from the PluginInfo so it can validate the user's parameters).
 
 MANIFEST_FILENAME='MANIFEST.json'
+PLUGIN_INDEX_VERSION=1
 IMPLEMENTS_KEY='implements'
 LOADS_AFTER_KEY='loads-after'
 MULTIPROCESS_SUPPORTED_KEY="multi-process-supported"
+LAZY_KEY='lazy'
+ROLES_KEY='roles'
+
+ROLE_RPC='rpc'
+ROLE_WORKER='worker'
+ROLE_ADMIN='admin'
 
 REQUIRES_KEY='requires'
 BOOTSTRAP_MODULE_NAME='plugin'
@@ -108,13 +157,16 @@ class PluginInfo(object):
     This class handles one plugin's data and the setup/loading of a plugin.
     serviceNames **and** dependencies are service names. They are arbitrary and do not necessarly need correspond to the plugin's name.
     """
-    def __init__(self, pluginPath, manifest):
+    def __init__(self, pluginPath, manifest, bootstrap=None):
         """
         Receives the path of the plugin, service names provided by the plugin and a list of dependencies.
+        {bootstrap} is the (filename, description) of the bootstrap module as returned by imp.find_module (see Plugin Index above).
+        If it is None, the module is searched for in the plugin's folder during setup.
         """
         # we could check the format of serviceNames and dependencies here, but I dont yet
         try:
             self._pluginPath = pluginPath
+            self._manifest = manifest
             self._serviceNames = manifest[IMPLEMENTS_KEY]
             self._loadsAfter = manifest[LOADS_AFTER_KEY]
             self._requires = manifest[REQUIRES_KEY]
@@ -122,72 +174,100 @@ class PluginInfo(object):
                 self._supports_multiprocess = manifest[MULTIPROCESS_SUPPORTED_KEY]
             else:
                 self._supports_multiprocess = True
+            self._lazy = bool(manifest.get(LAZY_KEY, False))
+            self._roles = manifest.get(ROLES_KEY, None)
         except KeyError, e:
-            raise PluginMalformedManifestError(path)
+            raise PluginMalformedManifestError(os.path.basename(pluginPath))
             
+        self._bootstrap = bootstrap
         self._pluginModule = None
+        self._setupDuration = None # wall time of loading the bootstrap module and calling setup (sec)
+        self._criticalPathDuration = None # setupDuration plus the longest critical path of the plugins this one loads after (sec)
 
     def setup(self):
         """Load the plugin, set the _pluginModule and call the setup method."""
         logger.info("loading %s" % self.pluginName)
+        startTime = time.time()
         try:
-            bFile, bFilename, bDesc = imp.find_module(BOOTSTRAP_MODULE_NAME, [self._pluginPath])
-            sys.path.append(os.path.dirname(bFilename))
-            self._pluginModule = imp.load_module(self.pluginName, bFile, bFilename, bDesc)
+            with profiler.measure('find_module', self.pluginName, self.pluginName):
+                bFile, bFilename, bDesc = self._findBootstrapModule()
+            with profiler.measure('load_module', self.pluginName, self.pluginName):
+                pluginModule = imp.load_module(self.pluginName, bFile, bFilename, bDesc)
         except ImportError, e:
             logger.exception(traceback.format_exc())
             raise PluginBootstrapModuleNotLoaded(self.pluginName)
-        global _currentSetupPluginInfo # see documentation above
-        if not hasattr(self._pluginModule, 'setup'):
-            self._pluginModule = None
+        if not hasattr(pluginModule, 'setup'):
             raise PluginBootstrapSetupMethodNotFoundError(self.pluginName)
-        _currentSetupPluginInfo = self
-        self._pluginModule.setup()
-        _currentSetupPluginInfo = None
+        _setupContext.pluginInfo = self # see documentation above
+        try:
+            with profiler.measure('setup', self.pluginName, self.pluginName):
+                pluginModule.setup()
+        finally:
+            _setupContext.pluginInfo = None
+        self._pluginModule = pluginModule
+        self._setupDuration = time.time() - startTime
+
+    def _findBootstrapModule(self):
+        """Returns the (file, filename, description) of the bootstrap module. The path from the plugin index is used if the file still exists."""
+        if self._bootstrap and os.path.isfile(self._bootstrap[0]):
+            bFilename, bDesc = self._bootstrap
+            return (open(bFilename, bDesc[1]), bFilename, bDesc)
+        return imp.find_module(BOOTSTRAP_MODULE_NAME, [self._pluginPath])
 
     def implementsService(self, name):
         """Tells if the plugin's manifest specifies the service's name given."""
         return (name in self._serviceNames)
 
-    def allLoadsAfterSatisfied(self, pluginList):
-        """
-        Checks if all plugins specified in _loadsAfter have been loaded.
-        """
-        for depServiceName in self._loadsAfter:
-            # find out if all dependent service names have already been loaded, if not return False
-            foundService = False
-            for otherPluginInfo in pluginList:
-                if otherPluginInfo.implementsService(depServiceName):
-                    foundService=True
-                    if not otherPluginInfo.loaded: # here I assume that service names are unique
-                        return False
-                    break
-            if not foundService:
-                return False
-        return True
-
-    def allRequiresSatisfied(self, pluginList):
+    def allRequiresSatisfied(self, availableServices):
         """
         Checks if all plugins specified in _requires are available.
+        {availableServices} is a collection of all service names implemented by the plugins present.
         """
-        for depServiceName in self._requires: # this is a little redundant to above
-            foundService=False
-            for otherPluginInfo in pluginList:
-                if otherPluginInfo.implementsService(depServiceName):
-                    foundService=True
-                    break
-            if not foundService:
+        for depServiceName in self._requires:
+            if not depServiceName in availableServices:
                 return False
         return True
 
     @property
     def loaded(self):
         return self._pluginModule != None
+
+    @property
+    def loadsAfter(self):
+        return set(self._loadsAfter)
+
+    @property
+    def pluginPath(self):
+        return self._pluginPath
+
+    @property
+    def manifest(self):
+        return self._manifest
+
+    @property
+    def setupDuration(self):
+        return self._setupDuration
+
+    @property
+    def criticalPathDuration(self):
+        return self._criticalPathDuration
     
     @property
     def supports_multiprocess(self):
         return self._supports_multiprocess
 
+    @property
+    def lazy(self):
+        return self._lazy
+
+    def hasRole(self, role):
+        """Tells if the plugin is needed for the given role. Plugins without roles in the manifest belong to every role."""
+        return (self._roles is None) or (role in self._roles)
+
+    @property
+    def requires(self):
+        return set(self._requires)
+
     @property
     def serviceNames(self):
         return set(self._serviceNames)
@@ -201,18 +281,126 @@ class PluginInfo(object):
         return os.path.basename(self._pluginPath)
 
 
-def init(pluginsPath):
+class _SetupScheduler(object):
     """
-    Should be called during bootstrapping of the AM.
-    Walks through the plugins directory and reads the dependencies (loadsAfter, requires) and saves this information to the pluginList.
-    Then the plugins' setup method is called, where the plugin can register it's services.
-    The order of loading depends on the loadsAfter tree.
-    
-    Semantics:
-    During the setup of the plugins the plugins can assume that the service which are specified in loadsAfter are present.
-    The plugins which are specified in requries are not necessarily present during the setup call, but the system enforces
-    that they are present in the system after all plugins are present.
+    Internal class for setting up the plugins according to the loadsAfter specifications in the plugin's manifest.
+    This is how it works:
+      The dependency graph is built once (plugin -> plugins which implement its loadsAfter services).
+      Plugins outside the given list are expected to be loaded already (e.g. when setting up a lazy plugin later on).
+      The plugins without any unsatisfied dependencies are queued and set up by a pool of threads.
+      When a plugin is done, all plugins which depend on it are checked and queued if they became ready.
+      If there are plugins left which never became ready, there is an unsatifyable dependency (either cycle or undefined service names).
     """
+    def __init__(self, pluginList, threadCount):
+        self._pluginList = pluginList
+        self._threadCount = max(1, threadCount)
+        self._dependencies = {} # pluginInfo -> set of pluginInfos it loads after
+        self._dependents = {} # pluginInfo -> list of pluginInfos which load after it
+        self._pending = {} # pluginInfo -> number of dependencies not set up yet
+        self._buildGraph()
+
+    def _buildGraph(self):
+        members = set(self._pluginList)
+        for pluginInfo in self._pluginList:
+            self._dependents.setdefault(pluginInfo, [])
+            dependencies = set()
+            for depServiceName in pluginInfo.loadsAfter:
+                if not depServiceName in _serviceProviders:
+                    raise PluginLoadAfterResolvingError(pluginInfo.pluginName)
+                provider = _serviceProviders[depServiceName]
+                if provider in members:
+                    dependencies.add(provider)
+                elif not provider.loaded:
+                    raise PluginLoadAfterResolvingError(pluginInfo.pluginName)
+            dependencies.discard(pluginInfo)
+            self._dependencies[pluginInfo] = dependencies
+            self._pending[pluginInfo] = len(dependencies)
+            for dependency in dependencies:
+                self._dependents.setdefault(dependency, []).append(pluginInfo)
+
+    def loadOrder(self):
+        """Returns the pluginInfos in a topological order (every plugin comes after the plugins it loads after)."""
+        pending = dict(self._pending)
+        ready = [p for p in self._pluginList if pending[p] == 0]
+        result = []
+        while ready:
+            pluginInfo = ready.pop(0)
+            result.append(pluginInfo)
+            for dependent in self._dependents[pluginInfo]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    ready.append(dependent)
+        if len(result) != len(self._pluginList):
+            unresolved = [p.pluginName for p in self._pluginList if pending[p] > 0]
+            raise PluginLoadAfterResolvingError(', '.join(unresolved))
+        return result
+
+    def run(self):
+        """Sets up all plugins. Raises the first error which occurred in any of the setup methods."""
+        loadOrder = self.loadOrder() # also detects cycles before anything is loaded
+        if self._threadCount == 1:
+            for pluginInfo in loadOrder:
+                pluginInfo.setup()
+        else:
+            self._runConcurrently()
+        self._calculateCriticalPaths(loadOrder)
+
+    def _runConcurrently(self):
+        readyQueue = Queue.Queue()
+        doneQueue = Queue.Queue()
+        def work():
+            while True:
+                pluginInfo = readyQueue.get()
+                if pluginInfo is None:
+                    return
+                try:
+                    pluginInfo.setup()
+                    doneQueue.put((pluginInfo, None))
+                except Exception, e:
+                    doneQueue.put((pluginInfo, sys.exc_info()))
+
+        threads = [threading.Thread(target=work, name="pluginsetup-%i" % (i,)) for i in range(min(self._threadCount, len(self._pluginList)))]
+        for thread in threads:
+            thread.start()
+
+        pending = dict(self._pending)
+        running = 0
+        for pluginInfo in self._pluginList:
+            if pending[pluginInfo] == 0:
+                readyQueue.put(pluginInfo)
+                running += 1
+        error = None
+        while running > 0:
+            pluginInfo, excInfo = doneQueue.get()
+            running -= 1
+            if excInfo:
+                error = error or excInfo # remember the first error, but wait for the running setups to finish
+                continue
+            if error:
+                continue
+            for dependent in self._dependents[pluginInfo]:
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    readyQueue.put(dependent)
+                    running += 1
+        for thread in threads:
+            readyQueue.put(None)
+        for thread in threads:
+            thread.join()
+        if error:
+            raise error[0], error[1], error[2]
+
+    def _calculateCriticalPaths(self, loadOrder):
+        for pluginInfo in loadOrder:
+            longestDependency = max([0] + [d.criticalPathDuration for d in self._dependencies[pluginInfo]]) # plugins outside the list count as 0
+            pluginInfo._criticalPathDuration = pluginInfo.setupDuration + longestDependency
+        for pluginInfo in sorted(loadOrder, key=lambda p: p.criticalPathDuration, reverse=True):
+            logger.info("plugin %s: critical path %.3fs (setup %.3fs)" % (pluginInfo.pluginName, pluginInfo.criticalPathDuration, pluginInfo.setupDuration))
+
+
+def _readManifests(pluginsPath):
+    """Walks through the plugins directory and returns a PluginInfo for each plugin folder."""
+    pluginInfos = []
     for path in os.listdir(pluginsPath):
         absPath = os.path.join(pluginsPath, path)
         if not os.path.isdir(absPath):
@@ -225,65 +413,267 @@ def init(pluginsPath):
             manifest = json.load(manifestFile)
         except Exception, e:
             raise PluginMalformedManifestError(path)
-        _pluginList.append(PluginInfo(absPath, manifest))
+        pluginInfos.append(PluginInfo(absPath, manifest))
+    return pluginInfos
 
-    # check for duplications of service implementations
-    allServices = []  # damn i can not find decent documentation on sets... the next couple of lines are ugly
-    for pluginInfo in _pluginList:
-        allServices.extend(pluginInfo.serviceNames)
-    for s in set(allServices):
-        allServices.remove(s)
-    if len(allServices) > 0:
-        raise PluginDuplicateServiceDefinitionsInManifestError(', '.join(allServices))
+def _addServiceProviders(pluginInfos):
+    """Adds the services of the given plugins to _serviceProviders. Crashes if two plugins implement the same service."""
+    duplicateServices = set()
+    for pluginInfo in pluginInfos:
+        duplicateServices.update(set(_serviceProviders.keys()) & pluginInfo.serviceNames)
+        for serviceName in pluginInfo.serviceNames:
+            _serviceProviders[serviceName] = pluginInfo
+    if len(duplicateServices) > 0:
+        raise PluginDuplicateServiceDefinitionsInManifestError(', '.join(duplicateServices))
+
+def _mtime(path):
+    """Returns the modification time of the given {path} or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def _loadPluginIndex(pluginsPath, indexPath):
+    """
+    Returns the PluginInfos (in load order) from the plugin index at {indexPath} (see Plugin Index above).
+    Returns None if the index does not exist, was written for another plugins directory or if a plugin was added, removed or changed since.
+    """
+    try:
+        with open(indexPath, 'r') as indexFile:
+            index = json.load(indexFile)
+    except (IOError, ValueError):
+        return None
+    try:
+        if (index['version'] != PLUGIN_INDEX_VERSION) or (index['plugins-path'] != pluginsPath) or (index['plugins-path-mtime'] != _mtime(pluginsPath)):
+            return None
+        pluginInfos = []
+        for entry in index['plugins']:
+            if entry['manifest-mtime'] != _mtime(os.path.join(entry['path'], MANIFEST_FILENAME)):
+                return None
+            bootstrap = entry['bootstrap']
+            if bootstrap:
+                bootstrap = (bootstrap[0], tuple(bootstrap[1]))
+            pluginInfos.append(PluginInfo(entry['path'], entry['manifest'], bootstrap))
+    except (KeyError, TypeError, IndexError, PluginMalformedManifestError):
+        return None
+    return pluginInfos
+
+def _writePluginIndex(pluginsPath, indexPath, pluginInfos):
+    """
+    Writes the plugin index for the given {pluginInfos}, which must be in load order.
+    The index is only a cache, so the bootstrapping continues if it can not be written.
+    """
+    entries = []
+    for pluginInfo in pluginInfos:
+        try:
+            bFile, bFilename, bDesc = imp.find_module(BOOTSTRAP_MODULE_NAME, [pluginInfo.pluginPath])
+            if bFile:
+                bFile.close()
+            bootstrap = [bFilename, list(bDesc)]
+        except ImportError:
+            bootstrap = None # the plugin will complain during its setup
+        entries.append({
+            'name' : pluginInfo.pluginName,
+            'path' : pluginInfo.pluginPath,
+            'manifest' : pluginInfo.manifest,
+            'manifest-mtime' : _mtime(os.path.join(pluginInfo.pluginPath, MANIFEST_FILENAME)),
+            'bootstrap' : bootstrap })
+    index = {
+        'version' : PLUGIN_INDEX_VERSION,
+        'plugins-path' : pluginsPath,
+        'plugins-path-mtime' : _mtime(pluginsPath),
+        'plugins' : entries,
+        'services' : dict([(serviceName, pluginInfo.pluginName) for pluginInfo in pluginInfos for serviceName in pluginInfo.serviceNames]) }
+    tmpPath = "%s.%i.tmp" % (indexPath, os.getpid()) # other processes may be reading the index right now
+    try:
+        with open(tmpPath, 'w') as indexFile:
+            json.dump(index, indexFile, indent=2, sort_keys=True)
+        os.rename(tmpPath, indexPath)
+    except (IOError, OSError), e:
+        logger.warning("could not write the plugin index to %s (%s)" % (indexPath, str(e)))
+        return
+    logger.info("plugin index written to %s" % (indexPath,))
+
+
+def init(pluginsPath, role=None):
+    """
+    Should be called during bootstrapping of the AM.
+    Walks through the plugins directory (or reads the plugin index, see Plugin Index above) and reads the dependencies (loadsAfter, requires) and saves this information to the pluginList.
+    Then the plugins' setup method is called, where the plugin can register it's services.
+    The order of loading depends on the loadsAfter tree. Plugins which do not depend on each other are set up concurrently.
+    If {role} is given, only the plugins needed for this role are considered (see Roles above).
+    
+    Semantics:
+    During the setup of the plugins the plugins can assume that the service which are specified in loadsAfter are present.
+    The plugins which are specified in requries are not necessarily present during the setup call, but the system enforces
+    that they are present in the system after all plugins are present.
+    """
+    global _role
+    _role = role
+    allPlugins = _loadPluginIndex(pluginsPath, config.PLUGIN_INDEX_PATH)
+    if allPlugins is None:
+        logger.info("plugin index %s is missing or outdated, reading the manifests in %s" % (config.PLUGIN_INDEX_PATH, pluginsPath))
+        allPlugins = _readManifests(pluginsPath)
+        _addServiceProviders(allPlugins)
+        allPlugins = _SetupScheduler(allPlugins, 1).loadOrder() # crash if the plugins can not be loaded at all
+        _writePluginIndex(pluginsPath, config.PLUGIN_INDEX_PATH, allPlugins)
+    else:
+        _addServiceProviders(allPlugins) # has been checked when the index was written, so this will not raise
+
+    # only consider the plugins needed for the role
+    if role:
+        rolePlugins = _dependencyClosure([p for p in allPlugins if p.hasRole(role)])
+        for pluginInfo in allPlugins:
+            if not pluginInfo in rolePlugins:
+                logger.info("ignoring plugin %s (not needed for role %s)" % (pluginInfo.pluginName, role))
+                for serviceName in pluginInfo.serviceNames:
+                    del _serviceProviders[serviceName]
+        allPlugins = [p for p in allPlugins if p in rolePlugins]
+    _pluginList.extend(allPlugins)
     
     if config.IS_MULTIPROCESS:
         for pluginInfo in _pluginList:
             if not pluginInfo.supports_multiprocess:
                 raise PluginUnsupportedMultiprocess(pluginInfo.pluginName)
     
-    # Load the plugins in according to the loadsAfter specifications in the plugin's manifest.
-    # This is how it works:
-    #   iterate through the pluginList and load the plugins which have no (loadsAfter) dependencies
-    #   repeat this iteration as long as at least one plugin was loaded in the last cycle.
-    #   if there are unloaded plugins left after that, there is an unsatifyable dependency (either cycle or undefined service names).
-    loadedPlugin = True
-    while (loadedPlugin):
-        loadedPlugin = False
-        for pluginInfo in _pluginList:
-            if pluginInfo.loaded:
-                continue
-            if pluginInfo.allLoadsAfterSatisfied(_pluginList):
-               pluginInfo.setup()
-               loadedPlugin = True
-    
-    # crash if not all plugins loaded
-    # also crash if not all requires statements are satisfied
+    # crash if not all requires statements are satisfied
     for pluginInfo in _pluginList:
-        if not pluginInfo.loaded:
-            raise PluginLoadAfterResolvingError(pluginInfo.pluginName)
-        if not pluginInfo.allRequiresSatisfied(_pluginList):
+        if not pluginInfo.allRequiresSatisfied(_serviceProviders):
             raise PluginRequiresCanNotBeFulfilledError(pluginInfo.pluginName)
-    logger.info("done loading plugins")
 
-def getService(name):
+    # crash if not all plugins can be loaded (see _SetupScheduler), even if some of them are loaded lazily later
+    loadOrder = _SetupScheduler(_pluginList, 1).loadOrder()
+    # make all plugin folders importable in a deterministic order, regardless of which setup runs first
+    for pluginInfo in loadOrder:
+        if not pluginInfo.pluginPath in sys.path:
+            sys.path.append(pluginInfo.pluginPath)
+
+    # defer the lazy plugins, unless a non-lazy plugin needs them during its setup
+    eagerPlugins = _loadsAfterClosure([p for p in _pluginList if not p.lazy])
+    for pluginInfo in _pluginList:
+        if not pluginInfo in eagerPlugins:
+            logger.info("deferring lazy plugin %s" % (pluginInfo.pluginName,))
+            for serviceName in pluginInfo.serviceNames:
+                _deferredServices[serviceName] = pluginInfo
+
+    startTime = time.time()
+    _SetupScheduler([p for p in _pluginList if p in eagerPlugins], config.PLUGIN_SETUP_THREADS).run()
+    logger.info("done loading plugins (%.3fs)" % (time.time() - startTime,))
+
+def _loadsAfterClosure(pluginInfos):
+    """Returns the set of the given pluginInfos and all pluginInfos they (transitively) load after."""
+    result = set()
+    stack = list(pluginInfos)
+    while stack:
+        pluginInfo = stack.pop()
+        if pluginInfo in result:
+            continue
+        result.add(pluginInfo)
+        stack.extend([_serviceProviders[serviceName] for serviceName in pluginInfo.loadsAfter])
+    return result
+
+def _dependencyClosure(pluginInfos):
+    """Returns the set of the given pluginInfos and all pluginInfos they (transitively) load after or require. Unknown services are skipped (init reports them later)."""
+    result = set()
+    stack = list(pluginInfos)
+    while stack:
+        pluginInfo = stack.pop()
+        if pluginInfo in result:
+            continue
+        result.add(pluginInfo)
+        for serviceName in pluginInfo.loadsAfter | pluginInfo.requires:
+            if serviceName in _serviceProviders:
+                stack.append(_serviceProviders[serviceName])
+    return result
+
+def _setupDeferredPlugin(pluginInfo):
+    """
+    Loads the given lazy plugin and all the (not yet loaded) plugins it loads after.
+    Their services are published (removed from _deferredServices) only after all setups have finished.
+    """
+    with _deferredLock:
+        if pluginInfo.loaded or (pluginInfo in _deferredSetups): # the latter: the plugin's own setup asks for one of its services
+            return
+        logger.info("loading deferred plugin %s" % (pluginInfo.pluginName,))
+        pluginInfos = [p for p in _loadsAfterClosure([pluginInfo]) if not p.loaded]
+        _deferredSetups.update(pluginInfos)
+        try:
+            _SetupScheduler(pluginInfos, 1).run()
+        finally:
+            _deferredSetups.difference_update(pluginInfos)
+        for p in pluginInfos:
+            for serviceName in p.serviceNames:
+                _deferredServices.pop(serviceName, None)
+
+class ServiceProxy(object):
+    """
+    Stands in for a service of a lazy plugin which has not been loaded yet (see getService(name, lazy=True)).
+    The first attribute access (or call) loads the plugin, all further accesses are forwarded to the actual service.
+    """
+    __slots__ = ('_proxyServiceName', '_proxyService')
+
+    def __init__(self, name):
+        object.__setattr__(self, '_proxyServiceName', name)
+        object.__setattr__(self, '_proxyService', None)
+
+    def _proxyResolve(self):
+        service = object.__getattribute__(self, '_proxyService')
+        if service is None:
+            service = getService(object.__getattribute__(self, '_proxyServiceName'))
+            object.__setattr__(self, '_proxyService', service)
+        return service
+
+    def __getattr__(self, attr):
+        return getattr(self._proxyResolve(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._proxyResolve(), attr, value)
+
+    def __call__(self, *args, **kwargs):
+        return self._proxyResolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return "<ServiceProxy for %s>" % (object.__getattribute__(self, '_proxyServiceName'),)
+
+def getService(name, lazy=False):
     """
     Receives the thing (object, module or whatever) which has been added by the registerService.
+    If the service belongs to a lazy plugin which has not been loaded yet, the plugin is loaded now.
+    If {lazy} is True, a ServiceProxy is returned instead and the plugin is loaded on first use of the proxy
+    (if the service is already available, the service itself is returned).
+    A lazy plugin registers its services during its setup, but they are only handed out when the setup has finished:
+    until then, other threads wait for the setup (see _setupDeferredPlugin).
     """
-    if not name in _serviceRegistry:
+    pluginInfo = _deferredServices.get(name)
+    if pluginInfo is None:
+        if name in _serviceRegistry:
+            return _serviceRegistry[name]
         raise ServiceNotRegisteredError(name)
-    return _serviceRegistry[name]
+    if lazy:
+        return ServiceProxy(name)
+    _setupDeferredPlugin(pluginInfo)
+    if name in _serviceRegistry:
+        return _serviceRegistry[name]
+    raise ServiceNotRegisteredError(name)
     
+def getRole():
+    """Returns the role given to init (None if all plugins have been considered)."""
+    return _role
+
 def registerService(name, service):
     """
     Register a service under the given name
     Service can be an object, a class or any other thing (even a module or a package)
     """
     logger.info("registering service %s" % name)
-    if name in _serviceRegistry: # check if the service has already been registered
-        raise ServiceAlreadyRegisteredError(name)
-
     # to avoid developer's misspelling: check if the service's name is in the manifest file
-    if (_currentSetupPluginInfo) and (not _currentSetupPluginInfo.implementsService(name)):
+    currentSetupPluginInfo = getattr(_setupContext, 'pluginInfo', None)
+    if (currentSetupPluginInfo) and (not currentSetupPluginInfo.implementsService(name)):
         raise ServiceNameNotFoundInManifestError(name)
-    _serviceRegistry[name] = service
+
+    with profiler.measure('registerService', name):
+        with _serviceRegistryLock:
+            if name in _serviceRegistry: # check if the service has already been registered
+                raise ServiceAlreadyRegisteredError(name)
+            _serviceRegistry[name] = service
 
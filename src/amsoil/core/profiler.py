@@ -0,0 +1,180 @@
+"""
+This module provides a startup profiler for the bootstrapping of AMsoil.
+When enabled (e.g. via main.py --profile-startup), the pluginmanager records each step of the bootstrap:
+finding and loading the bootstrap module of a plugin, calling its setup method and registering services.
+Also, each module which is imported for the first time while profiling is recorded (this covers the module-level code of the plugins).
+
+For each step the wall time, the CPU time and the change of the resident memory is recorded.
+Steps can be nested (e.g. a registerService during a setup), each record knows its parent step.
+Since CPU time and memory can only be measured per process, the profiled steps should not run concurrently
+(main.py sets PLUGIN_SETUP_THREADS to 1 when profiling).
+
+Example code:
+    from amsoil.core import profiler
+    profiler.enable()
+    with profiler.measure('setup', 'myplugin', plugin='myplugin'):
+        do_something()
+    profiler.disable()
+    profiler.writeReport('/tmp/profile.json')
+    print profiler.summary()
+"""
+import os
+import sys
+import time
+import json
+import threading
+import __builtin__
+
+import amsoil.core.log
+logger=amsoil.core.log.getLogger('profiler')
+
+_enabled = False
+_records = []
+_recordsLock = threading.Lock()
+_stack = threading.local() # the currently running measurements of this thread (list of records)
+_originalImport = None
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (ValueError, AttributeError):
+    _PAGE_SIZE = 4096
+
+def _currentMemory():
+    """Returns the resident memory of the process in bytes (falls back to the peak resident memory if /proc is not available)."""
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (IOError, IndexError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _currentCPU():
+    times = os.times()
+    return times[0] + times[1]
+
+
+class _Measurement(object):
+    """Internal context manager which records one step. Please use measure(...)."""
+    def __init__(self, category, name, plugin):
+        self._record = { 'category' : category, 'name' : name, 'plugin' : plugin, 'parent' : None, 'depth' : 0, 'toplevel' : True }
+
+    def __enter__(self):
+        stack = _threadStack()
+        if stack:
+            parent = stack[-1]
+            self._record['parent'] = "%s:%s" % (parent['category'], parent['name'])
+            self._record['depth'] = parent['depth'] + 1
+            if not self._record['plugin']:
+                self._record['plugin'] = parent['plugin']
+            self._record['toplevel'] = (self._record['plugin'] != parent['plugin']) # only the outermost step of a plugin counts for its totals
+        stack.append(self._record)
+        self._record['start'] = time.time()
+        self._startCPU = _currentCPU()
+        self._startMemory = _currentMemory()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._record['wall'] = time.time() - self._record['start']
+        self._record['cpu'] = _currentCPU() - self._startCPU
+        self._record['memory'] = _currentMemory() - self._startMemory
+        self._record['failed'] = exc_type is not None
+        _threadStack().pop()
+        with _recordsLock:
+            _records.append(self._record)
+        return False
+
+class _NoMeasurement(object):
+    """Internal no-op context manager, used when the profiler is disabled."""
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+_NO_MEASUREMENT = _NoMeasurement()
+
+def _threadStack():
+    if not hasattr(_stack, 'records'):
+        _stack.records = []
+    return _stack.records
+
+def _profiledImport(name, globals=None, locals=None, fromlist=None, level=-1):
+    """Replacement for __import__ which records modules which are imported for the first time."""
+    if name in sys.modules:
+        return _originalImport(name, globals, locals, fromlist, level)
+    with _Measurement('import', name, None):
+        return _originalImport(name, globals, locals, fromlist, level)
+
+
+def enable():
+    """Starts recording. Also records first-time imports of modules."""
+    global _enabled, _originalImport
+    if _enabled:
+        return
+    _enabled = True
+    _originalImport = __builtin__.__import__
+    __builtin__.__import__ = _profiledImport
+
+def disable():
+    """Stops recording. The records are kept until reset() is called."""
+    global _enabled
+    if not _enabled:
+        return
+    _enabled = False
+    __builtin__.__import__ = _originalImport
+
+def isEnabled():
+    return _enabled
+
+def reset():
+    with _recordsLock:
+        del _records[:]
+
+def measure(category, name, plugin=None):
+    """
+    Returns a context manager which records the wall time, CPU time and memory change of the enclosed block.
+    {category} the kind of step (e.g. 'setup', 'load_module'), {name} what is being done (e.g. the plugin's or service's name).
+    {plugin} the name of the plugin the step belongs to (if None the plugin of the enclosing step is used).
+    If the profiler is disabled, a no-op context manager is returned.
+    """
+    if not _enabled:
+        return _NO_MEASUREMENT
+    return _Measurement(category, name, plugin)
+
+def report():
+    """
+    Returns the recorded steps as a dict, which can be serialized to JSON.
+    {'steps' : [{category, name, plugin, parent, depth, toplevel, start, wall, cpu, memory, failed}, ...], 'plugins' : {name : {wall, cpu, memory}}}
+    The 'plugins' entry sums up the outermost steps per plugin.
+    """
+    with _recordsLock:
+        steps = sorted(_records, key=lambda r: r['start'])
+    plugins = {}
+    for step in steps:
+        if not step['plugin'] or not step['toplevel']:
+            continue
+        totals = plugins.setdefault(step['plugin'], { 'wall' : 0.0, 'cpu' : 0.0, 'memory' : 0 })
+        totals['wall'] += step['wall']
+        totals['cpu'] += step['cpu']
+        totals['memory'] += step['memory']
+    return { 'steps' : steps, 'plugins' : plugins }
+
+def writeReport(path):
+    """Writes the report (see report()) as JSON to the given {path}."""
+    with open(path, 'w') as f:
+        json.dump(report(), f, indent=2, sort_keys=True)
+    logger.info("startup profile written to %s" % (path,))
+
+def summary(limit=30):
+    """Returns a human-readable summary: the plugins and the {limit} most expensive steps, sorted by wall time."""
+    rep = report()
+    lines = ["%-40s %10s %10s %12s" % ("plugin", "wall (s)", "cpu (s)", "memory (kB)")]
+    for name, totals in sorted(rep['plugins'].items(), key=lambda item: item[1]['wall'], reverse=True):
+        lines.append("%-40s %10.3f %10.3f %12i" % (name, totals['wall'], totals['cpu'], totals['memory'] / 1024))
+    lines.append("")
+    lines.append("%-56s %10s %10s %12s" % ("step", "wall (s)", "cpu (s)", "memory (kB)"))
+    for step in sorted(rep['steps'], key=lambda s: s['wall'], reverse=True)[:limit]:
+        title = "%s%s:%s" % ("  " * step['depth'], step['category'], step['name'])
+        if step['plugin']:
+            title += " [%s]" % (step['plugin'],)
+        lines.append("%-56s %10.3f %10.3f %12i" % (title[:56], step['wall'], step['cpu'], step['memory'] / 1024))
+    return "\n".join(lines)
@@ -3,36 +3,67 @@ import getopt
 
 from amsoil import config
 from amsoil.core import pluginmanager as pm
+from amsoil.core import profiler
 
 def print_usage():
-    print "USAGE: ./main.py [--help] [--worker]"
+    print "USAGE: ./main.py [--help] [--worker] [--prefork] [--profile-startup]"
     print
     print "When no option is specified, the server will be started."
     print
-    print "  --help    Print this help message."
-    print "  --worker  Starts the worker process instead of the RPC server."
+    print "  --help             Print this help message."
+    print "  --worker           Starts the worker process instead of the RPC server."
+    print "  --prefork          Starts the RPC server with multiple pre-forked worker processes (requires IS_MULTIPROCESS in config.py)."
+    print "  --profile-startup  Records time and memory of each bootstrap step (plugin imports, setup, service registration)."
+    print "                     The report is written to %s and a summary is printed." % (config.STARTUP_PROFILE_FILE,)
+
+def load_plugins(role, profile_startup):
+    if not profile_startup:
+        pm.init(config.PLUGINS_PATH, role)
+        return
+    config.PLUGIN_SETUP_THREADS = 1 # the CPU time and memory can only be attributed to a plugin if the setups run one after another
+    profiler.enable()
+    try:
+        with profiler.measure('bootstrap', 'init'):
+            pm.init(config.PLUGINS_PATH, role)
+    finally:
+        profiler.disable()
+        profiler.writeReport(config.STARTUP_PROFILE_FILE)
+        print profiler.summary()
+        print
+        print "Full report written to %s" % (config.STARTUP_PROFILE_FILE,)
 
 def main():
-    # load plugins
-    pm.init(config.PLUGINS_PATH)
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'hw', ['help', 'worker'])
+        opts, args = getopt.getopt(sys.argv[1:], 'hwfp', ['help', 'worker', 'prefork', 'profile-startup'])
     except getopt.GetoptError as e:
         print "Wrong arguments: " + str(e)
         print
         print_usage()
         return
-    for option, opt_arg in opts:
-        if option in ['-h', '--help']:
-            print_usage()
-            sys.exit(0)
-        if option in ['-w', '--worker']:
-            worker = pm.getService('worker')
-            worker.WorkerServer().runServer()
-            sys.exit(0)
-    
+    options = [option for option, opt_arg in opts]
+    if ('-h' in options) or ('--help' in options):
+        print_usage()
+        sys.exit(0)
+
+    is_worker = ('-w' in options) or ('--worker' in options)
+    is_prefork = ('-f' in options) or ('--prefork' in options)
+    if is_prefork and not config.IS_MULTIPROCESS:
+        print "The pre-forked server can only be used if IS_MULTIPROCESS is set in config.py (so only plugins supporting multiple processes are loaded)."
+        sys.exit(1)
+
+    # load plugins (only the ones needed for this process)
+    load_plugins(pm.ROLE_WORKER if is_worker else pm.ROLE_RPC, ('-p' in options) or ('--profile-startup' in options))
+
+    if is_worker:
+        worker = pm.getService('worker')
+        worker.WorkerServer().runServer()
+        sys.exit(0)
+
     rpcserver = pm.getService('rpcserver')
-    rpcserver.runServer()
+    if is_prefork:
+        rpcserver.runPreforkServer()
+    else:
+        rpcserver.runServer()
 
 if __name__ == "__main__":
     main()
@@ -4,9 +4,17 @@ from sqlalchemy import (Table, Column, MetaData, ForeignKey, PickleType, String,
 from sqlalchemy.orm import scoped_session, sessionmaker, mapper
 from sqlalchemy.orm.exc import MultipleResultsFound, NoResultFound
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.exc import IntegrityError
 
-from amsoil.config import (CONFIGDB_PATH, CONFIGDB_ENGINE)
+import os
+import copy
+import atexit
+import time
+import threading
+
+from amsoil.config import (CONFIGDB_PATH, CONFIGDB_ENGINE, CONFIGDB_CACHE_STALENESS, CONFIGDB_SNAPSHOT_PATH, CONFIGDB_SNAPSHOT_DELAY)
 from amconfigdbexceptions import ConfigDuplicateConfigKey, ConfigUnknownConfigKey
+import configsnapshot
 from amsoil.core import serviceinterface
 import amsoil.core.pluginmanager as pm
 
@@ -27,9 +35,178 @@ class ConfigEntry(Base):
     value = Column(PickleType)
     desc = Column(Text)
 
+class ConfigVersion(Base):
+    """Holds one row, whose version is incremented with each change of the config table (see ConfigDB)."""
+    __tablename__ = 'config_version'
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer)
+
 Base.metadata.create_all(db_engine) # create the tables if they are not there yet
+if db_session.query(ConfigVersion).filter_by(id=1).count() == 0:
+    try:
+        db_session.add(ConfigVersion(id=1, version=0))
+        db_session.commit()
+    except IntegrityError: # another process was faster
+        db_session.rollback()
+db_session.remove()
+
+IMMUTABLE_TYPES = (basestring, int, long, float, bool, type(None))
 
 class ConfigDB:
+    """
+    Reads are served from a process-local cache of the (unpickled) values.
+    Each write increments the version in the config_version table. At most every CONFIGDB_CACHE_STALENESS seconds (see config.py)
+    the version is read from the database, if it has changed (e.g. due to a write of another process) the cache is cleared.
+    Hence, changes by other processes are seen after CONFIGDB_CACHE_STALENESS seconds at the latest, changes by this process immediately.
+    Mutable values (e.g. lists, dicts) are copied before they are returned, so the caller can not change the cached value.
+
+    Components which keep config values (e.g. in attributes) can subscribe to changes (see subscribe).
+    Changes made by this process are notified right after they have been committed.
+    Changes made by other processes are detected by a watcher thread, which reads the version every CONFIGDB_CACHE_STALENESS seconds.
+    If the version has changed, it reads the values and notifies the subscribers about the ones which differ.
+
+    After changes the config is exported to the snapshot file (see configsnapshot.py and CONFIGDB_SNAPSHOT_PATH in config.py),
+    so processes which only read the config can use SnapshotConfigDB instead.
+    The export runs in a background thread CONFIGDB_SNAPSHOT_DELAY seconds after the first change, so a series of changes
+    (e.g. the installs during the setup of the plugins) is written once and the writing thread does not wait for the file.
+    Pending exports are written when the process exits. A process which exits without (e.g. killed) leaves an outdated snapshot,
+    which is replaced when the next ConfigDB is created.
+    """
+    def __init__(self):
+        self._cache = {} # key -> value
+        self._cacheLock = threading.Lock()
+        self._cacheVersion = None
+        self._cacheGeneration = 0 # incremented when the cache is cleared, so a value read before can not end up in the cache
+        self._versionChecked = 0
+        self._subscriptions = {} # id -> (key or prefix, callback)
+        self._nextSubscriptionId = 0
+        self._knownValues = None # values of the subscribed keys which have been notified (None until the watcher has read them)
+        self._subscriptionLock = threading.RLock()
+        self._watcherPid = None # the watcher thread does not survive a fork, so we need to know in which process it was started
+        self._snapshotLock = threading.Lock()
+        self._exportLock = threading.Lock() # only one thread writes the snapshot at a time
+        self._snapshotTimer = None # pending export
+        self._snapshotTimerPid = None # the timer does not survive a fork either
+        self._exportSnapshotIfOutdated()
+        atexit.register(self._exportPendingSnapshot)
+
+    def _exportSnapshotIfOutdated(self):
+        if not CONFIGDB_SNAPSHOT_PATH:
+            return
+        try:
+            snapshot = configsnapshot.ConfigSnapshot(CONFIGDB_SNAPSHOT_PATH)
+            snapshotVersion = snapshot.configVersion
+            snapshot.close()
+        except (IOError, OSError, configsnapshot.SnapshotFormatError):
+            snapshotVersion = None
+        if snapshotVersion != db_session.query(ConfigVersion.version).filter_by(id=1).scalar():
+            self.exportSnapshot(CONFIGDB_SNAPSHOT_PATH)
+
+    def _checkVersion(self):
+        """Clears the cache if the config has been changed (by any process). Reads the version only if the last check is older than the staleness window."""
+        with self._cacheLock:
+            if time.time() - self._versionChecked < CONFIGDB_CACHE_STALENESS:
+                return
+            version = db_session.query(ConfigVersion.version).filter_by(id=1).scalar()
+            if version != self._cacheVersion:
+                self._cache.clear()
+                self._cacheGeneration += 1
+                self._cacheVersion = version
+            self._versionChecked = time.time()
+        self._ensureWatcher()
+
+    def _invalidateCache(self):
+        with self._cacheLock:
+            self._cache.clear()
+            self._cacheGeneration += 1
+            self._versionChecked = 0
+
+    def _commitChange(self, changedValues):
+        """Increments the version, commits the current transaction and notifies the subscribers about the {changedValues} (dict key -> value)."""
+        db_session.query(ConfigVersion).filter_by(id=1).update({ ConfigVersion.version : ConfigVersion.version + 1 }, synchronize_session=False)
+        db_session.commit()
+        self._invalidateCache()
+        if CONFIGDB_SNAPSHOT_PATH:
+            self._exportSnapshotLater()
+        self._notifySubscribers(changedValues)
+
+    def _exportSnapshotLater(self):
+        """Exports the snapshot CONFIGDB_SNAPSHOT_DELAY seconds from now, unless an export is pending already (see class documentation)."""
+        with self._snapshotLock:
+            if (self._snapshotTimer is not None) and (self._snapshotTimerPid == os.getpid()):
+                return
+            self._snapshotTimer = threading.Timer(CONFIGDB_SNAPSHOT_DELAY, self._exportPendingSnapshot)
+            self._snapshotTimer.daemon = True
+            self._snapshotTimerPid = os.getpid()
+            self._snapshotTimer.start()
+
+    def _exportPendingSnapshot(self):
+        """Writes the snapshot if an export is pending (called by the timer and when the process exits)."""
+        with self._snapshotLock:
+            if (self._snapshotTimer is None) or (self._snapshotTimerPid != os.getpid()):
+                return
+            self._snapshotTimer.cancel()
+            self._snapshotTimer = None
+        if not CONFIGDB_SNAPSHOT_PATH:
+            return
+        try:
+            self.exportSnapshot(CONFIGDB_SNAPSHOT_PATH) # changes committed after this point schedule a new export
+        finally:
+            db_session.remove()
+
+    def _matches(self, keyOrPrefix, key):
+        return (key == keyOrPrefix) or key.startswith(keyOrPrefix + '.') or (keyOrPrefix == '')
+
+    def _notifySubscribers(self, values):
+        """Calls the callbacks of the subscriptions matching the given {values} (dict key -> value), unless they have been notified about this value before."""
+        notifications = []
+        with self._subscriptionLock:
+            for key, value in values.iteritems():
+                subscriptions = [(keyOrPrefix, callback) for keyOrPrefix, callback in self._subscriptions.values() if self._matches(keyOrPrefix, key)]
+                if not subscriptions:
+                    continue
+                if self._knownValues is not None:
+                    if (key in self._knownValues) and (self._knownValues[key] == value):
+                        continue
+                    self._knownValues[key] = value
+                notifications.extend([(callback, key, value) for keyOrPrefix, callback in subscriptions])
+        for callback, key, value in notifications:
+            try:
+                callback(key, value if isinstance(value, IMMUTABLE_TYPES) else copy.deepcopy(value))
+            except:
+                logger.exception("config subscriber for %s raised an exception" % (key,))
+
+    def _ensureWatcher(self):
+        """Starts the watcher thread if there are subscriptions and it is not running in this process."""
+        with self._subscriptionLock:
+            if (not self._subscriptions) or (self._watcherPid == os.getpid()):
+                return
+            self._watcherPid = os.getpid()
+            self._knownValues = None
+            watcher = threading.Thread(target=self._watch, name='config watcher')
+            watcher.daemon = True
+            watcher.start()
+
+    def _watch(self):
+        """Runs in the watcher thread: notifies the subscribers about changes made by other processes (see class documentation)."""
+        version = None
+        while self._watcherPid == os.getpid():
+            try:
+                newVersion = db_session.query(ConfigVersion.version).filter_by(id=1).scalar()
+                if newVersion != version:
+                    version = newVersion
+                    values = dict(db_session.query(ConfigEntry.key, ConfigEntry.value).all())
+                    with self._subscriptionLock:
+                        if self._knownValues is None: # first run, remember the current values
+                            self._knownValues = dict([(key, value) for key, value in values.iteritems()
+                                                      if any([self._matches(keyOrPrefix, key) for keyOrPrefix, callback in self._subscriptions.values()])])
+                            values = {}
+                    self._notifySubscribers(values)
+                db_session.rollback() # end the transaction, so the next read sees the changes
+            except:
+                logger.exception("config watcher failed to read the config")
+            time.sleep(CONFIGDB_CACHE_STALENESS)
+
     def _getRow(self, key):
         try:
             return db_session.query(ConfigEntry).filter_by(key=key).one()
@@ -39,6 +216,29 @@ class ConfigDB:
             raise ConfigUnknownConfigKey(key)
         
     
+    def _readValues(self, keys):
+        """Returns a dict with the values of the given keys (unknown keys are omitted).
+        Column queries bypass the sessions' identity maps, so the values always come from the database (not from an object loaded before by this thread's session)."""
+        values = {}
+        if not keys:
+            return values
+        for key, value in db_session.query(ConfigEntry.key, ConfigEntry.value).filter(ConfigEntry.key.in_(set(keys))):
+            if key in values:
+                raise ConfigDuplicateConfigKey(key)
+            values[key] = value
+        return values
+
+    def _getRows(self, keys):
+        """Returns a dict with the rows of the given keys (unknown keys are omitted)."""
+        rows = {}
+        if not keys:
+            return rows
+        for row in db_session.query(ConfigEntry).filter(ConfigEntry.key.in_(set(keys))):
+            if row.key in rows:
+                raise ConfigDuplicateConfigKey(row.key)
+            rows[row.key] = row
+        return rows
+
     @serviceinterface
     def install(self, key, defaultValue, defaultDescription, force=False):
         """
@@ -52,7 +252,7 @@ class ConfigDB:
         except ConfigUnknownConfigKey:
             record = ConfigEntry(key=key, value=defaultValue, desc=defaultDescription)
             db_session.add(record)
-            db_session.commit()
+            self._commitChange({ key : defaultValue })
         else:
             if(force):
                 self.set(key, defaultValue)
@@ -60,15 +260,117 @@ class ConfigDB:
                 return False
         return True
     
+    @serviceinterface
+    def installMany(self, items, force=False):
+        """
+        Same as install, but for many config items at once (one query and one transaction).
+        {items} is a list of (key, defaultValue, defaultDescription) tuples.
+        Returns the list of keys which have been created (or changed, if force is True).
+        """
+        rows = self._getRows([key for key, defaultValue, defaultDescription in items])
+        changedKeys = []
+        for key, defaultValue, defaultDescription in items:
+            if key in rows:
+                if not force:
+                    continue
+                rows[key].value = defaultValue
+            else:
+                rows[key] = ConfigEntry(key=key, value=defaultValue, desc=defaultDescription)
+                db_session.add(rows[key])
+            changedKeys.append(key)
+        if changedKeys:
+            self._commitChange(dict([(key, rows[key].value) for key in changedKeys]))
+        return changedKeys
+
     @serviceinterface
     def set(self, key, value):
         res = self._getRow(key)
         res.value = value
-        db_session.commit()
+        self._commitChange({ key : value })
     
     @serviceinterface
     def get(self, key):
-        return self._getRow(key).value
+        self._checkVersion()
+        try:
+            value = self._cache[key]
+        except KeyError:
+            generation = self._cacheGeneration
+            values = self._readValues([key])
+            if not key in values:
+                raise ConfigUnknownConfigKey(key)
+            value = values[key]
+            with self._cacheLock:
+                if generation == self._cacheGeneration:
+                    self._cache[key] = value
+        if isinstance(value, IMMUTABLE_TYPES):
+            return value
+        return copy.deepcopy(value)
+
+    @serviceinterface
+    def getMany(self, keys):
+        """
+        Same as get, but for many keys at once (the values which are not cached are retrieved with one query).
+        Returns a dict with the {keys} and their values.
+        """
+        self._checkVersion()
+        result = {}
+        missingKeys = []
+        for key in keys:
+            try:
+                result[key] = self._cache[key]
+            except KeyError:
+                missingKeys.append(key)
+        if missingKeys:
+            generation = self._cacheGeneration
+            values = self._readValues(missingKeys)
+            for key in missingKeys:
+                if not key in values:
+                    raise ConfigUnknownConfigKey(key)
+                result[key] = values[key]
+            with self._cacheLock:
+                if generation == self._cacheGeneration:
+                    for key in missingKeys:
+                        self._cache[key] = result[key]
+        for key, value in result.iteritems():
+            if not isinstance(value, IMMUTABLE_TYPES):
+                result[key] = copy.deepcopy(value)
+        return result
+
+    def exportSnapshot(self, path=CONFIGDB_SNAPSHOT_PATH):
+        """Writes all config items to the snapshot file at {path} (see configsnapshot.py). Failures are logged, but not raised."""
+        try:
+            with self._exportLock:
+                version = db_session.query(ConfigVersion.version).filter_by(id=1).scalar()
+                items = db_session.query(ConfigEntry.key, ConfigEntry.value, ConfigEntry.desc).all()
+                db_session.rollback() # end the transaction
+                configsnapshot.writeSnapshot(path, version, items)
+        except (IOError, OSError), e:
+            logger.warning("could not export the config snapshot to %s (%s)" % (path, str(e)))
+
+    @serviceinterface
+    def subscribe(self, keyOrPrefix, callback):
+        """
+        Calls {callback}(key, value) whenever the value of a config item changes (also if the change was made by another process).
+        {keyOrPrefix} is either a key (e.g. "flask.debug") or a prefix (e.g. "flask" matches all keys starting with "flask.").
+        The callback is called in the thread which changed the value or in the watcher thread, so it should return quickly.
+        Returns a subscription id, which can be given to unsubscribe.
+        """
+        with self._subscriptionLock:
+            subscriptionId = self._nextSubscriptionId
+            self._nextSubscriptionId += 1
+            self._subscriptions[subscriptionId] = (keyOrPrefix, callback)
+            if self._knownValues is not None: # make sure the watcher does not notify about the current values
+                for row in db_session.query(ConfigEntry).filter(ConfigEntry.key.like(keyOrPrefix + '%')):
+                    if self._matches(keyOrPrefix, row.key) and not row.key in self._knownValues:
+                        self._knownValues[row.key] = row.value
+        self._ensureWatcher()
+        return subscriptionId
+
+    @serviceinterface
+    def unsubscribe(self, subscriptionId):
+        """Removes the subscription with the given id (see subscribe)."""
+        with self._subscriptionLock:
+            self._subscriptions.pop(subscriptionId, None)
 
     @serviceinterface
     def getAll(self):
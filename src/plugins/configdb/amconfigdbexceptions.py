@@ -16,3 +16,11 @@ class ConfigDuplicateConfigKey(CoreException):
   def __str__ (self):
     return "Duplicate config key '%s'" % (self.key)
 
+
+class ConfigReadOnly(CoreException):
+  def __init__ (self, key):
+    super(ConfigReadOnly, self).__init__()
+    self.key = key
+
+  def __str__ (self):
+    return "Can not change config key '%s', the config is read-only in this process (snapshot mode)" % (self.key)
@@ -0,0 +1,178 @@
+import os
+import copy
+import time
+import threading
+
+from amsoil.config import CONFIGDB_CACHE_STALENESS
+from amconfigdbexceptions import ConfigUnknownConfigKey, ConfigReadOnly
+from configsnapshot import ConfigSnapshot, SnapshotFormatError
+from amsoil.core import serviceinterface
+
+import amsoil.core.log
+logger=amsoil.core.log.getLogger('configdb')
+
+IMMUTABLE_TYPES = (basestring, int, long, float, bool, type(None))
+
+class SnapshotConfigDB(object):
+    """
+    Read-only config service, which reads the values from the snapshot file (see configsnapshot.py) instead of the database.
+    It offers the same interface as ConfigDB, but set (and install with force) raise ConfigReadOnly.
+    If a key is installed which is not in the snapshot (e.g. the snapshot was written before the plugin was added), the default value is used in this process.
+    The snapshot file is checked for changes every CONFIGDB_CACHE_STALENESS seconds, the subscribers are notified about changed values.
+    """
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.RLock()
+        self._defaults = {} # key -> value of the installed keys which are not in the snapshot
+        self._subscriptions = {} # id -> (key or prefix, callback)
+        self._nextSubscriptionId = 0
+        self._watcherPid = None
+        self._load()
+
+    def _fileId(self):
+        stat = os.stat(self._path)
+        return (stat.st_ino, stat.st_mtime, stat.st_size)
+
+    def _load(self):
+        self._loadedFileId = self._fileId()
+        self._snapshot = ConfigSnapshot(self._path)
+        self._cache = {} # key -> unpickled value
+        self._checked = time.time()
+
+    def _reloadIfChanged(self):
+        """Reloads the snapshot if the file has been replaced. Only checks if the last check is older than the staleness window. Returns the previous snapshot if it reloaded."""
+        with self._lock:
+            if time.time() - self._checked < CONFIGDB_CACHE_STALENESS:
+                return None
+            self._checked = time.time()
+            try:
+                if self._fileId() == self._loadedFileId:
+                    return None
+                previous = self._snapshot
+                self._load()
+            except (OSError, IOError, SnapshotFormatError), e:
+                logger.warning("could not reload the config snapshot %s (%s)" % (self._path, str(e)))
+                return None
+            logger.info("reloaded the config snapshot %s (config version %i)" % (self._path, self._snapshot.configVersion))
+            return previous
+
+    def _value(self, key):
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        try:
+            value = self._snapshot.get(key)
+        except KeyError:
+            if not key in self._defaults:
+                raise ConfigUnknownConfigKey(key)
+            value = self._defaults[key]
+        self._cache[key] = value
+        return value
+
+    @serviceinterface
+    def install(self, key, defaultValue, defaultDescription, force=False):
+        """Same as ConfigDB.install, but the value is only installed for this process (see class documentation)."""
+        return len(self.installMany([(key, defaultValue, defaultDescription)], force)) > 0
+
+    @serviceinterface
+    def installMany(self, items, force=False):
+        """Same as ConfigDB.installMany, but the values are only installed for this process (see class documentation)."""
+        installedKeys = []
+        with self._lock:
+            for key, defaultValue, defaultDescription in items:
+                if (key in self._snapshot) or (key in self._defaults):
+                    if force:
+                        raise ConfigReadOnly(key)
+                    continue
+                logger.warning("config key %s is not in the snapshot %s, using the default value" % (key, self._path))
+                self._defaults[key] = defaultValue
+                installedKeys.append(key)
+        return installedKeys
+
+    @serviceinterface
+    def set(self, key, value):
+        raise ConfigReadOnly(key)
+
+    @serviceinterface
+    def get(self, key):
+        self._checkForChanges()
+        with self._lock:
+            value = self._value(key)
+        if isinstance(value, IMMUTABLE_TYPES):
+            return value
+        return copy.deepcopy(value)
+
+    @serviceinterface
+    def getMany(self, keys):
+        self._checkForChanges()
+        with self._lock:
+            result = dict([(key, self._value(key)) for key in keys])
+        for key, value in result.iteritems():
+            if not isinstance(value, IMMUTABLE_TYPES):
+                result[key] = copy.deepcopy(value)
+        return result
+
+    @serviceinterface
+    def getAll(self):
+        self._checkForChanges()
+        with self._lock:
+            items = self._snapshot.items()
+        return [{'key':key, 'value':value, 'description':desc} for key, value, desc in items]
+
+    @serviceinterface
+    def subscribe(self, keyOrPrefix, callback):
+        """Same as ConfigDB.subscribe, the callbacks are called when a new snapshot has been written."""
+        with self._lock:
+            subscriptionId = self._nextSubscriptionId
+            self._nextSubscriptionId += 1
+            self._subscriptions[subscriptionId] = (keyOrPrefix, callback)
+        self._ensureWatcher()
+        return subscriptionId
+
+    @serviceinterface
+    def unsubscribe(self, subscriptionId):
+        with self._lock:
+            self._subscriptions.pop(subscriptionId, None)
+
+    def _matches(self, keyOrPrefix, key):
+        return (key == keyOrPrefix) or key.startswith(keyOrPrefix + '.') or (keyOrPrefix == '')
+
+    def _checkForChanges(self):
+        """Reloads the snapshot if it has changed and notifies the subscribers about the changed values."""
+        self._ensureWatcher()
+        previous = self._reloadIfChanged()
+        if previous is None:
+            return
+        notifications = []
+        with self._lock:
+            subscriptions = self._subscriptions.values()
+            if subscriptions:
+                oldValues = dict([(key, value) for key, value, desc in previous.items()])
+                for key, value, desc in self._snapshot.items():
+                    if (key in oldValues) and (oldValues[key] == value):
+                        continue
+                    notifications.extend([(callback, key, value) for keyOrPrefix, callback in subscriptions if self._matches(keyOrPrefix, key)])
+        previous.close()
+        for callback, key, value in notifications:
+            try:
+                callback(key, value)
+            except:
+                logger.exception("config subscriber for %s raised an exception" % (key,))
+
+    def _ensureWatcher(self):
+        with self._lock:
+            if (not self._subscriptions) or (self._watcherPid == os.getpid()):
+                return
+            self._watcherPid = os.getpid()
+            watcher = threading.Thread(target=self._watch, name='config snapshot watcher')
+            watcher.daemon = True
+            watcher.start()
+
+    def _watch(self):
+        while self._watcherPid == os.getpid():
+            time.sleep(CONFIGDB_CACHE_STALENESS)
+            try:
+                self._checkForChanges()
+            except:
+                logger.exception("config snapshot watcher failed")
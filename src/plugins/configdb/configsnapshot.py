@@ -0,0 +1,126 @@
+"""
+Read-only snapshot of the config table.
+
+The snapshot is a single file, which is written by the config service (see ConfigDB.exportSnapshot) whenever the config changes.
+It can be read via a memory map without SQLAlchemy or a sqlite connection, this keeps the start of short-lived processes (e.g. the worker or admin tools) cheap.
+Please note that this module must only depend on the python standard library (it is also used by admin/config_client.py).
+
+File format (all numbers are little endian):
+    header: magic (8 bytes "AMSOILCS"), format version (uint32), config version (uint64, see ConfigVersion), number of entries (uint32)
+    entry table: one entry per config item, sorted by key: key offset, key length, value offset, value length, description offset, description length (uint32 each)
+    data: the keys and descriptions (utf-8) and the values (pickled)
+The offsets are counted from the beginning of the file.
+
+Example code:
+    writeSnapshot('/tmp/config.snapshot', 42, [('flask.bind', '0.0.0.0', 'IP to bind to.')])
+    snapshot = ConfigSnapshot('/tmp/config.snapshot')
+    print snapshot.configVersion, snapshot.get('flask.bind')
+    for key, value, description in snapshot.items():
+        print key, value
+    snapshot.close()
+"""
+import os
+import mmap
+import struct
+import cPickle as pickle
+
+MAGIC = 'AMSOILCS'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIQI')
+ENTRY = struct.Struct('<IIIIII')
+
+class SnapshotFormatError(Exception):
+    """The file is not a snapshot or has been written in an unsupported format."""
+    pass
+
+def _encode(text):
+    if text is None:
+        return ''
+    if isinstance(text, unicode):
+        return text.encode('utf-8')
+    return str(text)
+
+def writeSnapshot(path, configVersion, items):
+    """
+    Writes the snapshot file to {path}, {configVersion} is the version of the config table and {items} is a list of (key, value, description) tuples.
+    The file is replaced atomically, so readers either see the old or the new snapshot.
+    """
+    items = sorted([(_encode(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), _encode(description)) for key, value, description in items])
+    entries = []
+    data = []
+    offset = HEADER.size + ENTRY.size * len(items)
+    for key, value, description in items:
+        entry = []
+        for chunk in (key, value, description):
+            entry.extend([offset, len(chunk)])
+            data.append(chunk)
+            offset += len(chunk)
+        entries.append(ENTRY.pack(*entry))
+    tmpPath = "%s.%i.tmp" % (path, os.getpid())
+    with open(tmpPath, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, configVersion, len(items)))
+        f.write(''.join(entries))
+        f.write(''.join(data))
+    os.rename(tmpPath, path)
+
+class ConfigSnapshot(object):
+    """Reads a snapshot file (see module documentation). The values are unpickled when they are retrieved."""
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size: # also, empty files can not be mapped
+                raise SnapshotFormatError(path)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, formatVersion, self._configVersion, self._count = HEADER.unpack_from(self._map, 0)
+        if (magic != MAGIC) or (formatVersion != FORMAT_VERSION):
+            raise SnapshotFormatError(path)
+
+    @property
+    def configVersion(self):
+        """The version of the config table the snapshot was written from."""
+        return self._configVersion
+
+    def _entry(self, index):
+        return ENTRY.unpack_from(self._map, HEADER.size + ENTRY.size * index)
+
+    def _chunk(self, offset, length):
+        return self._map[offset:offset + length]
+
+    def _find(self, key):
+        """Returns the entry of the given {key} (binary search on the entry table) or None."""
+        key = _encode(key)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            entry = self._entry(middle)
+            currentKey = self._chunk(entry[0], entry[1])
+            if currentKey < key:
+                low = middle + 1
+            elif currentKey > key:
+                high = middle
+            else:
+                return entry
+        return None
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def get(self, key):
+        """Returns the value of the given {key}. Raises KeyError if the key is not in the snapshot."""
+        entry = self._find(key)
+        if entry is None:
+            raise KeyError(key)
+        return pickle.loads(self._chunk(entry[2], entry[3]))
+
+    def keys(self):
+        return [self._chunk(*self._entry(index)[0:2]).decode('utf-8') for index in xrange(self._count)]
+
+    def items(self):
+        """Returns a list of (key, value, description) tuples, sorted by key."""
+        result = []
+        for index in xrange(self._count):
+            keyOffset, keyLength, valueOffset, valueLength, descOffset, descLength = self._entry(index)
+            result.append((self._chunk(keyOffset, keyLength).decode('utf-8'), pickle.loads(self._chunk(valueOffset, valueLength)), self._chunk(descOffset, descLength).decode('utf-8')))
+        return result
+
+    def close(self):
+        self._map.close()
@@ -1,4 +1,9 @@
+import os.path
+
 import amsoil.core.pluginmanager as pm
+from amsoil.config import (CONFIGDB_SNAPSHOT_PATH, CONFIGDB_SNAPSHOT_ROLES)
+import amsoil.core.log
+logger=amsoil.core.log.getLogger('configdb')
 
 """
 Configuration Provider
@@ -19,15 +24,46 @@ Example code:
     cBind = config.get("flask.bind") # this will yield a string (unless someone changed the value to something else)
     cPort = config.get("flask.port") # this will yield an int
 
+    # create/retrieve many at once (one transaction/one query, e.g. during setup)
+    config.installMany([("flask.bind", "0.0.0.0", "IP to bind the Flask RPC to."),
+                        ("flask.port", 8001, "Port to bind the Flask RPC to.")])
+    values = config.getMany(["flask.bind", "flask.port"]) # dict: key -> value
+
     # set a value for a key
     config.set("flask.bind", "127.0.0.1")
     
+    # get notified when a value changes (also when changed by another process)
+    def flask_changed(key, value):
+        print "%s is now %s" % (key, value)
+    config.subscribe("flask", flask_changed) # all keys starting with "flask."
+    
     # get all config items as a list of hashes:
     list = config.getAll()
+
+Snapshot mode
+Changes of the config are exported to a read-only snapshot file shortly after they have been made (see configsnapshot.py and ConfigDB).
+Processes whose role is listed in CONFIGDB_SNAPSHOT_ROLES (see config.py) read the config from this file (SnapshotConfigDB).
+In this mode the config can not be changed (set raises ConfigReadOnly).
 """
 
+def _snapshotConfigDB():
+    """Returns the SnapshotConfigDB or None if there is no usable snapshot."""
+    if not ((pm.getRole() in CONFIGDB_SNAPSHOT_ROLES) and CONFIGDB_SNAPSHOT_PATH and os.path.exists(CONFIGDB_SNAPSHOT_PATH)):
+        return None
+    # read-only processes do not need SQLAlchemy and a database connection
+    import amconfigsnapshot
+    import configsnapshot
+    try:
+        return amconfigsnapshot.SnapshotConfigDB(CONFIGDB_SNAPSHOT_PATH)
+    except (IOError, OSError, configsnapshot.SnapshotFormatError), e:
+        logger.warning("could not read the config snapshot %s, using the database (%s)" % (CONFIGDB_SNAPSHOT_PATH, str(e)))
+        return None
+
 def setup():
-    import amconfigdb
     import amconfigdbexceptions
-    pm.registerService("config", amconfigdb.ConfigDB())
+    configdb = _snapshotConfigDB()
+    if configdb is None:
+        import amconfigdb
+        configdb = amconfigdb.ConfigDB()
+    pm.registerService("config", configdb)
     pm.registerService("configexceptions", amconfigdbexceptions)
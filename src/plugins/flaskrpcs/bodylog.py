@@ -0,0 +1,79 @@
+"""
+Logging of the request and response bodies (if flask.debug is set).
+
+Logging every body in full is expensive for large payloads (e.g. advertisements), so the bodies are sampled and truncated:
+- flask.debug_sample_rate is the share of requests (0.0 to 1.0) whose bodies are logged.
+- flask.debug_method_sample_rates overrides the rate per XML-RPC method (e.g. {'ListResources' : 0.01}).
+- flask.debug_max_body is the maximum number of bytes logged per body (0 means no limit).
+- If flask.debug_full_body_on_error is set, the full bodies of failed requests (HTTP error or XML-RPC fault) are always logged.
+The logger subscribes to the config service, so the settings can be changed at runtime.
+"""
+import re
+import random
+
+from flask import request, request_started, request_finished
+
+import amsoil.core.pluginmanager as pm
+import amsoil.core.log
+logger=amsoil.core.log.getLogger('flaskrpcs')
+
+METHOD_NAME_RE = re.compile(r'<methodName>\s*([^<\s]+)\s*</methodName>')
+FAULT_SEARCH_LENGTH = 512 # the fault tag is at the beginning of the response
+
+SAMPLED_ENV_KEY = 'amsoil.bodylog.sampled'
+
+class BodyLogger(object):
+    """Connects to the flask signals of the given {app} and logs the bodies according to the config (see above)."""
+    def __init__(self, app):
+        self._readSettings()
+        pm.getService("config").subscribe("flask", self._settingChanged)
+        request_started.connect(self.logRequest, app)
+        request_finished.connect(self.logResponse, app)
+
+    def _readSettings(self):
+        config = pm.getService("config")
+        values = config.getMany(["flask.debug", "flask.debug_sample_rate", "flask.debug_method_sample_rates", "flask.debug_max_body", "flask.debug_full_body_on_error"])
+        self._debug = values["flask.debug"]
+        self._sampleRate = values["flask.debug_sample_rate"]
+        self._methodSampleRates = values["flask.debug_method_sample_rates"] or {}
+        self._maxBody = values["flask.debug_max_body"]
+        self._fullBodyOnError = values["flask.debug_full_body_on_error"]
+
+    def _settingChanged(self, key, value):
+        if key.startswith("flask.debug"):
+            self._readSettings()
+
+    def logRequest(self, sender, **extra):
+        if not self._debug:
+            return
+        data = request.data
+        method = self._methodName(data)
+        sampled = random.random() < self._methodSampleRates.get(method, self._sampleRate)
+        request.environ[SAMPLED_ENV_KEY] = sampled
+        if sampled:
+            logger.info(">>> REQUEST %s (%s):\n%s" % (request.path, method, self._truncate(data)))
+
+    def logResponse(self, sender, response, **extra):
+        if not self._debug:
+            return
+        sampled = request.environ.get(SAMPLED_ENV_KEY, False)
+        if self._fullBodyOnError and self._isError(response):
+            if not sampled: # the request has not been logged yet
+                logger.info(">>> REQUEST %s:\n%s" % (request.path, request.data))
+            logger.info(">>> RESPONSE %s:\n%s" % (response.status, response.data))
+        elif sampled:
+            logger.info(">>> RESPONSE %s:\n%s" % (response.status, self._truncate(response.data)))
+
+    def _methodName(self, data):
+        match = METHOD_NAME_RE.search(data, 0, 1024)
+        if match:
+            return match.group(1)
+        return None
+
+    def _isError(self, response):
+        return (response.status_code >= 400) or ('<fault>' in response.data[:FAULT_SEARCH_LENGTH])
+
+    def _truncate(self, data):
+        if self._maxBody and (len(data) > self._maxBody):
+            return "%s... (%i more bytes)" % (data[:self._maxBody], len(data) - self._maxBody)
+        return data
@@ -0,0 +1,197 @@
+"""
+Compression of the HTTP responses (Content-Encoding gzip or deflate, negotiated via the Accept-Encoding header of the request).
+
+The CompressionMiddleware wraps the flask app's WSGI application, so it works for all servers (standalone and FCGI behind nginx).
+- flask.compress switches the compression on/off.
+- flask.compress_min_size is the minimum size of a response body (in bytes) to be compressed. Smaller bodies are sent as they are.
+- flask.compress_level is the zlib compression level (1 fastest to 9 smallest).
+- flask.compress_stream_size is the size (in bytes) from which the compressed body is streamed:
+  Smaller bodies are compressed at once and sent with Content-Length (the connection can be kept alive).
+  Larger bodies are compressed and sent chunk by chunk without Content-Length, so the first bytes are on the wire before the whole body is compressed.
+  The same applies to responses which are generated piece by piece (the app returns a generator).
+  Please note that the XML-RPC and JSON-RPC handlers build the whole response body before the middleware gets it,
+  so for them streaming only overlaps the compression with the sending (the body itself is not produced incrementally).
+  Also, werkzeug's servers close the connection after a response without Content-Length, so streamed responses do not keep the connection alive.
+Only text, XML and JSON responses are compressed. Responses which already have a Content-Encoding are not touched.
+The middleware subscribes to the config service, so the settings can be changed at runtime.
+
+Please note that xmlrpclib (and hence most GENI clients) sends "Accept-Encoding: gzip" and decompresses the responses transparently.
+
+Example code:
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+"""
+import zlib
+import itertools
+
+import amsoil.core.pluginmanager as pm
+import amsoil.core.log
+logger=amsoil.core.log.getLogger('flaskrpcs')
+
+CHUNK_SIZE = 65536 # number of uncompressed bytes compressed at once when streaming
+COMPRESSIBLE_TYPES = ('text/', 'application/xml', 'application/json', 'application/javascript')
+UNCOMPRESSIBLE_STATUS = ('1', '204', '304')
+
+def _acceptedEncoding(header):
+    """Returns 'gzip', 'deflate' or None depending on the given Accept-Encoding {header} (gzip wins if both have the same quality)."""
+    qualities = {}
+    for item in header.split(','):
+        name, sep, parameters = item.partition(';')
+        quality = 1.0
+        for parameter in parameters.split(';'):
+            key, sep, value = parameter.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    best, bestQuality = None, 0.0
+    for encoding in ('gzip', 'deflate'):
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > bestQuality:
+            best, bestQuality = encoding, quality
+    return best
+
+def _compressor(encoding, level):
+    if encoding == 'gzip':
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS) # gzip header and trailer
+    return zlib.compressobj(level) # 'deflate' in HTTP means the zlib format
+
+class CompressionMiddleware(object):
+    """WSGI middleware, which compresses the responses of the given {app} (see module documentation)."""
+    def __init__(self, app):
+        self._app = app
+        self._readSettings()
+        pm.getService("config").subscribe("flask", self._settingChanged)
+
+    def _readSettings(self):
+        config = pm.getService("config")
+        values = config.getMany(["flask.compress", "flask.compress_min_size", "flask.compress_level", "flask.compress_stream_size"])
+        self._enabled = values["flask.compress"]
+        self._minSize = values["flask.compress_min_size"]
+        self._level = values["flask.compress_level"]
+        self._streamSize = values["flask.compress_stream_size"]
+
+    def _settingChanged(self, key, value):
+        if key.startswith("flask.compress"):
+            self._readSettings()
+
+    def __call__(self, environ, start_response):
+        encoding = None
+        if self._enabled and (environ.get('REQUEST_METHOD') != 'HEAD'):
+            encoding = _acceptedEncoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if not encoding:
+            return self._app(environ, start_response)
+
+        response = [] # status, headers, exc_info
+        written = [] # data passed to the (deprecated) write callable
+        def captureStart(status, headers, exc_info=None):
+            response[:] = [status, headers, exc_info]
+            return written.append
+        result = self._app(environ, captureStart)
+        iterator = iter(result)
+        chunks = []
+        finished = False
+        if not response: # the app calls start_response lazily (e.g. a generator), so the first chunk has to be read before the headers
+            try:
+                chunks.append(iterator.next())
+            except StopIteration:
+                finished = True
+        status, headers, exc_info = response
+        chunks = written + chunks # data passed to write comes before the iterable's data
+        if not self._isCompressible(status, headers):
+            start_response(status, headers, exc_info)
+            return self._passOn(chunks, iterator, result, finished)
+
+        # buffer the beginning of the body to decide if it is worth compressing
+        size = sum(map(len, chunks))
+        while (not finished) and (size < self._streamSize):
+            try:
+                chunk = iterator.next()
+            except StopIteration:
+                finished = True
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        if finished and size < self._minSize:
+            self._close(result)
+            start_response(status, headers, exc_info)
+            return chunks
+
+        headers = [(name, value) for name, value in headers if name.lower() != 'content-length']
+        headers.append(('Content-Encoding', encoding))
+        self._addVary(headers)
+        compressor = _compressor(encoding, self._level)
+        if finished:
+            self._close(result)
+            body = compressor.compress(''.join(chunks)) + compressor.flush()
+            headers.append(('Content-Length', str(len(body))))
+            start_response(status, headers, exc_info)
+            return [body]
+        start_response(status, headers, exc_info)
+        return self._stream(compressor, chunks, iterator, result)
+
+    def _isCompressible(self, status, headers):
+        if status.startswith(UNCOMPRESSIBLE_STATUS):
+            return False
+        contentType = ''
+        for name, value in headers:
+            name = name.lower()
+            if name == 'content-encoding':
+                return False
+            elif name == 'content-type':
+                contentType = value.lower()
+            elif name == 'content-length':
+                try:
+                    if int(value) < self._minSize:
+                        return False
+                except ValueError:
+                    pass
+        return contentType.startswith(COMPRESSIBLE_TYPES)
+
+    def _addVary(self, headers):
+        for index, (name, value) in enumerate(headers):
+            if name.lower() == 'vary':
+                if 'accept-encoding' not in value.lower():
+                    headers[index] = (name, value + ', Accept-Encoding')
+                return
+        headers.append(('Vary', 'Accept-Encoding'))
+
+    def _stream(self, compressor, chunks, iterator, result):
+        """Yields the compressed body. The compressor is flushed after every CHUNK_SIZE bytes of the uncompressed body."""
+        try:
+            unflushed = 0
+            for chunk in itertools.chain(chunks, iterator):
+                for start in xrange(0, len(chunk), CHUNK_SIZE):
+                    piece = chunk[start:start + CHUNK_SIZE]
+                    compressed = compressor.compress(piece)
+                    unflushed += len(piece)
+                    if unflushed >= CHUNK_SIZE:
+                        compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+                        unflushed = 0
+                    if compressed:
+                        yield compressed
+            yield compressor.flush()
+        finally:
+            self._close(result)
+
+    def _passOn(self, chunks, iterator, result, finished):
+        if finished:
+            self._close(result)
+            return chunks
+        if not chunks:
+            return result
+        return self._chain(chunks, iterator, result)
+
+    def _chain(self, chunks, iterator, result):
+        try:
+            for chunk in chunks:
+                yield chunk
+            for chunk in iterator:
+                yield chunk
+        finally:
+            self._close(result)
+
+    def _close(self, result):
+        if hasattr(result, 'close'):
+            result.close()
@@ -0,0 +1,432 @@
+"""
+Event-driven standalone server (flask.standalone_mode = 'eventloop').
+
+With the development and the pooled server each connection occupies a thread, also while the client is idle or slow.
+The EventLoopServer handles all connections in one thread with non-blocking sockets (poll):
+It accepts the TLS connections, does the handshakes, extracts the client certificates (like ClientCertHTTPRequestHandler)
+and reads the HTTP requests. Only when a request is complete, it is handed to a bounded pool of threads (see _Executor), which calls the WSGI app.
+When the response is ready, the thread wakes up the loop (via a pipe) and the loop writes the response.
+Hence, idle (keep-alive) and slow clients do not cost a thread. If all threads are busy and the queue is full, the request is answered with 503.
+
+Limitations: Request bodies must have a Content-Length (no chunked requests). The response of the app is collected before it is sent.
+
+Example code:
+    server = EventLoopServer('0.0.0.0', 8001, app, ssl_context, 10, 100, 128, 15, 10*1024*1024)
+    server.serve_forever()
+"""
+import os
+import sys
+import time
+import errno
+import fcntl
+import select
+import socket
+import urllib
+import threading
+import collections
+import Queue
+from cStringIO import StringIO
+
+from OpenSSL import SSL, crypto
+
+import amsoil.core.log
+logger=amsoil.core.log.getLogger('flaskrpcs')
+
+POLL_INTERVAL = 1.0 # seconds between the checks for idle connections
+READ_SIZE = 65536
+MAX_HEADER_SIZE = 65536
+
+# connection states
+HANDSHAKING = 'handshaking'
+READING = 'reading' # waiting for (the rest of) a request
+DISPATCHED = 'dispatched' # the request is being handled by a thread
+WRITING = 'writing' # sending the response
+
+class _Executor(object):
+    """Fixed number of threads which run the submitted functions. The queue for waiting functions is bounded."""
+    def __init__(self, threadCount, queueSize):
+        self._tasks = Queue.Queue(queueSize)
+        for i in range(threadCount):
+            thread = threading.Thread(target=self._work, name='rpc executor %i' % (i,))
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, func, *args):
+        """Returns False if the queue is full."""
+        try:
+            self._tasks.put_nowait((func, args))
+        except Queue.Full:
+            return False
+        return True
+
+    def _work(self):
+        while True:
+            func, args = self._tasks.get()
+            try:
+                func(*args)
+            except:
+                logger.exception("rpc executor task failed")
+
+class _Connection(object):
+    """State of one client connection. Only used by the loop's thread."""
+    def __init__(self, ssl, address):
+        self.ssl = ssl
+        self.address = address
+        self.state = HANDSHAKING
+        self.interest = select.POLLIN # what the TLS layer waits for during the handshake
+        self.wantsWrite = False # the TLS layer needs to write during a read (e.g. renegotiation)
+        self.inbuf = ''
+        self.outbuf = ''
+        self.keepAlive = True
+        self.clientCert = None
+        self.sentContinue = False
+        self.lastActivity = time.time()
+        self.closed = False
+
+class EventLoopServer(object):
+    """HTTPS server which serves the WSGI {app} from an event loop (see module documentation)."""
+
+    def __init__(self, host, port, app, ssl_context, threadCount, queueSize, backlog, idleTimeout, maxRequestSize):
+        """
+        {ssl_context} is an OpenSSL.SSL.Context, {threadCount} and {queueSize} configure the threads calling the app.
+        {backlog} is the listen backlog, {idleTimeout} the number of seconds after which idle connections are closed
+        and {maxRequestSize} is the maximum size of a request (in bytes).
+        """
+        self._app = app
+        self.ssl_context = ssl_context
+        self._idleTimeout = idleTimeout
+        self._maxRequestSize = maxRequestSize
+        self._executor = _Executor(threadCount, queueSize)
+        family = socket.AF_INET6 if ':' in host else socket.AF_INET
+        self._socket = socket.socket(family, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+        self._socket.listen(backlog)
+        self._socket.setblocking(0)
+        self.server_address = self._socket.getsockname()
+        self._connections = {} # fd -> _Connection
+        self._completed = collections.deque() # (connection, response, keepAlive) from the threads
+        self._wakeupRead, self._wakeupWrite = os.pipe()
+        for fd in (self._wakeupRead, self._wakeupWrite):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self._stopping = False
+        logger.info("event loop server with %i threads (queue %i, backlog %i)" % (threadCount, queueSize, backlog))
+
+    def serve_forever(self):
+        self._poller = select.poll()
+        self._poller.register(self._socket.fileno(), select.POLLIN)
+        self._poller.register(self._wakeupRead, select.POLLIN)
+        lastIdleCheck = time.time()
+        try:
+            while not self._stopping:
+                try:
+                    events = self._poller.poll(POLL_INTERVAL * 1000)
+                except select.error, e:
+                    if e[0] == errno.EINTR:
+                        continue
+                    raise
+                for fd, event in events:
+                    if fd == self._socket.fileno():
+                        self._accept()
+                    elif fd == self._wakeupRead:
+                        self._wokenUp()
+                    elif fd in self._connections:
+                        self._handleEvent(self._connections[fd], event)
+                if time.time() - lastIdleCheck >= POLL_INTERVAL:
+                    self._closeIdle()
+                    lastIdleCheck = time.time()
+        finally:
+            self.server_close()
+
+    def shutdown(self):
+        """Stops the loop (may be called from another thread)."""
+        self._stopping = True
+        self._wakeUp()
+
+    def server_close(self):
+        for connection in self._connections.values():
+            self._close(connection)
+        self._socket.close()
+
+    # -- loop internals
+
+    def _wakeUp(self):
+        try:
+            os.write(self._wakeupWrite, 'x')
+        except OSError, e:
+            if e.errno != errno.EAGAIN: # the loop will wake up anyway
+                raise
+
+    def _wokenUp(self):
+        try:
+            while os.read(self._wakeupRead, 4096):
+                pass
+        except OSError, e:
+            if e.errno != errno.EAGAIN:
+                raise
+        while self._completed:
+            connection, response, keepAlive = self._completed.popleft()
+            if connection.closed:
+                continue
+            connection.outbuf += response
+            connection.keepAlive = keepAlive
+            connection.state = WRITING
+            self._handleEvent(connection, select.POLLOUT)
+
+    def _accept(self):
+        while True:
+            try:
+                sock, address = self._socket.accept()
+            except socket.error, e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                if e.args[0] in (errno.EMFILE, errno.ENFILE, errno.ECONNABORTED):
+                    logger.warning("could not accept connection (%s)" % (str(e),))
+                    return
+                raise
+            sock.setblocking(0)
+            ssl = SSL.Connection(self.ssl_context, sock)
+            ssl.set_accept_state()
+            connection = _Connection(ssl, address)
+            self._connections[sock.fileno()] = connection
+            self._poller.register(sock.fileno(), select.POLLIN)
+
+    def _handleEvent(self, connection, event):
+        try:
+            if connection.state == HANDSHAKING:
+                self._handshake(connection)
+            if connection.state == READING:
+                self._read(connection)
+            if (connection.state == WRITING) or connection.wantsWrite:
+                self._write(connection)
+        except (SSL.Error, socket.error), e:
+            logger.debug("closing connection from %s (%s)" % (connection.address[0], str(e)))
+            self._close(connection)
+            return
+        if connection.closed:
+            return
+        if (event & (select.POLLHUP | select.POLLERR | select.POLLNVAL)) and not (event & select.POLLIN):
+            self._close(connection)
+            return
+        self._updateInterest(connection)
+
+    def _updateInterest(self, connection):
+        if connection.state == HANDSHAKING:
+            mask = connection.interest
+        elif connection.state == READING:
+            mask = select.POLLIN
+        elif connection.state == WRITING:
+            mask = select.POLLOUT
+        else: # DISPATCHED
+            mask = 0
+        if connection.wantsWrite:
+            mask |= select.POLLOUT
+        self._poller.modify(connection.ssl.fileno(), mask)
+
+    def _handshake(self, connection):
+        try:
+            connection.ssl.do_handshake()
+        except SSL.WantReadError:
+            connection.interest = select.POLLIN
+            return
+        except SSL.WantWriteError:
+            connection.interest = select.POLLOUT
+            return
+        peerCert = connection.ssl.get_peer_certificate()
+        if peerCert:
+            connection.clientCert = crypto.dump_certificate(crypto.FILETYPE_PEM, peerCert)
+        connection.state = READING
+        connection.lastActivity = time.time()
+
+    def _read(self, connection):
+        connection.wantsWrite = False
+        while True:
+            try:
+                data = connection.ssl.recv(READ_SIZE)
+            except SSL.WantReadError:
+                break
+            except SSL.WantWriteError:
+                connection.wantsWrite = True
+                break
+            except SSL.ZeroReturnError:
+                data = ''
+            if not data:
+                self._close(connection)
+                return
+            connection.inbuf += data
+            connection.lastActivity = time.time()
+            if len(connection.inbuf) > self._maxRequestSize + MAX_HEADER_SIZE:
+                break
+        self._parseRequest(connection)
+
+    def _write(self, connection):
+        connection.wantsWrite = False
+        while connection.outbuf:
+            try:
+                sent = connection.ssl.send(connection.outbuf[:READ_SIZE])
+            except (SSL.WantWriteError, SSL.WantReadError):
+                return
+            connection.outbuf = connection.outbuf[sent:]
+            connection.lastActivity = time.time()
+        if connection.state != WRITING:
+            return
+        if not connection.keepAlive:
+            self._close(connection)
+            return
+        connection.state = READING
+        connection.sentContinue = False
+        if connection.inbuf: # pipelined request
+            self._parseRequest(connection)
+
+    def _close(self, connection):
+        if connection.closed:
+            return
+        connection.closed = True
+        fd = connection.ssl.fileno()
+        self._connections.pop(fd, None)
+        try:
+            self._poller.unregister(fd)
+        except (KeyError, AttributeError):
+            pass
+        try:
+            connection.ssl.shutdown()
+        except:
+            pass
+        connection.ssl.close()
+
+    def _closeIdle(self):
+        now = time.time()
+        for connection in self._connections.values():
+            if (connection.state != DISPATCHED) and (now - connection.lastActivity > self._idleTimeout):
+                self._close(connection)
+
+    def _respondDirectly(self, connection, status, message):
+        """Sends an error response from the loop's thread and closes the connection afterwards."""
+        connection.outbuf += "HTTP/1.1 %s\r\nContent-Type: text/plain\r\nContent-Length: %i\r\nConnection: close\r\n\r\n%s" % (status, len(message), message)
+        connection.keepAlive = False
+        connection.inbuf = ''
+        connection.state = WRITING
+        self._write(connection)
+
+    def _parseRequest(self, connection):
+        """Dispatches the request in the connection's input buffer, if it is complete."""
+        if connection.state != READING:
+            return
+        headerEnd = connection.inbuf.find('\r\n\r\n')
+        if headerEnd == -1:
+            if len(connection.inbuf) > MAX_HEADER_SIZE:
+                self._respondDirectly(connection, '431 REQUEST HEADER FIELDS TOO LARGE', 'Request header too large')
+            return
+        lines = connection.inbuf[:headerEnd].split('\r\n')
+        try:
+            method, target, protocol = lines[0].split(' ', 2)
+        except ValueError:
+            self._respondDirectly(connection, '400 BAD REQUEST', 'Malformed request line')
+            return
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if not sep:
+                continue
+            name = name.strip().lower()
+            headers[name] = (headers[name] + ', ' + value.strip()) if name in headers else value.strip()
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            self._respondDirectly(connection, '411 LENGTH REQUIRED', 'Chunked requests are not supported')
+            return
+        try:
+            contentLength = int(headers.get('content-length', 0))
+        except ValueError:
+            self._respondDirectly(connection, '400 BAD REQUEST', 'Malformed Content-Length')
+            return
+        if contentLength > self._maxRequestSize:
+            self._respondDirectly(connection, '413 REQUEST ENTITY TOO LARGE', 'Request too large')
+            return
+        bodyStart = headerEnd + 4
+        if len(connection.inbuf) - bodyStart < contentLength:
+            if (headers.get('expect', '').lower() == '100-continue') and not connection.sentContinue:
+                connection.outbuf += 'HTTP/1.1 100 Continue\r\n\r\n'
+                connection.sentContinue = True
+                self._write(connection)
+            return
+        body = connection.inbuf[bodyStart:bodyStart + contentLength]
+        connection.inbuf = connection.inbuf[bodyStart + contentLength:]
+
+        connectionHeader = headers.get('connection', '').lower()
+        if protocol == 'HTTP/1.1':
+            keepAlive = (connectionHeader != 'close')
+        else:
+            keepAlive = (connectionHeader == 'keep-alive')
+        environ = self._makeEnviron(connection, method, target, protocol, headers, body)
+        connection.state = DISPATCHED
+        if not self._executor.submit(self._runApp, connection, environ, keepAlive):
+            logger.warning("all rpc threads are busy, rejecting request from %s" % (connection.address[0],))
+            self._respondDirectly(connection, '503 SERVICE UNAVAILABLE', 'Server busy, please retry')
+
+    def _makeEnviron(self, connection, method, target, protocol, headers, body):
+        path, sep, query = target.partition('?')
+        environ = {
+            'REQUEST_METHOD' : method,
+            'SCRIPT_NAME' : '',
+            'PATH_INFO' : urllib.unquote(path),
+            'QUERY_STRING' : query,
+            'SERVER_NAME' : str(self.server_address[0]),
+            'SERVER_PORT' : str(self.server_address[1]),
+            'SERVER_PROTOCOL' : protocol,
+            'REMOTE_ADDR' : connection.address[0],
+            'REMOTE_PORT' : str(connection.address[1]),
+            'CONTENT_LENGTH' : str(len(body)),
+            'wsgi.version' : (1, 0),
+            'wsgi.url_scheme' : 'https',
+            'wsgi.input' : StringIO(body),
+            'wsgi.errors' : sys.stderr,
+            'wsgi.multithread' : True,
+            'wsgi.multiprocess' : False,
+            'wsgi.run_once' : False }
+        if 'content-type' in headers:
+            environ['CONTENT_TYPE'] = headers['content-type']
+        for name, value in headers.iteritems():
+            if name in ('content-type', 'content-length'):
+                continue
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+        if connection.clientCert:
+            environ['CLIENT_RAW_CERT'] = connection.clientCert
+        return environ
+
+    def _runApp(self, connection, environ, keepAlive):
+        """Runs in an executor thread: calls the app, renders the response and hands it back to the loop."""
+        responseStart = []
+        body = []
+        def start_response(status, headers, exc_info=None):
+            if exc_info and responseStart:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            responseStart[:] = [status, headers]
+            return body.append
+        try:
+            result = self._app(environ, start_response)
+            try:
+                for data in result:
+                    if data:
+                        body.append(data)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        except:
+            logger.exception("error while handling %s %s" % (environ['REQUEST_METHOD'], environ['PATH_INFO']))
+            responseStart[:] = ['500 INTERNAL SERVER ERROR', [('Content-Type', 'text/plain')]]
+            body = ['Internal Server Error']
+        status, headers = responseStart
+        body = ''.join(body)
+        lines = ["HTTP/1.1 %s" % (status,)]
+        hasLength = False
+        for name, value in headers:
+            if name.lower() == 'content-length':
+                hasLength = True
+            elif name.lower() == 'connection':
+                continue
+            lines.append("%s: %s" % (name, value))
+        if not hasLength:
+            lines.append("Content-Length: %i" % (len(body),))
+        lines.append("Connection: %s" % ('keep-alive' if keepAlive else 'close',))
+        logger.debug("%s - %s %s %s" % (environ['REMOTE_ADDR'], environ['REQUEST_METHOD'], environ['PATH_INFO'], status))
+        self._completed.append((connection, '\r\n'.join(lines) + '\r\n\r\n' + body, keepAlive))
+        self._wakeUp()
@@ -0,0 +1,126 @@
+import sys
+import json
+import base64
+import datetime
+import xmlrpclib
+from xmlrpclib import Fault
+
+from flask import request, Response
+
+from xmlrpcdispatcher import XMLRPCDispatcher
+
+from amsoil.core import serviceinterface
+
+# error codes defined by the JSON-RPC 2.0 specification
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000 # used for exceptions which are not a Fault (same as faultCode 1 on the XML-RPC interface)
+
+def _encodeSpecial(value):
+    """Converts the values which json can not encode, but xmlrpclib can."""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, xmlrpclib.DateTime):
+        return value.value
+    if isinstance(value, xmlrpclib.Binary):
+        return base64.b64encode(value.data)
+    raise TypeError("cannot encode %s objects" % (type(value),))
+
+def _stringify(value):
+    """Converts the unicode strings json returns (also in lists and dicts) to UTF-8 byte strings (ASCII strings are the same as with xmlrpclib).
+    The receivers expect byte strings, e.g. lxml rejects unicode strings with an encoding declaration (<?xml ... encoding="UTF-8"?>)."""
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [_stringify(item) for item in value]
+    if isinstance(value, dict):
+        return dict([(_stringify(key), _stringify(item)) for key, item in value.iteritems()])
+    return value
+
+class JSONRPCHandler(object):
+    """Receives the JSON-RPC 2.0 requests (also batches) for one endpoint and passes them to the {instance}'s _dispatch method."""
+    def __init__(self, endpoint_name, instance):
+        self._endpoint_name = endpoint_name
+        self._instance = instance
+
+    def connect(self, app, endpoint):
+        app.add_url_rule(endpoint, self._endpoint_name, self.handle_request, methods=['POST'])
+
+    def handle_request(self):
+        try:
+            call = json.loads(request.data)
+        except ValueError:
+            return self._respond(self._error(None, PARSE_ERROR, "Parse error"))
+        if isinstance(call, list):
+            if not call:
+                return self._respond(self._error(None, INVALID_REQUEST, "Empty batch"))
+            responses = [response for response in [self._call(c) for c in call] if response is not None]
+            return self._respond(responses or None)
+        return self._respond(self._call(call))
+
+    def _respond(self, data):
+        if data is None: # only notifications
+            return Response(status=204)
+        return Response(json.dumps(data, separators=(',', ':'), default=_encodeSpecial), content_type='application/json')
+
+    def _error(self, callId, code, message):
+        return {'jsonrpc' : '2.0', 'error' : {'code' : code, 'message' : message}, 'id' : callId}
+
+    def _call(self, call):
+        """Returns the response for the given call or None if the call is a notification (no id)."""
+        if not isinstance(call, dict) or not isinstance(call.get('method'), basestring):
+            return self._error(None, INVALID_REQUEST, "Invalid request")
+        isNotification = 'id' not in call
+        callId = call.get('id')
+        method = call['method']
+        params = call.get('params', [])
+        if not isinstance(params, list):
+            response = self._error(callId, INVALID_PARAMS, "Only positional parameters (array) are supported")
+        else:
+            try:
+                result = self._instance._dispatch(method, _stringify(params))
+                response = {'jsonrpc' : '2.0', 'result' : result, 'id' : callId}
+            except AttributeError:
+                if self._instance._isRPCMethod(method):
+                    response = self._error(callId, SERVER_ERROR, "%s:%s" % sys.exc_info()[:2])
+                else:
+                    response = self._error(callId, METHOD_NOT_FOUND, "Method not found: %s" % (method,))
+            except Fault, fault:
+                response = self._error(callId, fault.faultCode, fault.faultString)
+            except:
+                response = self._error(callId, SERVER_ERROR, "%s:%s" % sys.exc_info()[:2])
+        if isNotification:
+            return None
+        return response
+
+class FlaskJSONRPC(object):
+    """
+    Encapsulates a JSON-RPC (2.0) receiver within a flask server.
+    It also exports the service jsonrpc, which has the same service contract as the xmlrpc service (please see FlaskXMLRPC).
+    Hence, the same receiver instance can be registered for XML-RPC and JSON-RPC (on different endpoints).
+    Additionally:
+    - Only positional parameters are supported (params must be an array).
+    - Strings are passed to the receiver as UTF-8 encoded str (json would return unicode).
+    - Faults raised by the receiver are returned as error with the fault's code and string. Other exceptions are returned with the code -32000.
+    - Values which JSON does not know are converted: datetimes to ISO 8601 strings and xmlrpclib.Binary to base64 strings.
+    - Batches (arrays of calls) and notifications (calls without id) are supported.
+    """
+    def __init__(self, flaskapp):
+        self._flaskapp = flaskapp
+
+    @property
+    @serviceinterface
+    def Dispatcher(self):
+        """Base class for all JSON-RPC receivers which register for registerJSONRPC(...) (the same class as xmlrpc's Dispatcher)."""
+        return XMLRPCDispatcher
+
+    @serviceinterface
+    def registerJSONRPC(self, unique_service_name, instance, endpoint):
+        """Register the receiver.
+        {unique_service_name} has to be a unique name among all flask endpoints (also the XML-RPC ones).
+        The {instance} is an object (an {Dispatcher} instance) providing the methods which get called via the JSON-RPC enpoint.
+        {endpoint} is the mounting point for the JSON-RPC interface (e.g. '/geni/json' )."""
+        handler = JSONRPCHandler(unique_service_name, instance)
+        handler.connect(self._flaskapp.app, endpoint)
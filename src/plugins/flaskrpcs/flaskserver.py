@@ -1,4 +1,4 @@
-from flask import Flask, request, request_started, request_finished
+from flask import Flask
 
 import amsoil.core.pluginmanager as pm
 import amsoil.core.log
@@ -6,9 +6,25 @@ logger=amsoil.core.log.getLogger('flaskrpcs')
 
 from amsoil.core import serviceinterface
 
+import multiprocessing
+
 from werkzeug import serving
 from OpenSSL import SSL, crypto
 
+import prefork
+import pooledserver
+import eventserver
+from bodylog import BodyLogger
+from compression import CompressionMiddleware
+
+RESTART_SETTINGS = ["flask.bind", "flask.app_port", "flask.fcgi_port", "flask.fcgi", "flask.force_client_cert", "flask.prefork_workers", "flask.prefork_max_requests",
+                    "flask.standalone_mode", "flask.pool_threads", "flask.pool_queue_size", "flask.listen_backlog", "flask.keepalive_timeout",
+                    "flask.eventloop_threads", "flask.eventloop_queue_size", "flask.max_request_size"]
+
+STANDALONE_DEVELOPMENT = 'development'
+STANDALONE_POOLED = 'pooled'
+STANDALONE_EVENTLOOP = 'eventloop'
+
 class ClientCertHTTPRequestHandler(serving.WSGIRequestHandler):
     """Overwrite the werkzeug handler, so we can extract the client cert and put it into the request's environment."""
     def make_environ(self):
@@ -36,6 +52,12 @@ class FlaskServer(object):
         --http--> nginx webserver --fcgi--> WSGIServer --WSGI--> FlaskApp
     When using the development server:
         werkzeug server --WSGI--> FlaskApp
+    When using the pooled server (see pooledserver.py):
+        werkzeug server --queue--> n x thread --WSGI--> FlaskApp
+    When using the event loop server (see eventserver.py):
+        event loop (all connections) --queue--> n x thread --WSGI--> FlaskApp
+    When using the pre-forked server (see runPreforkServer):
+        supervisor --fork--> n x werkzeug server (shared socket) --WSGI--> FlaskApp
     """
     
     @serviceinterface
@@ -43,16 +65,16 @@ class FlaskServer(object):
         """Constructur for the server wrapper."""
         self._app = Flask(__name__) # imports the named package, in this case this file
 
-        # Setup debugging for app
-        config = pm.getService("config")
-        cDebug = config.get("flask.debug")
-        if cDebug: # log all actions on the XML-RPC interface
-            def log_request(sender, **extra):
-                logger.info(">>> REQUEST %s:\n%s" % (request.path, request.data))
-            request_started.connect(log_request, self._app)
-            def log_response(sender, response, **extra):
-                logger.info(">>> RESPONSE %s:\n%s" % (response.status, response.data))
-            request_finished.connect(log_response, self._app)
+        # Setup debugging for app (logs a sample of the bodies on the XML-RPC interface if flask.debug is set)
+        self._bodyLogger = BodyLogger(self._app) # keep a reference, the signals only hold weak references
+        # Compress the responses if the client accepts it (see compression.py)
+        self._app.wsgi_app = CompressionMiddleware(self._app.wsgi_app)
+        pm.getService("config").subscribe("flask", self._settingChanged)
+
+    def _settingChanged(self, key, value):
+        """The server's socket is created once, so changes to the server settings only apply after a restart."""
+        if key in RESTART_SETTINGS:
+            logger.warning("%s has been changed to %s, please restart the server (or send SIGHUP to the pre-fork supervisor) to apply it" % (key, value))
 
     @property
     def app(self):
@@ -61,7 +83,13 @@ class FlaskServer(object):
 
     @serviceinterface
     def runServer(self):
-        """Starts up the server. It (will) support different config options via the config plugin."""
+        """
+        Starts up the server. It supports different config options via the config plugin.
+        If flask.fcgi is set, the FCGI server is started. Otherwise flask.standalone_mode determines the standalone server:
+        'development' starts werkzeug's single-threaded server with the reloader, 'pooled' the PooledWSGIServer (see pooledserver.py)
+        and 'eventloop' the EventLoopServer (see eventserver.py).
+        These servers can not be reloaded via SIGHUP (please use runPreforkServer for that).
+        """
         config = pm.getService("config")
         debug = config.get("flask.debug")
         cFCGI = config.get("flask.fcgi")
@@ -69,11 +97,20 @@ class FlaskServer(object):
         app_port = config.get("flask.app_port")
         fcgi_port = config.get("flask.fcgi_port")
         must_have_client_cert = config.get("flask.force_client_cert")
+        standalone_mode = config.get("flask.standalone_mode")
 
         if cFCGI:
             logger.info("registering fcgi server at %s:%i", host, fcgi_port)
             from flup.server.fcgi import WSGIServer
             WSGIServer(self._app, bindAddress=(host, fcgi_port)).run()
+        elif standalone_mode == STANDALONE_POOLED:
+            logger.info("registering pooled app server at %s:%i", host, app_port)
+            server = self._makePooledServer(host, app_port, must_have_client_cert)
+            server.serve_forever()
+        elif standalone_mode == STANDALONE_EVENTLOOP:
+            logger.info("registering event loop app server at %s:%i", host, app_port)
+            server = self._makeEventLoopServer(host, app_port, must_have_client_cert)
+            server.serve_forever()
         else:
             logger.info("registering app server at %s:%i", host, app_port)
             # do the following line manually, so we can intervene and adjust the ssl context
@@ -89,11 +126,7 @@ class FlaskServer(object):
                 import socket
                 application = DebuggedApplication(self._app, True)
                 def inner():
-                    server = serving.make_server(host, app_port, self._app, False, 1, ClientCertHTTPRequestHandler, False, 'adhoc')
-                    # The following line is the reason why I copied all that code!
-                    if must_have_client_cert:
-                        server.ssl_context.set_verify(SSL.VERIFY_PEER | SSL.VERIFY_FAIL_IF_NO_PEER_CERT, lambda a,b,c,d,e: True)
-                    # That's it
+                    server = self._makeServer(host, app_port, must_have_client_cert)
                     server.serve_forever()
                 address_family = serving.select_ip_version(host, app_port)
                 test_socket = socket.socket(address_family, socket.SOCK_STREAM)
@@ -103,4 +136,64 @@ class FlaskServer(object):
                 serving.run_with_reloader(inner, None, 1)
             finally:
                 self._app._got_first_request = False
-            
+
+    @serviceinterface
+    def runPreforkServer(self):
+        """
+        Starts up the server with pre-forked worker processes, which share the listening socket (see prefork.py).
+        The number of workers and the number of requests after which a worker is replaced are read from the config plugin.
+        This only makes sense if all loaded plugins support multiple processes (see IS_MULTIPROCESS in config.py).
+        Sending SIGHUP to the supervisor reloads the plugins and the config without dropping connections (standalone server only, see prefork.py).
+        """
+        config = pm.getService("config")
+        cFCGI = config.get("flask.fcgi")
+        host = config.get("flask.bind")
+        app_port = config.get("flask.app_port")
+        fcgi_port = config.get("flask.fcgi_port")
+        must_have_client_cert = config.get("flask.force_client_cert")
+        workers = config.get("flask.prefork_workers") or multiprocessing.cpu_count()
+        max_requests = config.get("flask.prefork_max_requests")
+
+        if cFCGI:
+            logger.info("registering pre-forked fcgi server at %s:%i", host, fcgi_port)
+            from flup.server.fcgi_fork import WSGIServer
+            WSGIServer(self._app, bindAddress=(host, fcgi_port), minSpare=workers, maxSpare=workers, maxChildren=workers, maxRequests=max_requests).run()
+        else:
+            logger.info("registering pre-forked app server at %s:%i", host, app_port)
+            server = self._makeServer(host, app_port, must_have_client_cert)
+            prefork.PreforkSupervisor(server, workers, max_requests).run()
+
+    def _makeServer(self, host, app_port, must_have_client_cert):
+        """Creates the werkzeug server (and the listening socket) for the standalone mode."""
+        inherited_fd = prefork.inheritedListenFD()
+        if inherited_fd is not None: # reloading a pre-forked server, use the socket of the previous supervisor
+            server = prefork.InheritedSocketWSGIServer(inherited_fd, host, app_port, self._app, ClientCertHTTPRequestHandler, False, 'adhoc')
+        else:
+            server = serving.make_server(host, app_port, self._app, False, 1, ClientCertHTTPRequestHandler, False, 'adhoc')
+        # The following line is the reason why I copied all that code!
+        if must_have_client_cert:
+            server.ssl_context.set_verify(SSL.VERIFY_PEER | SSL.VERIFY_FAIL_IF_NO_PEER_CERT, lambda a,b,c,d,e: True)
+        # That's it
+        return server
+
+    def _makePooledServer(self, host, app_port, must_have_client_cert):
+        """Creates the PooledWSGIServer with the settings from the config plugin (see pooledserver.py)."""
+        config = pm.getService("config")
+        settings = config.getMany(["flask.pool_threads", "flask.pool_queue_size", "flask.listen_backlog", "flask.keepalive_timeout"])
+        handler = pooledserver.keepAliveHandler(ClientCertHTTPRequestHandler, settings["flask.keepalive_timeout"])
+        server = pooledserver.PooledWSGIServer(host, app_port, self._app, handler, 'adhoc',
+                                               settings["flask.pool_threads"], settings["flask.pool_queue_size"], settings["flask.listen_backlog"])
+        if must_have_client_cert:
+            server.ssl_context.set_verify(SSL.VERIFY_PEER | SSL.VERIFY_FAIL_IF_NO_PEER_CERT, lambda a,b,c,d,e: True)
+        return server
+
+    def _makeEventLoopServer(self, host, app_port, must_have_client_cert):
+        """Creates the EventLoopServer with the settings from the config plugin (see eventserver.py)."""
+        config = pm.getService("config")
+        settings = config.getMany(["flask.eventloop_threads", "flask.eventloop_queue_size", "flask.listen_backlog", "flask.keepalive_timeout", "flask.max_request_size"])
+        server = eventserver.EventLoopServer(host, app_port, self._app, serving.generate_adhoc_ssl_context(),
+                                             settings["flask.eventloop_threads"], settings["flask.eventloop_queue_size"], settings["flask.listen_backlog"],
+                                             settings["flask.keepalive_timeout"], settings["flask.max_request_size"])
+        if must_have_client_cert:
+            server.ssl_context.set_verify(SSL.VERIFY_PEER | SSL.VERIFY_FAIL_IF_NO_PEER_CERT, lambda a,b,c,d,e: True)
+        return server
@@ -1,9 +1,58 @@
+import sys
+
 from flup.server.fcgi import WSGIServer
 from flaskext.xmlrpc import XMLRPCHandler, Fault
 
 from xmlrpcdispatcher import XMLRPCDispatcher
+import xmlrpccodec
 
 from amsoil.core import serviceinterface
+import amsoil.core.pluginmanager as pm
+
+class CodecXMLRPCHandler(XMLRPCHandler):
+    """
+    Same as flaskext's handler, but the XML is (de)serialized by the given {codec} (see xmlrpccodec.py).
+    It also offers system.multicall with at most {multicallMaxCalls} calls per request.
+    """
+    def __init__(self, endpoint_name, codec, multicallMaxCalls):
+        XMLRPCHandler.__init__(self, endpoint_name) # no super, because old style class
+        self._codec = codec
+        self._multicallMaxCalls = multicallMaxCalls
+        self.register_introspection_functions()
+        self.register_multicall_functions()
+
+    def system_multicall(self, call_list):
+        """Same as SimpleXMLRPCDispatcher.system_multicall, but the number of calls is limited and multicalls can not be nested."""
+        if len(call_list) > self._multicallMaxCalls:
+            raise Fault(1, "system.multicall: too many calls (%i, at most %i are allowed)" % (len(call_list), self._multicallMaxCalls))
+        results = []
+        for call in call_list:
+            try:
+                if call['methodName'] == 'system.multicall':
+                    raise Fault(1, "system.multicall can not be nested")
+                results.append([self._dispatch(call['methodName'], call['params'])])
+            except Fault, fault:
+                results.append({'faultCode' : fault.faultCode, 'faultString' : fault.faultString})
+            except:
+                exc_type, exc_value, exc_tb = sys.exc_info()
+                results.append({'faultCode' : 1, 'faultString' : "%s:%s" % (exc_type, exc_value)})
+        return results
+
+    def _marshaled_dispatch(self, data, dispatch_method=None, path=None):
+        """Copy of SimpleXMLRPCDispatcher._marshaled_dispatch with xmlrpclib replaced by the codec."""
+        try:
+            params, method = self._codec.loads(data)
+            if dispatch_method is not None:
+                response = dispatch_method(method, params)
+            else:
+                response = self._dispatch(method, params)
+            response = self._codec.dumps((response,), methodresponse=1, allow_none=self.allow_none, encoding=self.encoding)
+        except Fault, fault:
+            response = self._codec.dumps(fault, allow_none=self.allow_none, encoding=self.encoding)
+        except:
+            exc_type, exc_value, exc_tb = sys.exc_info()
+            response = self._codec.dumps(Fault(1, "%s:%s" % (exc_type, exc_value)), encoding=self.encoding, allow_none=self.allow_none)
+        return response
 
 class FlaskXMLRPC(object):
     """
@@ -17,6 +66,9 @@ class FlaskXMLRPC(object):
     - The Dispatcher offers a method called {requestCertificate}, which returns the current request's SSL certificate or None, if there wasn't any.
     - The registered instance's method gets called when the XMLRPC call comes in (e.g. client sends bla(x), instance.bla(self, x) gets called).
     - These method's return value gets passed back to the user.
+    - Besides the instance's methods, clients can call system.listMethods, system.methodHelp and system.multicall (see CodecXMLRPCHandler).
+      Each call of a multicall is dispatched separately, so a failing call results in a fault entry and the other calls are not affected.
+    The XML is (de)serialized by the codec configured in flask.xmlrpc_codec (see xmlrpccodec.py), all codecs produce the same wire format.
     """
     def __init__(self, flaskapp):
         self._flaskapp = flaskapp
@@ -34,7 +86,9 @@ class FlaskXMLRPC(object):
         The {instance} is an object (an {Dispatcher} instance) providing the methods which get called via the XMLRPC enpoint.
         {endpoint} is the mounting point for the XML RPC interface (e.g. '/geni' )."""
         # TODO only set the ClientCert Handler if configured
-        handler = XMLRPCHandler(unique_service_name)
+        config = pm.getService("config")
+        settings = config.getMany(["flask.xmlrpc_codec", "flask.multicall_max_calls"])
+        handler = CodecXMLRPCHandler(unique_service_name, xmlrpccodec.getCodec(settings["flask.xmlrpc_codec"]), settings["flask.multicall_max_calls"])
         handler.connect(self._flaskapp.app, endpoint)
         handler.register_instance(instance)
 
@@ -1,22 +1,43 @@
 """
-Please see the documentation in FlaskXMLRPC.
+Please see the documentation in FlaskXMLRPC and FlaskJSONRPC.
 """
 import amsoil.core.pluginmanager as pm
 import amsoil.core.log
 logger=amsoil.core.log.getLogger('flaskrpcs')
 
 from flaskxmlrpc import FlaskXMLRPC
+from flaskjsonrpc import FlaskJSONRPC
 from flaskserver import FlaskServer
 
 def setup():
     config = pm.getService("config")
     # create default configurations (if they are not already in the database)
-    config.install("flask.bind", "0.0.0.0", "IP to bind the Flask RPC to.")
-    config.install("flask.fcgi_port", 9001, "Port to bind the Flask RPC to (FCGI server).")
-    config.install("flask.app_port", 8001, "Port to bind the Flask RPC to (standalone server).")
-    config.install("flask.debug", True, "Write logging messages for the Flask RPC server.")
-    config.install("flask.fcgi", False, "Use FCGI server instead of the development server.")
-    config.install("flask.force_client_cert", True, "Only applies if flask.debug is set: Determines if the client _must_ present a certificate. No validation is performed.")
+    config.installMany([("flask.bind", "0.0.0.0", "IP to bind the Flask RPC to."),
+                        ("flask.fcgi_port", 9001, "Port to bind the Flask RPC to (FCGI server)."),
+                        ("flask.app_port", 8001, "Port to bind the Flask RPC to (standalone server)."),
+                        ("flask.debug", True, "Write logging messages for the Flask RPC server."),
+                        ("flask.debug_sample_rate", 1.0, "Only applies if flask.debug is set: Share of the requests (0.0 to 1.0) whose request and response bodies are logged."),
+                        ("flask.debug_method_sample_rates", {}, "Only applies if flask.debug is set: Sample rates per XML-RPC method, overriding flask.debug_sample_rate (e.g. {'ListResources' : 0.01})."),
+                        ("flask.debug_max_body", 4096, "Only applies if flask.debug is set: Maximum number of bytes logged per request/response body (0 means no limit)."),
+                        ("flask.debug_full_body_on_error", False, "Only applies if flask.debug is set: Always log the full bodies of requests which failed (HTTP error or XML-RPC fault)."),
+                        ("flask.fcgi", False, "Use FCGI server instead of the development server."),
+                        ("flask.force_client_cert", True, "Only applies if flask.debug is set: Determines if the client _must_ present a certificate. No validation is performed."),
+                        ("flask.prefork_workers", 0, "Number of worker processes when started with --prefork (0 means one per CPU)."),
+                        ("flask.prefork_max_requests", 1000, "Number of requests after which a pre-forked worker process is replaced by a fresh one (0 means never)."),
+                        ("flask.standalone_mode", "development", "Only applies if flask.fcgi is not set: 'development' (single-threaded, with reloader), 'pooled' (thread pool, keep-alive, no reloader) or 'eventloop' (non-blocking connections, thread pool for the calls, no reloader)."),
+                        ("flask.pool_threads", 10, "Only applies to the pooled server: Number of threads serving connections."),
+                        ("flask.pool_queue_size", 50, "Only applies to the pooled server: Number of accepted connections waiting for a free thread."),
+                        ("flask.listen_backlog", 128, "Only applies to the pooled and the event loop server: Number of connections the kernel queues before they are accepted."),
+                        ("flask.keepalive_timeout", 15, "Only applies to the pooled and the event loop server: Seconds an idle keep-alive connection is kept open."),
+                        ("flask.eventloop_threads", 10, "Only applies to the event loop server: Number of threads handling the calls."),
+                        ("flask.eventloop_queue_size", 100, "Only applies to the event loop server: Number of requests waiting for a free thread (further requests are answered with 503)."),
+                        ("flask.max_request_size", 10*1024*1024, "Only applies to the event loop server: Maximum size of a request body in bytes."),
+                        ("flask.xmlrpc_codec", "xmlrpclib", "Codec for the XML-RPC interface: 'xmlrpclib' (pure-Python) or 'fast' (tree based, uses lxml if installed). Applies to endpoints registered after the change."),
+                        ("flask.multicall_max_calls", 100, "Maximum number of calls in one system.multicall request on the XML-RPC interface. Applies to endpoints registered after the change."),
+                        ("flask.compress", True, "Compress the responses with gzip or deflate if the client accepts it (Accept-Encoding)."),
+                        ("flask.compress_min_size", 1024, "Only applies if flask.compress is set: Minimum size of a response body in bytes to be compressed."),
+                        ("flask.compress_level", 6, "Only applies if flask.compress is set: zlib compression level (1 fastest to 9 smallest)."),
+                        ("flask.compress_stream_size", 1024*1024, "Only applies if flask.compress is set: Response bodies from this size (in bytes) are compressed and sent chunk by chunk without Content-Length.")])
     
 
     # create and register the RPC server
@@ -27,4 +48,6 @@ def setup():
     xmlrpc = FlaskXMLRPC(flaskserver)
     pm.registerService('xmlrpc', xmlrpc)
 
-    # TODO create and register the JSON-RPC server
+    # create and register the JSON-RPC server
+    jsonrpc = FlaskJSONRPC(flaskserver)
+    pm.registerService('jsonrpc', jsonrpc)
@@ -0,0 +1,88 @@
+"""
+Standalone server with a bounded pool of threads (flask.standalone_mode = 'pooled').
+
+The werkzeug development server handles one connection at a time, so a slow call blocks all other clients.
+The PooledWSGIServer accepts the connections in the main thread and puts them into a bounded queue, from which a fixed number of threads take and serve them.
+If the queue is full, the main thread stops accepting until a thread becomes free (further clients wait in the listen backlog).
+Connections are kept alive (HTTP/1.1) until the client is idle for flask.keepalive_timeout seconds.
+Please note that werkzeug closes the connection after a response without Content-Length,
+so connections with responses whose length is not known in advance (e.g. streamed responses) are not kept alive.
+There is no reloader in this mode.
+
+Example code:
+    server = PooledWSGIServer('0.0.0.0', 8001, app, KeepAliveHandler, 'adhoc', 10, 50, 128)
+    server.serve_forever()
+"""
+import errno
+import socket
+import struct
+import threading
+import Queue
+
+from werkzeug import serving
+from OpenSSL import SSL
+
+import amsoil.core.log
+logger=amsoil.core.log.getLogger('flaskrpcs')
+
+def keepAliveHandler(baseHandler, idleTimeout):
+    """Returns a subclass of the given request handler class, which keeps the connection open for {idleTimeout} seconds between the requests."""
+    class KeepAliveHandler(baseHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def setup(self):
+            # a receive timeout on the socket, instead of settimeout (which turns SSL connections non-blocking)
+            self.request.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, struct.pack('ll', idleTimeout, 0))
+            baseHandler.setup(self)
+
+        def handle(self):
+            try:
+                baseHandler.handle(self)
+            except (SSL.WantReadError, socket.timeout):
+                pass # the client was idle for too long
+            except socket.error, e:
+                if not e.args or e.args[0] not in (errno.EAGAIN, errno.ECONNRESET, errno.EPIPE):
+                    raise
+    return KeepAliveHandler
+
+class PooledWSGIServer(serving.BaseWSGIServer):
+    """werkzeug server, which serves the connections with a pool of threads (see module documentation)."""
+
+    def __init__(self, host, port, app, handler, ssl_context, threadCount, queueSize, backlog, **options):
+        """
+        {threadCount} is the number of threads serving connections, {queueSize} the number of accepted connections waiting for a thread
+        and {backlog} the number of connections the kernel queues before they are accepted.
+        {options} are passed to werkzeug's BaseWSGIServer (e.g. passthrough_errors).
+        """
+        self.request_queue_size = backlog # used by SocketServer for listen()
+        serving.BaseWSGIServer.__init__(self, host, port, app, handler=handler, ssl_context=ssl_context, **options)
+        self._connections = Queue.Queue(queueSize)
+        self._threads = []
+        for i in range(threadCount):
+            thread = threading.Thread(target=self._serveConnections, name='rpc pool %i' % (i,))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        logger.info("pooled server with %i threads (queue %i, backlog %i)" % (threadCount, queueSize, backlog))
+
+    def process_request(self, request, client_address):
+        """Called in the accepting thread. Hands the connection to the pool (blocks if the queue is full)."""
+        self._connections.put((request, client_address))
+
+    def _serveConnections(self):
+        while True:
+            item = self._connections.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        serving.BaseWSGIServer.server_close(self)
+        for thread in self._threads:
+            self._connections.put(None)
@@ -0,0 +1,235 @@
+"""
+Pre-forking supervisor for the standalone (werkzeug) server.
+
+The listening socket is created once in the supervisor process (after all plugins have been loaded).
+Then the supervisor forks a number of worker processes, which all accept connections on the shared socket and handle one request at a time.
+If a worker dies, it is replaced by a new one. Each worker exits after handling a maximum number of requests and is replaced as well (recycling).
+Since each worker is a separate python interpreter, the requests are handled on all cores (and not serialized by the GIL).
+
+Please note:
+- Only plugins which support multiple processes must be loaded (see "multi-process-supported" in the pluginmanager and IS_MULTIPROCESS in config.py).
+- Threads started by plugins during their setup only exist in the supervisor, not in the workers.
+- When the supervisor receives SIGTERM or SIGINT, the workers finish their current request and exit.
+
+Graceful reload
+When the supervisor receives SIGHUP, it starts a successor: The supervisor forks and re-executes the same command (e.g. main.py --prefork),
+passing on the listening socket's file descriptor and its own pid via the environment (see LISTEN_FD_ENV and PREDECESSOR_PID_ENV).
+The successor loads the plugins (and hence the config) from scratch, creates the server on the inherited socket and forks its workers.
+Then it sends SIGTERM to the old supervisor, whose workers finish their in-flight requests and exit.
+The listening socket stays open the whole time, so no connection is refused or dropped.
+Please note that the successor has a different pid than the old supervisor (it is re-parented to init once the old supervisor has exited).
+Only the pre-forked standalone server can be reloaded: the server of runServer (and the FCGI servers) must be restarted to apply changes.
+
+Example code:
+    server = serving.make_server(...)
+    PreforkSupervisor(server, 4, 1000).run() # blocks until SIGTERM/SIGINT
+
+    # send SIGHUP to the supervisor to reload (e.g. after a config change)
+    kill -HUP <pid of the supervisor>
+"""
+import os
+import sys
+import time
+import errno
+import random
+import select
+import signal
+import socket
+
+from werkzeug import serving
+
+import amsoil.core.log
+logger=amsoil.core.log.getLogger('flaskrpcs')
+
+POLL_INTERVAL = 1.0 # seconds a worker waits for a connection before checking if it should stop
+RESPAWN_DELAY = 1.0 # seconds to wait before replacing a worker which crashed (avoids fork loops if workers crash right away)
+
+LISTEN_FD_ENV = 'AMSOIL_LISTEN_FD' # environment variable with the listening socket's file descriptor (set for the successor on reload)
+PREDECESSOR_PID_ENV = 'AMSOIL_PREDECESSOR_PID' # environment variable with the pid of the supervisor to replace (set for the successor on reload)
+
+def inheritedListenFD():
+    """Returns the file descriptor of the listening socket passed on by the previous supervisor, or None if this is not a reload."""
+    fd = os.environ.get(LISTEN_FD_ENV)
+    if fd:
+        return int(fd)
+    return None
+
+class InheritedSocketWSGIServer(serving.BaseWSGIServer):
+    """Werkzeug server which uses the listening socket of the previous supervisor (given by the file descriptor {fd}) instead of binding a new one."""
+    def __init__(self, fd, host, port, app, handler=None, passthrough_errors=False, ssl_context=None):
+        self._inheritedFD = fd
+        super(InheritedSocketWSGIServer, self).__init__(host, port, app, handler, passthrough_errors, ssl_context)
+
+    def server_bind(self):
+        self.socket.close() # the unbound socket created by TCPServer
+        self.socket = socket.fromfd(self._inheritedFD, self.address_family, socket.SOCK_STREAM)
+        os.close(self._inheritedFD) # fromfd duplicates the descriptor
+        self.server_address = self.socket.getsockname()
+        host, port = self.server_address[:2]
+        self.server_name = socket.getfqdn(host)
+        self.server_port = port
+
+    def server_activate(self):
+        pass # the socket is already listening
+
+class PreforkSupervisor(object):
+    """Forks and supervises the workers which serve the given {server} (a SocketServer.TCPServer, e.g. from werkzeug's make_server)."""
+
+    def __init__(self, server, workerCount, maxRequests):
+        """
+        {workerCount} is the number of worker processes to keep running.
+        {maxRequests} is the number of requests after which a worker is replaced (0 means never).
+        """
+        self._server = server
+        self._workerCount = workerCount
+        self._maxRequests = maxRequests
+        self._workers = set() # pids
+        self._stopping = False
+        self._reloading = False
+        self._successor = None # pid of the supervisor which is started on reload
+
+    def run(self):
+        """Forks the workers and replaces them when they exit. Returns after SIGTERM/SIGINT, when all workers have exited."""
+        # workers poll the socket and try to accept, only one of them gets the connection (the others get EAGAIN)
+        self._server.socket.setblocking(0)
+        signal.signal(signal.SIGTERM, self._handleStop)
+        signal.signal(signal.SIGINT, self._handleStop)
+        signal.signal(signal.SIGHUP, self._handleReload)
+        logger.info("supervisor %i starting %i pre-forked workers (recycled after %s requests)" % (os.getpid(), self._workerCount, self._maxRequests or 'unlimited'))
+        try:
+            while not self._stopping:
+                while len(self._workers) < self._workerCount and not self._stopping:
+                    self._spawnWorker()
+                self._stopPredecessor()
+                if self._reloading:
+                    self._startSuccessor()
+                self._reapWorker()
+        finally:
+            self._stopWorkers()
+            self._server.server_close()
+
+    def _handleStop(self, signum, frame):
+        self._stopping = True
+
+    def _handleReload(self, signum, frame):
+        self._reloading = True
+
+    def _startSuccessor(self):
+        """Re-executes the current command with the listening socket and this supervisor's pid (see Graceful reload above)."""
+        self._reloading = False
+        if self._successor:
+            logger.warning("reload requested, but the successor %i is still starting" % (self._successor,))
+            return
+        env = dict(os.environ)
+        env[LISTEN_FD_ENV] = str(self._server.socket.fileno())
+        env[PREDECESSOR_PID_ENV] = str(os.getpid())
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.execve(sys.executable, [sys.executable] + sys.argv, env)
+            finally:
+                os._exit(1)
+        self._successor = pid
+        logger.info("reloading: started successor supervisor %i" % (pid,))
+
+    def _stopPredecessor(self):
+        """If this supervisor was started by a reload, the old supervisor is asked to stop (after this supervisor's workers are running)."""
+        predecessor = os.environ.pop(PREDECESSOR_PID_ENV, None)
+        os.environ.pop(LISTEN_FD_ENV, None)
+        if not predecessor:
+            return
+        logger.info("taking over from supervisor %s, its workers finish their current requests" % (predecessor,))
+        try:
+            os.kill(int(predecessor), signal.SIGTERM)
+        except OSError, e:
+            logger.warning("could not stop the previous supervisor %s (%s)" % (predecessor, str(e)))
+
+    def _spawnWorker(self):
+        pid = os.fork()
+        if pid == 0:
+            amsoil.core.log.afterFork()
+            exitCode = 1
+            try:
+                self._runWorker()
+                exitCode = 0
+            except:
+                logger.exception("pre-forked worker %i crashed" % (os.getpid(),))
+            finally:
+                amsoil.core.log.flush()
+                os._exit(exitCode) # do not run the supervisor's cleanup (atexit, finally blocks) in the worker
+        self._workers.add(pid)
+        logger.debug("started pre-forked worker %i" % (pid,))
+
+    def _reapWorker(self):
+        """Waits for a worker to exit (or a signal to arrive)."""
+        try:
+            pid, status = os.waitpid(-1, 0)
+        except OSError, e:
+            if e.errno in (errno.EINTR, errno.ECHILD):
+                return
+            raise
+        if pid == self._successor:
+            logger.error("reload failed: the successor supervisor %i exited (status %i), please check the log" % (pid, status))
+            self._successor = None
+            return
+        self._workers.discard(pid)
+        if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+            logger.debug("pre-forked worker %i exited" % (pid,))
+        else:
+            logger.error("pre-forked worker %i died (status %i), replacing it" % (pid, status))
+            time.sleep(RESPAWN_DELAY)
+
+    def _stopWorkers(self):
+        for pid in list(self._workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                self._workers.discard(pid)
+        while self._workers:
+            try:
+                pid, status = os.waitpid(-1, 0)
+                self._workers.discard(pid)
+            except OSError, e:
+                if e.errno == errno.ECHILD:
+                    break
+                if e.errno != errno.EINTR:
+                    raise
+        logger.info("all pre-forked workers stopped")
+
+    def _runWorker(self):
+        """Serves requests until the maximum number of requests is reached or the supervisor asks to stop."""
+        self._stopping = False
+        self._workers = set()
+        self._successor = None
+        signal.signal(signal.SIGTERM, self._handleStop)
+        signal.signal(signal.SIGINT, self._handleStop)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN) # only the supervisor reloads
+        signal.siginterrupt(signal.SIGTERM, False) # let the current request finish, the flag is checked before accepting the next one
+        signal.siginterrupt(signal.SIGINT, False)
+        random.seed() # do not share the random sequence with the other workers
+        handled = 0
+        while not self._stopping and (not self._maxRequests or handled < self._maxRequests):
+            try:
+                readable, _, _ = select.select([self._server], [], [], POLL_INTERVAL)
+            except select.error, e:
+                if e[0] == errno.EINTR:
+                    continue
+                raise
+            if readable and self._handleRequest():
+                handled += 1
+        logger.debug("pre-forked worker %i exits after %i requests" % (os.getpid(), handled))
+
+    def _handleRequest(self):
+        """Accepts and handles one connection (like SocketServer's _handle_request_noblock). Returns False if another worker was faster."""
+        server = self._server
+        try:
+            request, client_address = server.get_request()
+        except socket.error:
+            return False
+        if server.verify_request(request, client_address):
+            try:
+                server.process_request(request, client_address)
+            except:
+                server.handle_error(request, client_address)
+                server.shutdown_request(request)
+        return True
@@ -0,0 +1,285 @@
+"""
+Codecs for the XML-RPC interface (selected via flask.xmlrpc_codec).
+
+The codec converts the XML of a methodCall into the parameters and the method name (loads) and the result into the XML of a methodResponse (dumps).
+Both codecs have the same interface as xmlrpclib's loads and dumps.
+- 'xmlrpclib' (default): xmlrpclib's pure-Python (un)marshaller.
+- 'fast': Parses the XML with lxml (if installed, otherwise with cElementTree) into a tree and converts the tree in one pass.
+  The writer dispatches on the exact type without method lookups and does one append per value.
+  The output is byte for byte the same as xmlrpclib's. The parser is stricter than xmlrpclib: unknown value types are rejected instead of being dropped silently.
+
+The codecs can be compared with test/benchmark/xmlrpccodec_benchmark.py.
+
+Example code:
+    codec = getCodec('fast')
+    params, method = codec.loads(data)
+    response = codec.dumps((result,), methodresponse=1, allow_none=True, encoding='utf-8')
+"""
+import datetime
+import threading
+import xmlrpclib
+from xmlrpclib import Fault, DateTime, Binary, MAXINT, MININT
+
+try:
+    from lxml import etree
+    _parsers = threading.local() # lxml parsers must not be used by several threads at the same time, so each thread gets its own
+    def _parseXML(data):
+        parser = getattr(_parsers, 'parser', None)
+        if parser is None:
+            parser = _parsers.parser = etree.XMLParser(resolve_entities=False, remove_comments=True, remove_pis=True) # keep libxml2's depth and size limits, the bodies come from unauthenticated clients
+        return etree.fromstring(data, parser)
+except ImportError:
+    import xml.etree.cElementTree as etree
+    def _parseXML(data):
+        return etree.fromstring(data)
+
+import amsoil.core.log
+logger=amsoil.core.log.getLogger('flaskrpcs')
+
+DEFAULT_CODEC = 'xmlrpclib'
+
+class XmlrpclibCodec(object):
+    """Uses xmlrpclib (wire format reference)."""
+    def loads(self, data):
+        """Returns a tuple of (params, methodname). Raises Fault if {data} is a fault response."""
+        return xmlrpclib.loads(data)
+
+    def dumps(self, params, methodname=None, methodresponse=None, encoding=None, allow_none=0):
+        """Returns the XML for the tuple {params} (or the Fault). Please see xmlrpclib.dumps."""
+        return xmlrpclib.dumps(params, methodname, methodresponse, encoding, allow_none)
+
+class FastCodec(XmlrpclibCodec):
+    """Tree based parser and flat writer (see module documentation)."""
+    def loads(self, data):
+        root = _parseXML(data)
+        methodname = None
+        params = ()
+        for child in root:
+            if child.tag == 'methodName':
+                methodname = _stringify(child.text or '')
+            elif child.tag == 'params':
+                params = tuple([_parseValue(param[0]) for param in child])
+            elif child.tag == 'fault':
+                raise Fault(**_parseValue(child[0]))
+        return params, methodname
+
+    def dumps(self, params, methodname=None, methodresponse=None, encoding=None, allow_none=0):
+        assert isinstance(params, tuple) or isinstance(params, Fault), "argument must be tuple or Fault instance"
+        if isinstance(params, Fault):
+            methodresponse = 1
+        elif methodresponse and isinstance(params, tuple):
+            assert len(params) == 1, "response tuple must be a singleton"
+        if not encoding:
+            encoding = "utf-8"
+
+        out = []
+        dump = _makeDumper(out.append, encoding, allow_none)
+        if isinstance(params, Fault):
+            out.append("<fault>\n")
+            dump({'faultCode': params.faultCode, 'faultString': params.faultString})
+            out.append("</fault>\n")
+        else:
+            out.append("<params>\n")
+            for value in params:
+                out.append("<param>\n")
+                dump(value)
+                out.append("</param>\n")
+            out.append("</params>\n")
+
+        if encoding != "utf-8":
+            xmlheader = "<?xml version='1.0' encoding='%s'?>\n" % str(encoding)
+        else:
+            xmlheader = "<?xml version='1.0'?>\n"
+        if methodname:
+            if not isinstance(methodname, str):
+                methodname = methodname.encode(encoding, 'xmlcharrefreplace')
+            return ''.join([xmlheader, "<methodCall>\n<methodName>", methodname, "</methodName>\n"] + out + ["</methodCall>\n"])
+        elif methodresponse:
+            return ''.join([xmlheader, "<methodResponse>\n"] + out + ["</methodResponse>\n"])
+        return ''.join(out)
+
+CODECS = {
+    'xmlrpclib' : XmlrpclibCodec,
+    'fast' : FastCodec }
+
+def getCodec(name):
+    """Returns an instance of the codec with the given {name}. Falls back to the default codec if the name is unknown."""
+    if name not in CODECS:
+        logger.warning("unknown XML-RPC codec '%s', using '%s'" % (name, DEFAULT_CODEC))
+        name = DEFAULT_CODEC
+    return CODECS[name]()
+
+# -- parser
+
+def _stringify(text):
+    """Same as xmlrpclib: plain strings for ASCII, unicode otherwise."""
+    if type(text) is unicode:
+        try:
+            return text.encode('ascii')
+        except UnicodeError:
+            pass
+    return text
+
+def _parseValue(element):
+    """Converts a <value> element."""
+    if not len(element):
+        return _stringify(element.text or '')
+    typed = element[0]
+    try:
+        parse = _VALUE_PARSERS[typed.tag]
+    except KeyError:
+        raise xmlrpclib.ResponseError("unknown XML-RPC value type <%s>" % (typed.tag,))
+    return parse(typed)
+
+def _parseBoolean(element):
+    text = element.text
+    if text == '0':
+        return False
+    elif text == '1':
+        return True
+    raise TypeError("bad boolean value")
+
+def _parseDateTime(element):
+    value = DateTime()
+    value.decode(element.text or '')
+    return value
+
+def _parseBase64(element):
+    value = Binary()
+    value.decode(element.text or '')
+    return value
+
+def _parseArray(element):
+    if not len(element):
+        return []
+    return [_parseValue(value) for value in element[0]] # <data>
+
+def _parseStruct(element):
+    result = {}
+    for member in element:
+        name = value = None
+        for child in member:
+            if child.tag == 'name':
+                name = _stringify(child.text or '')
+            elif child.tag == 'value':
+                value = _parseValue(child)
+        result[name] = value
+    return result
+
+_VALUE_PARSERS = {
+    'string' : lambda element: _stringify(element.text or ''),
+    'int' : lambda element: int(element.text),
+    'i4' : lambda element: int(element.text),
+    'i8' : lambda element: int(element.text),
+    'boolean' : _parseBoolean,
+    'double' : lambda element: float(element.text),
+    'nil' : lambda element: None,
+    'dateTime.iso8601' : _parseDateTime,
+    'base64' : _parseBase64,
+    'array' : _parseArray,
+    'struct' : _parseStruct }
+
+# -- writer
+
+LARGE_STRING = 4096 # larger strings are appended separately to avoid copying them
+
+class _Output(object):
+    """Passed to the encode method of xmlrpclib's wrappers (DateTime, Binary)."""
+    def __init__(self, write):
+        self.write = write
+
+def _makeDumper(append, encoding, allowNone):
+    """Returns a function which appends the XML of the given value to {append} (same output as xmlrpclib.Marshaller)."""
+    memo = set()
+    memberStarts = {}
+    def escape(text):
+        return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+    def memberStart(key):
+        if type(key) is str:
+            key = escape(key)
+        elif type(key) is unicode:
+            key = escape(key).encode(encoding, 'xmlcharrefreplace')
+        else:
+            raise TypeError, "dictionary key must be string"
+        return "<member>\n<name>%s</name>\n" % (key,)
+
+    def dumpStruct(value):
+        i = id(value)
+        if i in memo:
+            raise TypeError, "cannot marshal recursive dictionaries"
+        memo.add(i)
+        append("<value><struct>\n")
+        for k, v in value.items():
+            try:
+                start = memberStarts[k] # the same keys occur in many structs (e.g. slivers)
+            except KeyError:
+                start = memberStarts[k] = memberStart(k)
+            if (type(v) is str) and (len(v) <= LARGE_STRING): # shortcut for the most common case
+                append("%s<value><string>%s</string></value>\n</member>\n" % (start, v.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")))
+            else:
+                append(start)
+                dump(v)
+                append("</member>\n")
+        append("</struct></value>\n")
+        memo.discard(i)
+
+    def dump(value):
+        t = type(value)
+        if t is str:
+            if len(value) > LARGE_STRING:
+                append("<value><string>")
+                append(escape(value))
+                append("</string></value>\n")
+            else:
+                append("<value><string>%s</string></value>\n" % (escape(value),))
+        elif t is dict:
+            dumpStruct(value)
+        elif (t is list) or (t is tuple):
+            i = id(value)
+            if i in memo:
+                raise TypeError, "cannot marshal recursive sequences"
+            memo.add(i)
+            append("<value><array><data>\n")
+            for v in value:
+                dump(v)
+            append("</data></array></value>\n")
+            memo.discard(i)
+        elif t is unicode:
+            append("<value><string>")
+            append(escape(value).encode(encoding, 'xmlcharrefreplace'))
+            append("</string></value>\n")
+        elif t is bool:
+            append(value and "<value><boolean>1</boolean></value>\n" or "<value><boolean>0</boolean></value>\n")
+        elif (t is int) or (t is long):
+            if value > MAXINT or value < MININT:
+                raise OverflowError, ("int exceeds XML-RPC limits" if t is int else "long int exceeds XML-RPC limits")
+            append("<value><int>%i</int></value>\n" % (value,))
+        elif t is float:
+            append("<value><double>%s</double></value>\n" % (repr(value),))
+        elif value is None:
+            if not allowNone:
+                raise TypeError, "cannot marshal None unless allow_none is enabled"
+            append("<value><nil/></value>")
+        else:
+            dumpOther(value)
+
+    def dumpOther(value):
+        if type(value) is datetime.datetime:
+            append("<value><dateTime.iso8601>%s</dateTime.iso8601></value>\n" % (xmlrpclib._strftime(value),))
+            return
+        try:
+            value.__dict__
+        except:
+            raise TypeError, "cannot marshal %s objects" % type(value)
+        if value.__class__ in xmlrpclib.WRAPPERS:
+            value.encode(_Output(append))
+            return
+        for type_ in type(value).__mro__: # sub-classes of the basic types can not be marshalled (same as xmlrpclib)
+            if type_ in _BASIC_TYPES:
+                raise TypeError, "cannot marshal %s objects" % type(value)
+        dumpStruct(value.__dict__)
+
+    return dump
+
+_BASIC_TYPES = (type(None), int, bool, long, float, str, unicode, tuple, list, dict, datetime.datetime)
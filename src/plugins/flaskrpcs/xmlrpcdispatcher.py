@@ -1,4 +1,5 @@
 import os.path
+import pydoc
 from flask import request
 
 from amsoil.core import serviceinterface
@@ -22,8 +23,28 @@ class XMLRPCDispatcher(object):
             return request.environ['CLIENT_RAW_CERT']
         return None
 
+    def _isRPCMethod(self, name):
+        """Private methods and the methods of the service interface (e.g. requestCertificate) can not be called by clients."""
+        if name.startswith('_'):
+            return False
+        meth = getattr(self, name, None)
+        return callable(meth) and not getattr(meth, '_serviceinterface', False)
+
+    def _listMethods(self):
+        """Returns the names of the methods clients can call (used for system.listMethods)."""
+        return [name for name in dir(self) if self._isRPCMethod(name)]
+
+    def _methodHelp(self, method):
+        """Returns the docstring of the given method (used for system.methodHelp)."""
+        if not self._isRPCMethod(method):
+            return ""
+        return pydoc.getdoc(getattr(self, method))
+
     def _dispatch(self, method, params):
         self._log.info("Called: <%s>" % (method))
+        if hasattr(self, method) and not self._isRPCMethod(method): # same answer as for unknown methods, so these methods can not be probed
+            self._log.warning("Client called private method: <%s>" % (method))
+            raise AttributeError("%s instance has no attribute '%s'" % (self.__class__.__name__, method))
         try:
             meth = getattr(self, "%s" % (method))
         except AttributeError, e:
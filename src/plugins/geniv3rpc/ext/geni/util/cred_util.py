@@ -59,10 +59,13 @@ class CredentialVerifier(object):
 
     # root_cert_file is a trusted root file file or directory of 
     # trusted roots for verifying credentials
+    # (or a trust store with already loaded roots, see geniv3rpc's truststore.py)
     def __init__(self, root_cert_fileordir):
         self.logger = logging.getLogger('cred-verifier')
         if root_cert_fileordir is None:
             raise Exception("Missing Root certs argument")
+        elif hasattr(root_cert_fileordir, 'get_issuers'):
+            self.root_cert_files = root_cert_fileordir
         elif os.path.isdir(root_cert_fileordir):
             files = os.listdir(root_cert_fileordir)
             self.root_cert_files = []
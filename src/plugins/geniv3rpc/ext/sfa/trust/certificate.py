@@ -699,7 +699,12 @@ class Certificate:
             raise CertExpired(self.get_printable_subject(), "client cert")
 
         # if this cert is signed by a trusted_cert, then we are set
-        for trusted_cert in trusted_certs:
+        # (a trust store offers the possible issuers, so not every trusted cert needs to be checked)
+        if hasattr(trusted_certs, 'get_issuers'):
+            candidates = trusted_certs.get_issuers(self)
+        else:
+            candidates = trusted_certs
+        for trusted_cert in candidates:
             if self.is_signed_by_cert(trusted_cert):
                 # verify expiration of trusted_cert ?
                 if not trusted_cert.cert.has_expired():
@@ -802,7 +802,11 @@ class Credential(object):
         ok_trusted_certs = []
         # If caller explicitly passed in None that means skip cert chain validation.
         # Strange and not typical
-        if trusted_certs is not None:
+        if hasattr(trusted_certs, 'get_filenames'):
+            # trust store with parsed and indexed certs
+            trusted_cert_objects = trusted_certs
+            trusted_certs = trusted_certs.get_filenames()
+        elif trusted_certs is not None:
             for f in trusted_certs:
                 try:
                     # Failures here include unreadable files
@@ -242,7 +242,7 @@ class GID(Certificate):
             self.parent.verify_chain(trusted_certs)
         else:
             # make sure that the trusted root's hrn is a prefix of the child's
-            trusted_gid = GID(string=trusted_root.save_to_string())
+            trusted_gid = trusted_root if isinstance(trusted_root, GID) else GID(string=trusted_root.save_to_string())
             trusted_type = trusted_gid.get_type()
             trusted_hrn = trusted_gid.get_hrn()
             #if trusted_type == 'authority':
@@ -0,0 +1,147 @@
+"""
+Cache for the advertisements returned by ListResources.
+
+Building the advertisement can be expensive (e.g. the OpenNaaS delegate asks the OpenNaaS server for every resource), but it rarely changes.
+If the delegate declares its advertisement cacheable (see GENIv3DelegateBase.is_advertisement_cacheable), the GENIv3Handler keeps it for geniv3rpc.ad_cache_ttl seconds.
+The cache key is the geni_available option and the RSpec version. On a hit, the delegate is not called at all.
+
+The delegate invalidates the cache when the resources change (see GENIv3DelegateBase.invalidate_advertisement_cache).
+Since each process has its own cache, the invalidation sets geniv3rpc.ad_cache_generation to a new random token. All processes compare the generation before using a cached advertisement.
+A random token (instead of a counter) needs no read-modify-write, so two processes invalidating at the same time can not write the same generation.
+If many requests miss at the same time, only one of them calls the delegate, the others wait for its result.
+
+Clients may ask for the advertisement compressed (geni_compress: zlib with level geniv3rpc.compress_level, then base64).
+A request which misses the cache and asks for the compressed form compresses the new advertisement and stores the compressed form in the entry.
+Other new entries are compressed by a background thread, so later requests for the compressed form usually find it ready.
+A request which comes before the background thread compresses the entry itself (or waits for the thread, if it is compressing the entry at that moment).
+An advertisement is compressed only once per entry. Entries queued for the compressor when the process forked are compressed by the first request in the child which needs them.
+Describe and the ListResources calls of delegates without cacheable advertisements still compress in the request thread.
+
+Example code:
+    advertisement = cache.get((geni_available, 'geni', '3'), lambda: delegate.list_resources(client_cert, credentials, geni_available))
+    compressed = cache.get((geni_available, 'geni', '3'), lambda: delegate.list_resources(client_cert, credentials, geni_available), True)
+    invalidate()
+"""
+import os
+import time
+import uuid
+import zlib
+import base64
+import threading
+import Queue
+
+import amsoil.core.pluginmanager as pm
+import amsoil.core.log
+logger=amsoil.core.log.getLogger('geniv3rpc')
+
+def compress(rspec):
+    """Returns the form of the given {rspec} for geni_compress (see GENI AM API v3)."""
+    level = pm.getService("config").get("geniv3rpc.compress_level")
+    return base64.b64encode(zlib.compress(rspec, level))
+
+class _Entry(object):
+    def __init__(self, advertisement, expires):
+        self.advertisement = advertisement
+        self.expires = expires
+        self.compressed = None # set once the advertisement has been compressed
+        self._compressLock = threading.Lock() # held while the advertisement is compressed
+
+    def getCompressed(self):
+        """Returns the compressed advertisement. Compresses it, unless this has been done before."""
+        compressed = self.compressed
+        if compressed is not None:
+            return compressed
+        with self._compressLock:
+            if self.compressed is None: # another thread may have compressed it meanwhile
+                self.compressed = compress(self.advertisement)
+            return self.compressed
+
+class AdvertisementCache(object):
+    """Please see module documentation."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {} # key -> _Entry
+        self._buildLocks = {} # key -> lock held while the advertisement is built
+        self._generation = None # generation of the entries
+        self._compressorPid = None # the compressor thread does not survive a fork
+        self._pending = None # entries to compress
+
+    def _settings(self):
+        config = pm.getService("config")
+        values = config.getMany(["geniv3rpc.ad_cache_ttl", "geniv3rpc.ad_cache_generation"])
+        return values["geniv3rpc.ad_cache_ttl"], values["geniv3rpc.ad_cache_generation"]
+
+    def _lookup(self, key, generation):
+        """Returns the valid entry or None. Must be called with the lock held."""
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+        entry = self._entries.get(key)
+        if (entry is None) or (entry.expires < time.time()):
+            return None
+        return entry
+
+    def get(self, key, build, compressed=False):
+        """
+        Returns the advertisement for the given {key}. If there is no valid entry, {build} is called (without arguments) and the result is cached.
+        If {compressed} is set, the compressed form of the advertisement is returned (see module documentation).
+        """
+        ttl, generation = self._settings()
+        if ttl <= 0:
+            advertisement = build()
+            return compress(advertisement) if compressed else advertisement
+        entry = self._getEntry(key, build, ttl, generation, compressed)
+        if not compressed:
+            return entry.advertisement
+        return entry.getCompressed()
+
+    def _getEntry(self, key, build, ttl, generation, compressed):
+        with self._lock:
+            entry = self._lookup(key, generation)
+            if entry is not None:
+                return entry
+            buildLock = self._buildLocks.setdefault(key, threading.Lock())
+        with buildLock:
+            with self._lock: # another thread may have built it meanwhile
+                entry = self._lookup(key, generation)
+            if entry is not None:
+                return entry
+            entry = _Entry(build(), time.time() + ttl)
+            if compressed: # the caller needs it now, so it is compressed in this thread
+                entry.getCompressed()
+            with self._lock:
+                if generation == self._generation: # do not store advertisements which have been invalidated while building
+                    self._entries[key] = entry
+        if not compressed:
+            self._compressLater(entry)
+        return entry
+
+    def _compressLater(self, entry):
+        with self._lock:
+            if self._compressorPid != os.getpid():
+                self._compressorPid = os.getpid()
+                self._pending = Queue.Queue()
+                compressor = threading.Thread(target=self._compressPending, args=(self._pending,), name='advertisement compressor')
+                compressor.daemon = True
+                compressor.start()
+            self._pending.put(entry)
+
+    def _compressPending(self, pending):
+        while True:
+            entry = pending.get()
+            try:
+                entry.getCompressed()
+            except:
+                logger.exception("could not compress the advertisement")
+
+    def invalidate(self):
+        """Drops the cached advertisements in this and (via the config) all other processes."""
+        with self._lock:
+            self._entries.clear()
+        pm.getService("config").set("geniv3rpc.ad_cache_generation", uuid.uuid4().hex)
+        logger.debug("advertisement cache invalidated")
+
+cache = AdvertisementCache()
+
+def invalidate():
+    cache.invalidate()
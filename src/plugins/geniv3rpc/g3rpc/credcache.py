@@ -0,0 +1,97 @@
+"""
+Cache for the successful verifications in GENIv3DelegateBase.auth.
+
+Verifying the credentials is expensive (parsing the credential XML, walking the GID chains and one xmlsec1 process per signature).
+Clients usually send the same credentials many times (e.g. omni polls Status), so the result of a successful auth is cached.
+The key is the SHA-1 hash of the client certificate, the credentials, the target URN, the privileges and the trusted root folder.
+On a hit, neither the credentials nor the client certificate are parsed again.
+
+An entry lives until the earliest expiry of the client certificate, the verified credentials and their caller and object certificates.
+Additionally, the lifetime is limited to geniv3rpc.auth_cache_ttl seconds (e.g. to recognize changes in the trusted roots).
+The cache keeps at most geniv3rpc.auth_cache_size entries and drops the least recently used entry first (0 disables the cache).
+Failed verifications are never cached.
+
+Example code:
+    key = cache_key(client_cert, credentials, slice_urn, privileges, cert_root)
+    result = cache.get(key)
+    if result is None:
+        result = ... # verify
+        cache.put(key, result, expiration(client_gid, verified_credentials))
+"""
+import time
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+
+import amsoil.core.pluginmanager as pm
+import amsoil.core.log
+logger=amsoil.core.log.getLogger('geniv3rpc')
+
+def cache_key(client_cert, credentials, slice_urn, privileges, cert_root):
+    """Returns the key for the given auth parameters."""
+    digest = hashlib.sha1()
+    for part in [client_cert, slice_urn or '', cert_root] + list(credentials) + list(privileges):
+        if isinstance(part, unicode):
+            part = part.encode('utf-8')
+        digest.update("%i:%s;" % (len(part), part)) # length prefix, so the parts can not be shifted
+    digest.update("%i" % (len(credentials),)) # separates the credentials from the privileges
+    return digest.hexdigest()
+
+def _cert_expiration(certificate):
+    """Returns the notAfter of the given ext.sfa.trust.certificate.Certificate as naive UTC datetime."""
+    return datetime.datetime.strptime(certificate.cert.get_notAfter()[:14], '%Y%m%d%H%M%S')
+
+def expiration(client_gid, credentials):
+    """Returns the earliest expiry (naive UTC datetime) of the {client_gid} and the verified {credentials} (incl. their caller and object GIDs)."""
+    expirations = [_cert_expiration(client_gid)]
+    for credential in credentials:
+        expirations.append(credential.get_expiration())
+        expirations.append(_cert_expiration(credential.get_gid_caller()))
+        expirations.append(_cert_expiration(credential.get_gid_object()))
+    return min(expirations)
+
+class CredentialCache(object):
+    """Please see module documentation."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> (result, expires), least recently used first
+
+    def _settings(self):
+        config = pm.getService("config")
+        values = config.getMany(["geniv3rpc.auth_cache_size", "geniv3rpc.auth_cache_ttl"])
+        return values["geniv3rpc.auth_cache_size"], values["geniv3rpc.auth_cache_ttl"]
+
+    def get(self, key):
+        """Returns the cached result for the given {key} or None."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            result, expires = entry
+            if expires < time.time():
+                return None
+            self._entries[key] = entry # most recently used
+            return result
+
+    def put(self, key, result, expires_at):
+        """Caches the {result} for the given {key} until the datetime {expires_at} (naive UTC)."""
+        size, ttl = self._settings()
+        if size <= 0:
+            return
+        lifetime = min((expires_at - datetime.datetime.utcnow()).total_seconds(), ttl)
+        if lifetime <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (result, time.time() + lifetime)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops all cached verifications (of this process)."""
+        with self._lock:
+            self._entries.clear()
+        logger.debug("credential cache cleared")
+
+cache = CredentialCache()
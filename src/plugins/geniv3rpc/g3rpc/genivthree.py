@@ -1,5 +1,4 @@
 import os, os.path
-import urllib2
 import traceback
 from datetime import datetime
 from dateutil import parser as dateparser
@@ -9,6 +8,7 @@ from lxml.builder import ElementMaker
 
 import ext.geni
 import ext.sfa.trust.gid as gid
+import ext.sfa.trust.credential as credential
 
 import amsoil.core.pluginmanager as pm
 from amsoil.core import serviceinterface
@@ -19,6 +19,9 @@ logger=amsoil.core.log.getLogger('geniv3rpc')
 from amsoil.config import expand_amsoil_path
 
 from exceptions import *
+import adcache
+import credcache
+import truststore
 
 xmlrpc = pm.getService('xmlrpc')
 
@@ -71,7 +74,8 @@ class GENIv3Handler(xmlrpc.Dispatcher):
                 })
 
     def ListResources(self, credentials, options):
-        """Delegates the call and unwraps the needed parameter. Also takes care of the compression option."""
+        """Delegates the call and unwraps the needed parameter. Also takes care of the compression option.
+        If the delegate's advertisement is cacheable, the cached advertisement (or its pre-compressed form) is returned without calling the delegate (see adcache.py)."""
         # interpret options
         geni_available = bool(options['geni_available']) if ('geni_available' in options) else False
         geni_compress = bool(options['geni_compress']) if ('geni_compress' in options) else False
@@ -79,12 +83,17 @@ class GENIv3Handler(xmlrpc.Dispatcher):
         # check version and delegate
         try:
             self._checkRSpecVersion(options['geni_rspec_version'])
-            result = self._delegate.list_resources(self.requestCertificate(), credentials, geni_available)
+            client_cert = self.requestCertificate()
+            if self._delegate.is_advertisement_cacheable():
+                rspec_version = options['geni_rspec_version']
+                cache_key = (geni_available, rspec_version['type'].lower(), str(rspec_version['version']))
+                result = adcache.cache.get(cache_key, lambda: self._delegate.list_resources(client_cert, credentials, geni_available), geni_compress)
+            else:
+                result = self._delegate.list_resources(client_cert, credentials, geni_available)
+                if geni_compress:
+                    result = adcache.compress(result)
         except Exception as e:
             return self._errorReturn(e)
-        # compress and return
-        if geni_compress:
-            result = base64.b64encode(zlib.compress(result))
         return self._successReturn(result)
 
     def Describe(self, urns, credentials, options):
@@ -99,7 +108,7 @@ class GENIv3Handler(xmlrpc.Dispatcher):
             return self._errorReturn(e)
 
         if geni_compress:
-            result = base64.b64encode(zlib.compress(result))
+            result = adcache.compress(result)
         return self._successReturn(result)
 
     def Allocate(self, slice_urn, credentials, rspec, options):
@@ -294,6 +303,17 @@ class GENIv3DelegateBase(object):
         For description of the options see http://groups.geni.net/geni/wiki/GAPI_AM_API_V3/CommonConcepts#OperationsonIndividualSlivers"""
         return 'geni_single'
 
+    def is_advertisement_cacheable(self):
+        """Overwrite by AM developer. Shall return True if list_resources returns the same advertisement for all clients (i.e. it only depends on {geni_available}).
+        Then the handler caches the advertisement for geniv3rpc.ad_cache_ttl seconds and does not call list_resources on cache hits (hence, list_resources must not check the credentials).
+        When the advertisement changes (e.g. after allocate, provision, delete or when a sliver expires), the delegate must call invalidate_advertisement_cache."""
+        return False
+
+    @serviceinterface
+    def invalidate_advertisement_cache(self):
+        """Not to overwrite by AM developer. Drops the cached advertisements in all processes (see is_advertisement_cacheable)."""
+        adcache.invalidate()
+
     def list_resources(self, client_cert, credentials, geni_available):
         """Overwrite by AM developer. Shall return an RSpec version 3 (advertisement) or raise an GENIv3...Error.
         If {geni_available} is set, only return availabe resources.
@@ -482,18 +502,33 @@ class GENIv3DelegateBase(object):
 
         if client_cert == None:
             raise GENIv3ForbiddenError("Could not determine the client SSL certificate")
+        # the roots are checked before the cache, a change of the roots drops the cached verifications (see truststore.py)
+        try:
+            trusted_roots = truststore.store.get_roots()
+        except Exception as e:
+            raise GENIv3ForbiddenError(str(e))
+        # successful verifications are cached (see credcache.py)
+        cache_key = credcache.cache_key(client_cert, geni_credentials, slice_urn, privileges, cert_root)
+        result = credcache.cache.get(cache_key)
+        if result is not None:
+            return result
         # test the credential
         try:
-            cred_verifier = ext.geni.CredentialVerifier(cert_root)
-            cred_verifier.verify_from_strings(client_cert, geni_credentials, slice_urn, privileges)
+            user_gid = gid.GID(string=client_cert)
+            cred_verifier = ext.geni.CredentialVerifier(trusted_roots)
+            verified_credentials = cred_verifier.verify(user_gid, [credential.Credential(string=c) for c in geni_credentials], slice_urn, privileges)
         except Exception as e:
             raise GENIv3ForbiddenError(str(e))
         
-        user_gid = gid.GID(string=client_cert)
         user_urn = user_gid.get_urn()
         user_uuid = user_gid.get_uuid()
         user_email = user_gid.get_email()
-        return user_urn, user_uuid, user_email # TODO document return
+        result = (user_urn, user_uuid, user_email)
+        try:
+            credcache.cache.put(cache_key, result, credcache.expiration(user_gid, verified_credentials))
+        except Exception as e: # the verification succeeded, even if the expiry can not be determined
+            logger.warning("could not cache the verified credentials (%s)" % (str(e),))
+        return result # TODO document return
 
     @serviceinterface
     def urn_type(self, urn):
@@ -530,7 +565,8 @@ class GENIv3DelegateBase(object):
     @serviceinterface
     def lxml_parse_rspec(self, rspec_string):
         """Returns a the root element of the given {rspec_string} as lxml.Element.
-        If the config key is set, the rspec is validated with the schemas found at the URLs specified in schemaLocation of the the given RSpec."""
+        If the config key is set, the rspec is validated with the schemas found at the URLs specified in schemaLocation of the the given RSpec.
+        The schemas are taken from the schemacache service (see schemacache plugin). Validation problems are logged, but do not reject the RSpec."""
         # parse
         rspec_root = etree.fromstring(rspec_string)
         # validate RSpec against specified schemaLocations
@@ -538,20 +574,9 @@ class GENIv3DelegateBase(object):
         should_validate = config.get("geniv3rpc.rspec_validation")
 
         if should_validate:
-            schema_locations = rspec_root.get("{http://www.w3.org/2001/XMLSchema-instance}schemaLocation")
-            if schema_locations:
-                schema_location_list = schema_locations.split(" ")
-                schema_location_list = map(lambda x: x.strip(), schema_location_list) # strip whitespaces
-                for sl in schema_location_list:
-                    try:
-                        xmlschema_contents = urllib2.urlopen(sl) # try to download the schema
-                        xmlschema_doc = etree.parse(xmlschema_contents)
-                        xmlschema = etree.XMLSchema(xmlschema_doc)
-                        xmlschema.validate(rspec_root)
-                    except Exception as e:
-                        logger.warning("RSpec validation failed failed (%s: %s)" % (sl, str(e),))
-            else:
-                logger.warning("RSpec does not specify any schema locations")
+            schemacache = pm.getService("schemacache")
+            for problem in schemacache.validate(rspec_root):
+                logger.warning("RSpec validation failed (%s)" % (problem,))
         return rspec_root
 
     @serviceinterface
@@ -0,0 +1,106 @@
+"""
+Store for the trusted root certificates (the PEM files in geniv3rpc.cert_root).
+
+The certificates are loaded, parsed and indexed by their subject once.
+Before handing out the roots, the store compares the modification time of the folder (or file) with the one of the last load.
+The roots are only loaded again if the modification time or geniv3rpc.cert_root changed.
+Please note that changing a file in place does not change the modification time of the folder: add, remove or replace (move) the files or touch the folder.
+
+The roots (TrustedRoots) can be passed wherever the ext.geni/ext.sfa code expects a list of trusted certificates (e.g. CredentialVerifier(...), Credential.verify(...), Certificate.verify_chain(...)).
+In addition to the list interface, they offer get_issuers(cert), so verify_chain only checks the roots which may have signed the certificate (instead of checking the signature against every root).
+When the roots are loaded again, the cached credential verifications of this process are dropped (see credcache.py).
+This relies on the callers asking for the roots before they look into the cache (as GENIv3DelegateBase.auth does),
+so removing a root takes effect with the next request.
+
+Example code:
+    truststore = pm.getService('truststore')
+    roots = truststore.get_roots()
+    verifier = ext.geni.CredentialVerifier(roots)
+"""
+import os
+import os.path
+import threading
+
+import ext.sfa.trust.gid as gid
+
+import amsoil.core.pluginmanager as pm
+from amsoil.core import serviceinterface
+from amsoil.config import expand_amsoil_path
+import amsoil.core.log
+logger=amsoil.core.log.getLogger('geniv3rpc')
+
+import credcache
+
+CATED_CERTS_FILENAME = 'CATedCACerts.pem' # written by CredentialVerifier.getCAsFileFromDir, contains the same certs again
+
+class TrustedRoots(object):
+    """Immutable set of trusted roots (GID objects) indexed by subject (please see module documentation)."""
+    def __init__(self, roots):
+        """{roots} is a list of tuples (filename, GID object)."""
+        self._filenames = [filename for filename, root in roots]
+        self._roots = [root for filename, root in roots]
+        self._by_subject = {}
+        for root in self._roots:
+            self._by_subject.setdefault(root.cert.get_subject().hash(), []).append(root)
+
+    def __iter__(self):
+        return iter(self._roots)
+
+    def __len__(self):
+        return len(self._roots)
+
+    def get_issuers(self, cert):
+        """Returns the roots whose subject is the issuer of the given {cert} (ext.sfa.trust.certificate.Certificate)."""
+        return self._by_subject.get(cert.cert.get_issuer().hash(), [])
+
+    def get_filenames(self):
+        """Returns the files of the roots (e.g. for xmlsec1)."""
+        return list(self._filenames)
+
+class TrustStore(object):
+    """Please see module documentation."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path = None
+        self._mtime = None
+        self._roots = TrustedRoots([])
+
+    @serviceinterface
+    def get_roots(self):
+        """Returns the current TrustedRoots. Loads them again if the trusted root folder has changed."""
+        path = expand_amsoil_path(pm.getService("config").get("geniv3rpc.cert_root"))
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError as e:
+            raise IOError("Couldn't find Root certs in %s (%s)" % (path, str(e)))
+        if (path == self._path) and (mtime == self._mtime):
+            return self._roots
+        with self._lock:
+            if (path != self._path) or (mtime != self._mtime):
+                self._roots = self._load(path)
+                self._path, self._mtime = path, mtime
+                credcache.cache.clear()
+            return self._roots
+
+    @serviceinterface
+    def reload(self):
+        """Loads the roots again on the next access (e.g. after a file was changed in place)."""
+        with self._lock:
+            self._mtime = None
+
+    def _load(self, path):
+        if os.path.isdir(path):
+            filenames = [os.path.join(path, f) for f in sorted(os.listdir(path)) if f != CATED_CERTS_FILENAME]
+            filenames = [f for f in filenames if os.path.isfile(f)]
+        else:
+            filenames = [path]
+        roots = []
+        for filename in filenames:
+            try:
+                roots.append((filename, gid.GID(filename=filename)))
+            except Exception as e: # e.g. unreadable files or non PEM files
+                logger.error("could not load trusted root %s (%s)" % (filename, str(e)))
+        logger.info("loaded %i trusted roots from %s" % (len(roots), path))
+        return TrustedRoots(roots)
+
+store = TrustStore()
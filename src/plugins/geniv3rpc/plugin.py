@@ -1,17 +1,27 @@
 import amsoil.core.pluginmanager as pm
 from g3rpc.genivthree import GENIv3Handler, GENIv3DelegateBase
 from g3rpc import exceptions as geni_exceptions
+from g3rpc import truststore
 
 def setup():
     # setup config keys
     config = pm.getService("config")
-    config.install("geniv3rpc.cert_root", "deploy/trusted", "Folder which includes trusted clearinghouse certificates for GENI API v3 (in .pem format). If relative path, the root is assumed to be git repo root.")
-    config.install("geniv3rpc.rspec_validation", True, "Determines if RSpec shall be validated by the given xs:schemaLocations in the document (may cause downloads of the given schema from the given URL per request).")
+    config.installMany([("geniv3rpc.cert_root", "deploy/trusted", "Folder which includes trusted clearinghouse certificates for GENI API v3 (in .pem format). If relative path, the root is assumed to be git repo root. The certificates are loaded again when the folder's modification time changes."),
+                        ("geniv3rpc.rspec_validation", True, "Determines if RSpec shall be validated by the given xs:schemaLocations in the document (the schemas are taken from the schemacache, which downloads missing schemas once)."),
+                        ("geniv3rpc.ad_cache_ttl", 60, "Seconds an advertisement is cached if the delegate allows it (0 disables the cache)."),
+                        ("geniv3rpc.ad_cache_generation", 0, "Set to a new random token when the delegate invalidates the advertisement cache, so all processes drop their cached advertisements. Please do not change."),
+                        ("geniv3rpc.auth_cache_size", 1000, "Maximum number of successful credential verifications to cache (0 disables the cache)."),
+                        ("geniv3rpc.auth_cache_ttl", 3600, "Maximum seconds a successful credential verification is cached (entries expire earlier if a certificate or credential expires)."),
+                        ("geniv3rpc.compress_level", 6, "zlib compression level (1 fastest to 9 smallest) for the RSpecs of ListResources and Describe if the client sets geni_compress.")])
     
-    # register xmlrpc endpoint
+    # register xmlrpc and jsonrpc endpoints
     xmlrpc = pm.getService('xmlrpc')
     geni_handler = GENIv3Handler()
     pm.registerService('geniv3handler', geni_handler)
     pm.registerService('geniv3delegatebase', GENIv3DelegateBase)
     pm.registerService('geniv3exceptions', geni_exceptions)
+    pm.registerService('truststore', truststore.store)
     xmlrpc.registerXMLRPC('geni3', geni_handler, '/RPC2') # name, handlerObj, endpoint
+    # the same handler is also available via JSON-RPC (e.g. for portals and monitoring)
+    jsonrpc = pm.getService('jsonrpc')
+    jsonrpc.registerJSONRPC('geni3json', geni_handler, '/RPC2/json')
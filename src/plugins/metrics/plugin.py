@@ -0,0 +1,20 @@
+import amsoil.core.pluginmanager as pm
+
+"""
+Service Metrics
+
+Provides the in-process registry of the service-call metrics (see amsoil/core/metrics.py).
+The calls are only recorded if SERVICE_METRICS is enabled in config.py.
+
+Example code:
+    import amsoil.core.pluginmanager as pm
+    metrics = pm.getService("metrics")
+    metric = metrics.get("ConfigDB.get")
+    if metric:
+        print "%i calls, %i errors, %.3fs max" % (metric['count'], metric['errors'], metric['max'])
+    all = metrics.snapshot() # name -> metric
+"""
+
+def setup():
+    from amsoil.core import metrics
+    pm.registerService("metrics", metrics)
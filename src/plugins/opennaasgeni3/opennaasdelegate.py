@@ -8,8 +8,9 @@ from utils.xrn import urn_to_hrn, get_leaf
 logger = amsoil.core.log.getLogger('opennaasgeni3delegate')
 GENIv3DelegateBase = pm.getService('geniv3delegatebase')
 geni_ex = pm.getService('geniv3exceptions')
-opennaas_ex = pm.getService('opennaasexceptions')
-commands = pm.getService('opennaas_commands')
+# the resource manager plugin is lazy: it is loaded with the worker on the first use of these services
+opennaas_ex = pm.getService('opennaasexceptions', lazy=True)
+commands = pm.getService('opennaas_commands', lazy=True)
 
 
 ''' @author: Hector Fernandez'''
@@ -25,7 +26,7 @@ class OPENNAASGENI3Delegate(GENIv3DelegateBase):
 
     def __init__(self):
         super(OPENNAASGENI3Delegate, self).__init__()
-        self._resource_manager = pm.getService("opennaasresourcemanager")
+        self._resource_manager = pm.getService("opennaasresourcemanager", lazy=True)
 
     def get_request_extensions_mapping(self):
         """Documentation see [geniv3rpc] GENIv3DelegateBase."""
@@ -45,6 +46,10 @@ class OPENNAASGENI3Delegate(GENIv3DelegateBase):
     def get_allocation_mode(self):
         return 'geni_many'
 
+    def is_advertisement_cacheable(self):
+        """The advertisement does not depend on the client. It is invalidated after allocate, provision, delete and shutdown."""
+        return True
+
     #TODO: AUTH + SCHEMA CHECK!!
     def list_resources(self, client_cert, credentials, geni_available):
         """Documentation see [geniv3rpc] GENIv3DelegateBase."""
@@ -198,6 +203,7 @@ class OPENNAASGENI3Delegate(GENIv3DelegateBase):
                             raise geni_ex.GENIv3BadArgsError("Allocated lease(s) can not be extended that long (%s %s)" % (resType.attrib["name"], res_name,))
 
         sliver_list = [self._get_lease_status_hash(lease, True, False, "") for lease in reserved_leases]
+        self.invalidate_advertisement_cache()
         return self.lxml_to_string(self._get_manifest_rspec(reserved_leases)), sliver_list
 
     #TODO AUTH
@@ -449,6 +455,7 @@ class OPENNAASGENI3Delegate(GENIv3DelegateBase):
             slivers.append(sliver)
 
         logger.error('SLIVERS %s' % (slivers,))
+        self.invalidate_advertisement_cache()
         return self.lxml_to_string(self._get_manifest_rspec(provisioned_leases)), slivers
 
     #TODO AUTH
@@ -556,6 +563,7 @@ class OPENNAASGENI3Delegate(GENIv3DelegateBase):
             slivers.append(sliver)
 
         logger.error('SLIVERS %s' % (slivers,))
+        self.invalidate_advertisement_cache()
         return slivers
 
     #TODO AUTH
@@ -581,6 +589,7 @@ class OPENNAASGENI3Delegate(GENIv3DelegateBase):
             raise geni_ex.GENIv3OperationUnsupportedError('Only slice URNs can be given to shutdown in this aggregate (%s)' % (slice_urn,))
 
         sliver_list = [self._get_lease_status_hash(lease) for lease in shutdown_leases]
+        self.invalidate_advertisement_cache()
         return sliver_list
 
 # Support methods
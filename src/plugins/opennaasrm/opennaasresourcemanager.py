@@ -23,10 +23,19 @@ class OPENNAASResourceManager(object):
 
     def __init__(self):
         super(OPENNAASResourceManager, self).__init__()
+        # pick up changed timeouts (e.g. via ConfigRPC.ChangeConfig) without a restart
+        config.subscribe('opennaas.provisionMaxTimeout', self._timeout_changed)
+        config.subscribe('opennaas.allocationMaxTimeout', self._timeout_changed)
         # register callback for regular updates
         #TODO hace falta una consola adicional para activar el worker
         #worker.addAsReccurring("opennaasresourcemanager", "expire_elements", None, self.EXPIRY_CHECK_INTERVAL)
 
+    def _timeout_changed(self, key, value):
+        if key == 'opennaas.provisionMaxTimeout':
+            self.MAX_PROVISIONED_TIMEOUT = value
+        else:
+            self.MAX_ALLOCATED_TIMEOUT = value
+
     # Lease commands
     def get_all_leases(self):
         slice_names = db_session.query(OPENNAASLease.slice_name).group_by(OPENNAASLease.slice_name).all()
@@ -0,0 +1,12 @@
+import amsoil.core.pluginmanager as pm
+
+def setup():
+    # setup config keys
+    config = pm.getService("config")
+    config.installMany([("schemacache.catalog_path", "deploy/schemas", "Folder with the local schema catalog (catalog.json and the XSD files). If relative path, the root is assumed to be git repo root."),
+                        ("schemacache.download", True, "Determines if schemas which are not in the catalog shall be downloaded (once) and added to the catalog."),
+                        ("schemacache.download_timeout", 10, "Seconds to wait for the download of a schema."),
+                        ("schemacache.negative_ttl", 300, "Seconds before a schema which could not be downloaded or compiled is tried again.")])
+
+    from schemacache import SchemaCache
+    pm.registerService('schemacache', SchemaCache(config.get("schemacache.catalog_path")))
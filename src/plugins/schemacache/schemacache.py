@@ -0,0 +1,177 @@
+"""
+Cache for XML schemas (XSD), e.g. to validate RSpecs.
+
+The schemas are stored in a local catalog directory (schemacache.catalog_path).
+The directory contains the schema files and catalog.json, which maps the schema URLs to the file names (relative to the directory), e.g.:
+    { "http://www.geni.net/resources/rspec/3/request.xsd" : "request.xsd",
+      "http://www.geni.net/resources/rspec/3/any-extension-schema.xsd" : "any-extension-schema.xsd" }
+The default catalog (deploy/schemas) contains the GENI v3 RSpec schemas (ad.xsd, request.xsd, manifest.xsd and the schemas they include).
+All schemas in the catalog are compiled when the service is created. The compiled schemas are kept in memory by URL.
+Imports and includes within the schemas are looked up in the catalog as well, so a schema can be compiled without network access.
+
+If a schema (or one of its imports) is not in the catalog, it is downloaded once and persisted in the catalog directory (unless schemacache.download is switched off).
+The catalog directory can be filled on a machine with network access and then be copied to an air-gapped AM.
+URLs which could not be downloaded or compiled are not tried again for schemacache.negative_ttl seconds.
+
+Example code:
+    schemacache = pm.getService('schemacache')
+    schema = schemacache.getSchema('http://www.geni.net/resources/rspec/3/request.xsd') # None if not available
+    problems = schemacache.validate(rspec_root) # validates against the schemas given in xsi:schemaLocation
+    for problem in problems:
+        logger.warning(problem)
+"""
+import os
+import os.path
+import json
+import time
+import hashlib
+import urllib2
+import threading
+
+from lxml import etree
+
+import amsoil.core.pluginmanager as pm
+from amsoil.core import serviceinterface
+from amsoil.config import expand_amsoil_path
+import amsoil.core.log
+logger=amsoil.core.log.getLogger('schemacache')
+
+CATALOG_FILE = 'catalog.json'
+SCHEMA_LOCATION = '{http://www.w3.org/2001/XMLSchema-instance}schemaLocation'
+
+class SchemaNotAvailable(Exception):
+    pass
+
+class _CatalogResolver(etree.Resolver):
+    """Resolves the imports and includes of a schema via the catalog."""
+    def __init__(self, cache):
+        etree.Resolver.__init__(self)
+        self._cache = cache
+
+    def resolve(self, url, pubid, context):
+        try:
+            data = self._cache._load(url)
+        except SchemaNotAvailable:
+            return None # libxml2 reports the missing import
+        return self.resolve_string(data, context, base_url=url)
+
+class SchemaCache(object):
+    """Please see module documentation."""
+    def __init__(self, catalog_path):
+        self._path = expand_amsoil_path(catalog_path)
+        self._lock = threading.RLock() # for catalog, downloads and compilation
+        self._validateLock = threading.Lock() # an XMLSchema object must not validate in multiple threads at once
+        self._catalog = {} # url -> file name
+        self._schemas = {} # url -> XMLSchema
+        self._failed = {} # url -> time of the failure
+        self._parser = etree.XMLParser(no_network=True, resolve_entities=False)
+        self._parser.resolvers.add(_CatalogResolver(self))
+        self._readCatalog()
+        self._preload()
+
+    @serviceinterface
+    def getSchema(self, url):
+        """Returns the compiled schema (etree.XMLSchema) for the given {url} or None if it is not available."""
+        schema = self._schemas.get(url)
+        if schema is not None:
+            return schema
+        with self._lock:
+            if url in self._schemas:
+                return self._schemas[url]
+            failed = self._failed.get(url)
+            if (failed is not None) and (failed + self._setting("schemacache.negative_ttl") > time.time()):
+                return None
+            try:
+                schema = self._compile(url)
+            except Exception as e:
+                logger.warning("could not load schema %s (%s)" % (url, str(e)))
+                self._failed[url] = time.time()
+                return None
+            self._failed.pop(url, None)
+            self._schemas[url] = schema
+            return schema
+
+    @serviceinterface
+    def validate(self, root):
+        """Validates the given lxml {root} element against the schemas in its xsi:schemaLocation attribute.
+        Returns a list of the problems found (as strings). The list is empty if the document is valid."""
+        schema_locations = root.get(SCHEMA_LOCATION)
+        if not schema_locations:
+            return ["document does not specify any schema locations"]
+        problems = []
+        locations = schema_locations.split()
+        for url in locations[1::2]: # pairs of namespace and schema URL
+            schema = self.getSchema(url)
+            if schema is None:
+                problems.append("schema %s is not available" % (url,))
+                continue
+            with self._validateLock:
+                if not schema.validate(root):
+                    problems.extend(["%s: line %i: %s" % (url, error.line, error.message) for error in schema.error_log])
+        return problems
+
+    def _setting(self, key):
+        return pm.getService("config").get(key)
+
+    def _compile(self, url):
+        document = etree.fromstring(self._load(url), self._parser, base_url=url)
+        return etree.XMLSchema(etree.ElementTree(document))
+
+    def _preload(self):
+        for url in self._catalog.keys():
+            try:
+                self._schemas[url] = self._compile(url)
+            except Exception as e: # e.g. schemas which are only included by others
+                logger.debug("did not preload schema %s (%s)" % (url, str(e)))
+        logger.info("preloaded %i of %i schemas from %s" % (len(self._schemas), len(self._catalog), self._path))
+
+    def _load(self, url):
+        """Returns the contents of the schema with the given {url} from the catalog. Downloads and persists the schema if it is not in the catalog."""
+        with self._lock:
+            if url not in self._catalog:
+                self._readCatalog() # another process may have downloaded it
+            if url not in self._catalog:
+                self._download(url)
+            try:
+                with open(os.path.join(self._path, self._catalog[url]), 'rb') as f:
+                    return f.read()
+            except IOError as e:
+                raise SchemaNotAvailable("could not read %s from the catalog (%s)" % (url, str(e)))
+
+    def _download(self, url):
+        failed = self._failed.get(url)
+        if (failed is not None) and (failed + self._setting("schemacache.negative_ttl") > time.time()):
+            raise SchemaNotAvailable("download of %s failed recently" % (url,))
+        if not self._setting("schemacache.download"):
+            raise SchemaNotAvailable("%s is not in the catalog and downloads are disabled" % (url,))
+        logger.info("downloading schema %s" % (url,))
+        try:
+            data = urllib2.urlopen(url, timeout=self._setting("schemacache.download_timeout")).read()
+            etree.fromstring(data, self._parser) # do not persist anything which is not XML
+        except Exception as e:
+            self._failed[url] = time.time()
+            raise SchemaNotAvailable("could not download %s (%s)" % (url, str(e)))
+        filename = "%s-%s" % (hashlib.sha1(url).hexdigest()[:8], os.path.basename(url.split('?')[0]) or 'schema.xsd')
+        if not os.path.isdir(self._path):
+            os.makedirs(self._path)
+        self._writeFile(filename, data)
+        self._readCatalog()
+        self._catalog[url] = filename
+        self._writeFile(CATALOG_FILE, json.dumps(self._catalog, indent=2, sort_keys=True))
+
+    def _readCatalog(self):
+        try:
+            with open(os.path.join(self._path, CATALOG_FILE), 'rb') as f:
+                self._catalog = json.load(f)
+        except IOError:
+            self._catalog = {}
+        except ValueError as e:
+            logger.error("could not read the schema catalog %s (%s)" % (os.path.join(self._path, CATALOG_FILE), str(e)))
+
+    def _writeFile(self, filename, data):
+        """Writes the file via a temporary file, so other processes never read a partial file."""
+        path = os.path.join(self._path, filename)
+        temp_path = "%s.%i.tmp" % (path, os.getpid())
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.rename(temp_path, path)
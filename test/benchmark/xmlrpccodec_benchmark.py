@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+Compares the XML-RPC codecs of the flaskrpcs plugin (see src/plugins/flaskrpcs/xmlrpccodec.py) on GENI AM API v3 payloads.
+For each payload, the script checks that all codecs produce the same XML and parse it to the same values and prints the time per call.
+
+Usage: python xmlrpccodec_benchmark.py [repetitions]
+"""
+import os
+import sys
+import timeit
+import tempfile
+
+ROOT_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(ROOT_PATH, 'src'))
+sys.path.insert(0, os.path.join(ROOT_PATH, 'src', 'plugins', 'flaskrpcs'))
+
+from amsoil import config
+config.LOG_FILE = os.path.join(tempfile.gettempdir(), 'amsoil_benchmark.log') # do not write into the deployment's log
+
+import xmlrpccodec
+
+def advertisement(nodeCount):
+    nodes = []
+    for i in range(nodeCount):
+        nodes.append('<node component_id="urn:publicid:IDN+am.example.org+node+pc%i" component_manager_id="urn:publicid:IDN+am.example.org+authority+am" exclusive="true">'
+                     '<sliver_type name="raw-pc"/><interface component_id="urn:publicid:IDN+am.example.org+interface+pc%i:eth0"/>'
+                     '<available now="true"/><location country="DE" latitude="52.5" longitude="13.4"/></node>' % (i, i))
+    return '<?xml version="1.0" encoding="UTF-8"?>\n<rspec type="advertisement" xmlns="http://www.geni.net/resources/rspec/3">%s</rspec>' % (''.join(nodes),)
+
+def credential(index):
+    return {'geni_type' : 'geni_sfa', 'geni_version' : '3', 'geni_value' : '<?xml version="1.0"?><signed-credential>%s</signed-credential>' % ('<signature>%s</signature>' % ('A' * 64,) * 120,)}
+
+def slivers(count):
+    return [{'geni_sliver_urn' : 'urn:publicid:IDN+am.example.org+sliver+%i' % (i,), 'geni_expires' : '2013-07-01T12:00:00Z',
+             'geni_allocation_status' : 'geni_provisioned', 'geni_operational_status' : 'geni_ready', 'geni_error' : ''} for i in range(count)]
+
+PAYLOADS = [
+    ('ListResources response (1 MB rspec)', dict(params=({'code' : {'geni_code' : 0}, 'value' : advertisement(2500), 'output' : None},), methodresponse=1)),
+    ('Describe response (1000 slivers)', dict(params=({'code' : {'geni_code' : 0}, 'value' : {'geni_rspec' : advertisement(100), 'geni_urn' : 'urn:publicid:IDN+ch.example.org+slice+test', 'geni_slivers' : slivers(1000)}, 'output' : None},), methodresponse=1)),
+    ('Allocate request (3 credentials)', dict(params=('urn:publicid:IDN+ch.example.org+slice+test', [credential(i) for i in range(3)], advertisement(50), {'geni_end_time' : '2013-07-01T12:00:00Z'}), methodname='Allocate')),
+    ('GetVersion response', dict(params=({'code' : {'geni_code' : 0}, 'value' : {'geni_api' : 3, 'geni_api_versions' : {'3' : 'https://am.example.org:8001/RPC3'}, 'geni_single_allocation' : False}, 'output' : None},), methodresponse=1))]
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    codecs = [(name, xmlrpccodec.getCodec(name)) for name in sorted(xmlrpccodec.CODECS.keys())]
+    reference = xmlrpccodec.getCodec(xmlrpccodec.DEFAULT_CODEC)
+    print "%-40s %-10s %12s %12s" % ('payload', 'codec', 'dumps (ms)', 'loads (ms)')
+    for title, options in PAYLOADS:
+        data = reference.dumps(allow_none=True, **options)
+        expected = reference.loads(data)
+        for name, codec in codecs:
+            if codec.dumps(allow_none=True, **options) != data:
+                raise AssertionError("%s: the codec '%s' does not write the same XML as xmlrpclib" % (title, name))
+            if codec.loads(data) != expected:
+                raise AssertionError("%s: the codec '%s' does not parse the same values as xmlrpclib" % (title, name))
+            dumpsTime = min(timeit.repeat(lambda: codec.dumps(allow_none=True, **options), number=repetitions, repeat=3)) / repetitions
+            loadsTime = min(timeit.repeat(lambda: codec.loads(data), number=repetitions, repeat=3)) / repetitions
+            print "%-40s %-10s %12.2f %12.2f" % (title, name, dumpsTime * 1000, loadsTime * 1000)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Shared set-up of the unit tests.
+
+Importing this module puts src/ on the python path and points the log file to a temporary folder, which is removed when the tests exit.
+It has to be imported before any amsoil.core module (the log file is opened when amsoil.core.log is imported).
+The tests run the plugins' modules without the pluginmanager's init, so the services they use are replaced by stand-ins (e.g. ConfigStub).
+TestCase.registerService registers such a stand-in for the duration of one test, so the test modules can be run together (e.g. via unittest discover).
+
+Example code:
+    import sys
+    from os.path import dirname, join, normpath
+    sys.path.insert(0, normpath(join(dirname(__file__), '..')))
+    import amsoiltest
+    amsoiltest.addPluginPath('flaskrpcs')
+    import compression
+
+    class CompressionTest(amsoiltest.TestCase):
+        def setUp(self):
+            self.config = self.registerService('config', amsoiltest.ConfigStub({ 'flask.compress' : True }))
+"""
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import unittest
+
+SRC_PATH = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src'))
+if not SRC_PATH in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+TMP_DIR = tempfile.mkdtemp(prefix='amsoiltest-')
+atexit.register(shutil.rmtree, TMP_DIR, True)
+
+from amsoil import config
+config.LOG_FILE = os.path.join(TMP_DIR, 'amsoil.log')
+import amsoil.core.pluginmanager as pm
+
+def addPluginPath(pluginName):
+    """Makes the modules of the given plugin importable (the same way the pluginmanager does)."""
+    path = os.path.join(SRC_PATH, 'plugins', pluginName)
+    if not path in sys.path:
+        sys.path.insert(0, path)
+
+def useTemporaryConfigDB():
+    """Points the config database (see plugins/configdb) to a file in TMP_DIR and switches the snapshot off. Has to be called before amconfigdb is imported."""
+    config.CONFIGDB_PATH = os.path.join(TMP_DIR, 'config.db')
+    config.CONFIGDB_ENGINE = 'sqlite:///%s' % (config.CONFIGDB_PATH,)
+    config.CONFIGDB_SNAPSHOT_PATH = None
+    addPluginPath('configdb')
+
+def mkdtemp():
+    """Returns a new folder below TMP_DIR (removed with it)."""
+    return tempfile.mkdtemp(dir=TMP_DIR)
+
+class ConfigStub(object):
+    """Stands in for the config service (see plugins/configdb). The values are kept in the dict {values}."""
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self._subscriptions = [] # (keyOrPrefix, callback)
+
+    def get(self, key):
+        return self.values[key]
+
+    def getMany(self, keys):
+        return dict([(key, self.values[key]) for key in keys])
+
+    def set(self, key, value):
+        self.values[key] = value
+        for keyOrPrefix, callback in self._subscriptions:
+            if (key == keyOrPrefix) or key.startswith(keyOrPrefix + '.'):
+                callback(key, value)
+
+    def subscribe(self, keyOrPrefix, callback):
+        self._subscriptions.append((keyOrPrefix, callback))
+        return len(self._subscriptions) - 1
+
+class TestCase(unittest.TestCase):
+    def registerService(self, name, service):
+        """Registers the {service} under {name} until the end of the test. Returns the {service}."""
+        pm.registerService(name, service)
+        self.addCleanup(pm._serviceRegistry.pop, name, None)
+        return service
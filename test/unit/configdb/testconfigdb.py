@@ -0,0 +1,133 @@
+import sys
+import pickle
+import sqlite3
+import threading
+import unittest
+from os.path import dirname, join, normpath
+
+sys.path.insert(0, normpath(join(dirname(__file__), '..')))
+import amsoiltest
+amsoiltest.useTemporaryConfigDB()
+import amconfigdb
+from amconfigdbexceptions import ConfigUnknownConfigKey
+
+DB_PATH = amconfigdb.db_engine.url.database
+
+class ConfigDBTest(unittest.TestCase):
+    def setUp(self):
+        amconfigdb.CONFIGDB_CACHE_STALENESS = 1000 # only the changes made by this process are seen, unless a test says otherwise
+        amconfigdb.db_session.query(amconfigdb.ConfigEntry).delete()
+        amconfigdb.db_session.commit()
+        self._configdb = amconfigdb.ConfigDB()
+        self._configdb.install('test.int', 1, 'an immutable value')
+        self._configdb.install('test.list', [1, 2], 'a mutable value')
+
+    def tearDown(self):
+        amconfigdb.db_session.remove()
+
+    def _changeFromOtherProcess(self, key, value):
+        """Changes the value in the database like another process would (without going through this process' ConfigDB or session)."""
+        connection = sqlite3.connect(DB_PATH)
+        connection.execute("UPDATE config SET value=? WHERE key=?", (sqlite3.Binary(pickle.dumps(value, 2)), key))
+        connection.execute("UPDATE config_version SET version=version+1")
+        connection.commit()
+        connection.close()
+
+    def testGet(self):
+        self.assertEqual(self._configdb.get('test.int'), 1)
+        self.assertEqual(self._configdb.get('test.list'), [1, 2])
+        self.assertRaises(ConfigUnknownConfigKey, self._configdb.get, 'test.unknown')
+
+    def testCacheHit(self):
+        self._configdb.get('test.int')
+        self.assertEqual(self._configdb._cache['test.int'], 1)
+        self._changeFromOtherProcess('test.int', 2)
+        self.assertEqual(self._configdb.get('test.int'), 1) # still within the staleness window
+
+    def testMutableValuesAreCopied(self):
+        self._configdb.get('test.list').append(3)
+        self.assertEqual(self._configdb.get('test.list'), [1, 2])
+
+    def testOwnChangesAreSeenImmediately(self):
+        self._configdb.get('test.int')
+        self._configdb.set('test.int', 2)
+        self.assertEqual(self._configdb.get('test.int'), 2)
+        self._configdb.install('test.int', 3, '', force=True)
+        self.assertEqual(self._configdb.get('test.int'), 3)
+
+    def testOtherProcessChangesAfterStaleness(self):
+        amconfigdb.CONFIGDB_CACHE_STALENESS = 0
+        self._configdb.get('test.int')
+        self._changeFromOtherProcess('test.int', 2)
+        self.assertEqual(self._configdb.get('test.int'), 2)
+
+    def testObjectLoadedBeforeIsNotServed(self):
+        amconfigdb.CONFIGDB_CACHE_STALENESS = 0
+        self._configdb.get('test.int')
+        row = self._configdb._getRow('test.int') # keep the object in the session's identity map
+        self._changeFromOtherProcess('test.int', 2)
+        self.assertEqual(self._configdb.get('test.int'), 2)
+
+    def testOtherThreadReadsFromTheDatabase(self):
+        """The cache is cleared by one thread, a thread whose session has loaded the object before must not fill the cache with the old value."""
+        loaded, changed = threading.Event(), threading.Event()
+        values = []
+        def other():
+            self._configdb.get('test.int')
+            row = self._configdb._getRow('test.int') # keep the object in this thread's identity map
+            amconfigdb.db_session.commit()
+            loaded.set()
+            changed.wait()
+            values.append(self._configdb.get('test.int'))
+            amconfigdb.db_session.remove()
+        thread = threading.Thread(target=other)
+        thread.start()
+        loaded.wait()
+        self._changeFromOtherProcess('test.int', 2)
+        amconfigdb.CONFIGDB_CACHE_STALENESS = 0
+        self._configdb._checkVersion() # clears the cache
+        amconfigdb.CONFIGDB_CACHE_STALENESS = 1000
+        changed.set()
+        thread.join()
+        self.assertEqual(values, [2])
+
+    def testInstallMany(self):
+        installed = self._configdb.installMany([('test.int', 5, ''), ('test.new', 'a', 'a new value')])
+        self.assertEqual(installed, ['test.new'])
+        self.assertEqual(self._configdb.get('test.int'), 1) # not changed without force
+        self.assertEqual(self._configdb.get('test.new'), 'a')
+        self.assertEqual(self._configdb.installMany([('test.new', 'b', '')]), [])
+
+    def testInstallManyForce(self):
+        self._configdb.get('test.int')
+        installed = self._configdb.installMany([('test.int', 5, ''), ('test.other', 6, '')], force=True)
+        self.assertEqual(installed, ['test.int', 'test.other'])
+        self.assertEqual(self._configdb.getMany(['test.int', 'test.other']), { 'test.int' : 5, 'test.other' : 6 })
+
+    def testInstallManyNotifies(self):
+        notifications = []
+        self._configdb.subscribe('test', lambda key, value: notifications.append((key, value)))
+        self._configdb.installMany([('test.int', 5, ''), ('test.new', 'a', '')])
+        self.assertEqual(notifications, [('test.new', 'a')])
+
+    def testGetMany(self):
+        self._configdb.get('test.int') # one cached, one not
+        values = self._configdb.getMany(['test.int', 'test.list'])
+        self.assertEqual(values, { 'test.int' : 1, 'test.list' : [1, 2] })
+        values['test.list'].append(3)
+        self.assertEqual(self._configdb.getMany(['test.list']), { 'test.list' : [1, 2] })
+        self.assertEqual(self._configdb.getMany([]), {})
+        self.assertRaises(ConfigUnknownConfigKey, self._configdb.getMany, ['test.int', 'test.unknown'])
+
+    def testGetManyFillsTheCache(self):
+        self._configdb.getMany(['test.int', 'test.list'])
+        self.assertEqual(sorted(self._configdb._cache.keys()), ['test.int', 'test.list'])
+
+    def testGetManyAfterOtherProcessChanges(self):
+        amconfigdb.CONFIGDB_CACHE_STALENESS = 0
+        self._configdb.getMany(['test.int', 'test.list'])
+        self._changeFromOtherProcess('test.list', [3])
+        self.assertEqual(self._configdb.getMany(['test.int', 'test.list']), { 'test.int' : 1, 'test.list' : [3] })
+
+if __name__ == '__main__':
+    unittest.main()
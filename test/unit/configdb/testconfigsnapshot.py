@@ -0,0 +1,171 @@
+import os
+import sys
+import unittest
+from os.path import dirname, join, normpath
+
+sys.path.insert(0, normpath(join(dirname(__file__), '..')))
+import amsoiltest
+amsoiltest.useTemporaryConfigDB()
+import configsnapshot
+import amconfigsnapshot
+import amconfigdb
+from amconfigdbexceptions import ConfigUnknownConfigKey, ConfigReadOnly
+
+ITEMS = [('flask.bind', '0.0.0.0', 'IP to bind to.'), ('flask.workers', [1, 2], u'd\xe9sc'), ('a', None, None)]
+
+class ConfigSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self._path = join(amsoiltest.TMP_DIR, 'config.snapshot')
+        configsnapshot.writeSnapshot(self._path, 42, ITEMS)
+
+    def tearDown(self):
+        os.remove(self._path)
+
+    def testRoundTrip(self):
+        snapshot = configsnapshot.ConfigSnapshot(self._path)
+        self.assertEqual(snapshot.configVersion, 42)
+        self.assertEqual(snapshot.get('flask.bind'), '0.0.0.0')
+        self.assertEqual(snapshot.get('flask.workers'), [1, 2])
+        self.assertEqual(snapshot.get('a'), None)
+        self.assertTrue('a' in snapshot)
+        self.assertFalse('b' in snapshot)
+        self.assertRaises(KeyError, snapshot.get, 'b')
+        self.assertEqual(snapshot.keys(), ['a', 'flask.bind', 'flask.workers'])
+        self.assertEqual(snapshot.items(), [('a', None, ''), ('flask.bind', '0.0.0.0', 'IP to bind to.'), ('flask.workers', [1, 2], u'd\xe9sc')])
+        snapshot.close()
+
+    def testEmpty(self):
+        configsnapshot.writeSnapshot(self._path, 0, [])
+        snapshot = configsnapshot.ConfigSnapshot(self._path)
+        self.assertEqual(snapshot.items(), [])
+        self.assertFalse('a' in snapshot)
+        snapshot.close()
+
+    def testEmptyFile(self):
+        open(self._path, 'wb').close()
+        self.assertRaises(configsnapshot.SnapshotFormatError, configsnapshot.ConfigSnapshot, self._path)
+
+    def testNotASnapshot(self):
+        with open(self._path, 'wb') as f:
+            f.write('x' * configsnapshot.HEADER.size)
+        self.assertRaises(configsnapshot.SnapshotFormatError, configsnapshot.ConfigSnapshot, self._path)
+        with open(self._path, 'wb') as f:
+            f.write('AMSOILCS')
+        self.assertRaises(configsnapshot.SnapshotFormatError, configsnapshot.ConfigSnapshot, self._path)
+
+class SnapshotConfigDBTest(unittest.TestCase):
+    def setUp(self):
+        amconfigsnapshot.CONFIGDB_CACHE_STALENESS = 1000
+        self._path = join(amsoiltest.TMP_DIR, 'config.snapshot')
+        configsnapshot.writeSnapshot(self._path, 1, ITEMS)
+        self._configdb = amconfigsnapshot.SnapshotConfigDB(self._path)
+
+    def tearDown(self):
+        os.remove(self._path)
+
+    def _expireCheck(self):
+        """Pretends the last check for changes is older than the staleness window."""
+        self._configdb._checked -= amconfigsnapshot.CONFIGDB_CACHE_STALENESS + 1
+
+    def testGet(self):
+        self.assertEqual(self._configdb.get('flask.bind'), '0.0.0.0')
+        self._configdb.get('flask.workers').append(3)
+        self.assertEqual(self._configdb.getMany(['flask.bind', 'flask.workers']), { 'flask.bind' : '0.0.0.0', 'flask.workers' : [1, 2] })
+        self.assertRaises(ConfigUnknownConfigKey, self._configdb.get, 'unknown')
+        self.assertEqual(len(self._configdb.getAll()), len(ITEMS))
+
+    def testReadOnly(self):
+        self.assertRaises(ConfigReadOnly, self._configdb.set, 'flask.bind', '127.0.0.1')
+        self.assertRaises(ConfigReadOnly, self._configdb.install, 'flask.bind', '127.0.0.1', '', True)
+
+    def testInstallUsesDefaultsForMissingKeys(self):
+        self.assertEqual(self._configdb.installMany([('flask.bind', '127.0.0.1', ''), ('new', 6, '')]), ['new'])
+        self.assertEqual(self._configdb.get('flask.bind'), '0.0.0.0')
+        self.assertEqual(self._configdb.get('new'), 6)
+        self.assertFalse(self._configdb.install('new', 7, ''))
+
+    def testReloadAfterStaleness(self):
+        self._configdb.get('flask.bind')
+        configsnapshot.writeSnapshot(self._path, 2, [('flask.bind', '127.0.0.1', '')])
+        self.assertEqual(self._configdb.get('flask.bind'), '0.0.0.0') # still within the staleness window
+        self._expireCheck()
+        self.assertEqual(self._configdb.get('flask.bind'), '127.0.0.1')
+        self.assertRaises(ConfigUnknownConfigKey, self._configdb.get, 'flask.workers')
+
+    def testChangesAreNotified(self):
+        notifications = []
+        self._configdb.subscribe('flask', lambda key, value: notifications.append((key, value)))
+        configsnapshot.writeSnapshot(self._path, 2, [('flask.bind', '127.0.0.1', ''), ('flask.workers', [1, 2], ''), ('other', 1, '')])
+        self._expireCheck()
+        self._configdb._checkForChanges()
+        self.assertEqual(notifications, [('flask.bind', '127.0.0.1')])
+
+class ExportSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self._path = join(amsoiltest.TMP_DIR, 'exported.snapshot')
+        amconfigdb.CONFIGDB_SNAPSHOT_PATH = None
+        amconfigdb.db_session.query(amconfigdb.ConfigEntry).delete()
+        amconfigdb.db_session.commit()
+        self._written = []
+        self._writeSnapshot = configsnapshot.writeSnapshot
+        configsnapshot.writeSnapshot = self._countWrite
+
+    def tearDown(self):
+        configsnapshot.writeSnapshot = self._writeSnapshot
+        amconfigdb.CONFIGDB_SNAPSHOT_PATH = None
+        amconfigdb.CONFIGDB_SNAPSHOT_DELAY = 1.0
+        amconfigdb.db_session.remove()
+        if os.path.exists(self._path):
+            os.remove(self._path)
+
+    def _countWrite(self, path, version, items):
+        self._written.append(path)
+        self._writeSnapshot(path, version, items)
+
+    def testExport(self):
+        configdb = amconfigdb.ConfigDB()
+        configdb.installMany([('flask.bind', '0.0.0.0', 'IP to bind to.'), ('flask.workers', [1, 2], '')])
+        configdb.exportSnapshot(self._path)
+        snapshot = configsnapshot.ConfigSnapshot(self._path)
+        self.assertEqual(snapshot.items(), [('flask.bind', '0.0.0.0', 'IP to bind to.'), ('flask.workers', [1, 2], '')])
+        self.assertEqual(snapshot.configVersion, amconfigdb.db_session.query(amconfigdb.ConfigVersion.version).scalar())
+        snapshot.close()
+
+    def testChangesAreExportedOnce(self):
+        amconfigdb.CONFIGDB_SNAPSHOT_PATH = self._path
+        amconfigdb.CONFIGDB_SNAPSHOT_DELAY = 1000 # the test writes the pending export itself
+        configdb = amconfigdb.ConfigDB()
+        del self._written[:] # the outdated snapshot is replaced when the ConfigDB is created
+        configdb.install('flask.bind', '0.0.0.0', '')
+        configdb.installMany([('flask.workers', 4, '')])
+        configdb.set('flask.bind', '127.0.0.1')
+        self.assertEqual(self._written, []) # not written by the changing thread
+        configdb._exportPendingSnapshot()
+        self.assertEqual(self._written, [self._path])
+        snapshot = configsnapshot.ConfigSnapshot(self._path)
+        self.assertEqual(snapshot.get('flask.bind'), '127.0.0.1')
+        self.assertEqual(snapshot.get('flask.workers'), 4)
+        snapshot.close()
+        configdb._exportPendingSnapshot() # nothing pending anymore
+        self.assertEqual(self._written, [self._path])
+
+    def testExportInBackground(self):
+        amconfigdb.CONFIGDB_SNAPSHOT_PATH = self._path
+        amconfigdb.CONFIGDB_SNAPSHOT_DELAY = 0.1
+        configdb = amconfigdb.ConfigDB()
+        configdb.install('flask.bind', '0.0.0.0', '')
+        configdb._snapshotTimer.join()
+        snapshot = configsnapshot.ConfigSnapshot(self._path)
+        self.assertEqual(snapshot.get('flask.bind'), '0.0.0.0')
+        snapshot.close()
+
+    def testEmptySnapshotIsReplaced(self):
+        open(self._path, 'wb').close() # e.g. left by a crash
+        amconfigdb.CONFIGDB_SNAPSHOT_PATH = self._path
+        amconfigdb.ConfigDB()
+        snapshot = configsnapshot.ConfigSnapshot(self._path)
+        self.assertEqual(snapshot.configVersion, amconfigdb.db_session.query(amconfigdb.ConfigVersion.version).scalar())
+        snapshot.close()
+
+if __name__ == '__main__':
+    unittest.main()
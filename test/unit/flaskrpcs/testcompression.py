@@ -0,0 +1,137 @@
+import sys
+import zlib
+import gzip
+import unittest
+from StringIO import StringIO
+from os.path import dirname, join, normpath
+
+sys.path.insert(0, normpath(join(dirname(__file__), '..')))
+import amsoiltest
+amsoiltest.addPluginPath('flaskrpcs')
+
+import compression
+from compression import CompressionMiddleware, _acceptedEncoding
+
+MIN_SIZE = 10
+STREAM_SIZE = 100
+SETTINGS = { 'flask.compress' : True, 'flask.compress_min_size' : MIN_SIZE, 'flask.compress_level' : 6, 'flask.compress_stream_size' : STREAM_SIZE }
+
+class AcceptEncodingTest(unittest.TestCase):
+    def testNegotiation(self):
+        for header, expected in [
+                ('', None), ('identity', None), ('gzip', 'gzip'), ('deflate', 'deflate'), ('GZIP', 'gzip'),
+                ('gzip, deflate', 'gzip'), ('deflate, gzip', 'gzip'), ('gzip;q=0.5, deflate', 'deflate'),
+                ('gzip;q=0, deflate;q=0', None), ('gzip;q=0', None), ('*', 'gzip'), ('*;q=0.5, gzip;q=0', 'deflate'),
+                ('deflate;q=0.8, *;q=0.9', 'gzip'), ('gzip; q=0.2 , br', 'gzip'), ('gzip;q=bad, deflate', 'deflate'),
+                ('br, compress', None)]:
+            self.assertEqual(_acceptedEncoding(header), expected, "%r should select %r" % (header, expected))
+
+def application(body, contentType='text/xml', status='200 OK', headers=[], lazy=False):
+    """Returns a WSGI application which returns the list of strings {body}. If {lazy} is set, start_response is called when the first chunk is requested."""
+    closed = []
+    def app(environ, start_response):
+        if lazy:
+            def generate():
+                start_response(status, [('Content-Type', contentType)] + headers)
+                for chunk in body:
+                    yield chunk
+                closed.append(True)
+            return generate()
+        start_response(status, [('Content-Type', contentType)] + headers)
+        return ClosingList(body, closed)
+    app.closed = closed
+    return app
+
+class ClosingList(list):
+    def __init__(self, items, closed):
+        list.__init__(self, items)
+        self._closed = closed
+    def close(self):
+        self._closed.append(True)
+
+class CompressionMiddlewareTest(amsoiltest.TestCase):
+    def setUp(self):
+        self._config = self.registerService('config', amsoiltest.ConfigStub(SETTINGS))
+
+    def _request(self, app, acceptEncoding='gzip', method='POST'):
+        """Returns (status, headers dict, body). {app} is either a WSGI application or a CompressionMiddleware."""
+        if not isinstance(app, CompressionMiddleware):
+            app = CompressionMiddleware(app)
+        response = []
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+        body = ''.join(app({ 'REQUEST_METHOD' : method, 'HTTP_ACCEPT_ENCODING' : acceptEncoding }, start_response))
+        return response[0], dict(response[1]), body
+
+    def _decompress(self, headers, body):
+        encoding = headers.get('Content-Encoding')
+        if encoding == 'gzip':
+            return gzip.GzipFile(fileobj=StringIO(body)).read()
+        elif encoding == 'deflate':
+            return zlib.decompress(body)
+        return body
+
+    def testSmallBody(self):
+        app = application(['a' * (MIN_SIZE - 1)])
+        status, headers, body = self._request(app)
+        self.assertFalse('Content-Encoding' in headers)
+        self.assertEqual(body, 'a' * (MIN_SIZE - 1))
+        self.assertEqual(app.closed, [True])
+
+    def testCompressedAtOnce(self):
+        for encoding in ['gzip', 'deflate']:
+            app = application(['a' * MIN_SIZE, 'b' * MIN_SIZE], headers=[('Content-Length', str(2 * MIN_SIZE))])
+            status, headers, body = self._request(app, encoding)
+            self.assertEqual(headers['Content-Encoding'], encoding)
+            self.assertEqual(headers['Content-Length'], str(len(body)))
+            self.assertEqual(headers['Vary'], 'Accept-Encoding')
+            self.assertEqual(self._decompress(headers, body), 'a' * MIN_SIZE + 'b' * MIN_SIZE)
+            self.assertEqual(app.closed, [True])
+
+    def testStreamed(self):
+        app = application(['a' * STREAM_SIZE, 'b' * compression.CHUNK_SIZE * 2])
+        status, headers, body = self._request(app)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertFalse('Content-Length' in headers)
+        self.assertEqual(self._decompress(headers, body), 'a' * STREAM_SIZE + 'b' * compression.CHUNK_SIZE * 2)
+        self.assertEqual(app.closed, [True])
+
+    def testLazyStartResponse(self):
+        for body in [[], ['a'], ['a' * 50, 'b' * 50, 'c' * 50], ['a' * STREAM_SIZE] * 3]:
+            status, headers, result = self._request(application(body, lazy=True))
+            self.assertEqual(self._decompress(headers, result), ''.join(body))
+            self.assertEqual('Content-Encoding' in headers, len(''.join(body)) >= MIN_SIZE)
+
+    def testNotCompressed(self):
+        body = 'a' * STREAM_SIZE
+        for app, acceptEncoding, method in [
+                (application([body]), 'identity', 'POST'),
+                (application([body]), 'gzip', 'HEAD'),
+                (application([body], contentType='image/png'), 'gzip', 'POST'),
+                (application([body], contentType='image/png', lazy=True), 'gzip', 'POST'),
+                (application([body], headers=[('Content-Encoding', 'x-custom')]), 'gzip', 'POST'),
+                (application([body], headers=[('Content-Length', str(MIN_SIZE - 1))]), 'gzip', 'POST'),
+                (application([body], status='304 Not Modified'), 'gzip', 'POST')]:
+            status, headers, result = self._request(app, acceptEncoding, method)
+            self.assertNotEqual(headers.get('Content-Encoding'), 'gzip')
+            self.assertFalse('Vary' in headers)
+            self.assertEqual(result, body)
+
+    def testVaryIsExtended(self):
+        status, headers, body = self._request(application(['a' * MIN_SIZE], headers=[('Vary', 'Cookie')]))
+        self.assertEqual(headers['Vary'], 'Cookie, Accept-Encoding')
+
+    def testSettingsChange(self):
+        middleware = CompressionMiddleware(application(['a' * MIN_SIZE]))
+        self._config.set('flask.compress', False)
+        status, headers, body = self._request(middleware)
+        self.assertFalse('Content-Encoding' in headers)
+        self._config.set('flask.compress', True)
+        status, headers, body = self._request(middleware)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self._config.set('flask.compress_min_size', MIN_SIZE * 2)
+        status, headers, body = self._request(middleware)
+        self.assertFalse('Content-Encoding' in headers)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import sys
+import unittest
+import xmlrpclib
+from os.path import dirname, join, normpath
+
+sys.path.insert(0, normpath(join(dirname(__file__), '..')))
+import amsoiltest
+amsoiltest.addPluginPath('flaskrpcs')
+import amsoil.core.log
+from amsoil.core import serviceinterface
+
+from flask import Flask
+import flaskxmlrpc
+from xmlrpcdispatcher import XMLRPCDispatcher
+
+MAX_CALLS = 3
+
+class FlaskServerStub(object):
+    def __init__(self):
+        self.app = Flask(__name__)
+
+class TestDispatcher(XMLRPCDispatcher):
+    def __init__(self):
+        super(TestDispatcher, self).__init__(amsoil.core.log.getLogger('testmulticall'))
+
+    def Status(self, urn):
+        """Returns the status of the slice."""
+        if urn == 'fault':
+            raise xmlrpclib.Fault(12, "no such slice")
+        if urn == 'error':
+            raise ValueError("broken")
+        return { 'urn' : urn }
+
+    @serviceinterface
+    def setDelegate(self, delegate):
+        pass
+
+class MulticallTest(amsoiltest.TestCase):
+    codec = 'xmlrpclib'
+
+    def setUp(self):
+        self.registerService('config', amsoiltest.ConfigStub({ 'flask.xmlrpc_codec' : self.codec, 'flask.multicall_max_calls' : MAX_CALLS }))
+        server = FlaskServerStub()
+        flaskxmlrpc.FlaskXMLRPC(server).registerXMLRPC('test', TestDispatcher(), '/RPC2')
+        self._client = server.app.test_client()
+
+    def _call(self, method, *params):
+        response = self._client.post('/RPC2', data=xmlrpclib.dumps(params, method))
+        return xmlrpclib.loads(response.data)[0][0]
+
+    def assertFault(self, faultCode, method, *params):
+        try:
+            self._call(method, *params)
+        except xmlrpclib.Fault, e:
+            self.assertEqual(e.faultCode, faultCode)
+            return e
+        self.fail("%s did not return a fault" % (method,))
+
+    def testCall(self):
+        self.assertEqual(self._call('Status', 'urn:a'), { 'urn' : 'urn:a' })
+        self.assertFault(12, 'Status', 'fault')
+        self.assertFault(1, 'Status', 'error')
+
+    def testMulticall(self):
+        results = self._call('system.multicall', [{ 'methodName' : 'Status', 'params' : ['urn:a'] }, { 'methodName' : 'Status', 'params' : ['urn:b'] }])
+        self.assertEqual(results, [[{ 'urn' : 'urn:a' }], [{ 'urn' : 'urn:b' }]])
+        self.assertEqual(self._call('system.multicall', []), [])
+
+    def testFaultsDoNotAffectOtherCalls(self):
+        results = self._call('system.multicall', [{ 'methodName' : 'Status', 'params' : ['fault'] }, { 'methodName' : 'Status', 'params' : ['error'] },
+                                                  { 'methodName' : 'Unknown', 'params' : [] }])
+        self.assertEqual(results[0], { 'faultCode' : 12, 'faultString' : "no such slice" })
+        self.assertEqual(results[1]['faultCode'], 1)
+        self.assertEqual(results[2]['faultCode'], 1)
+        results = self._call('system.multicall', [{ 'methodName' : 'Status' }, { 'methodName' : 'Status', 'params' : ['urn:a'] }])
+        self.assertEqual(results[0]['faultCode'], 1) # malformed call
+        self.assertEqual(results[1], [{ 'urn' : 'urn:a' }])
+
+    def testTooManyCalls(self):
+        calls = [{ 'methodName' : 'Status', 'params' : ['urn:a'] }] * (MAX_CALLS + 1)
+        fault = self.assertFault(1, 'system.multicall', calls)
+        self.assertTrue('too many calls' in fault.faultString)
+        self.assertEqual(len(self._call('system.multicall', calls[:MAX_CALLS])), MAX_CALLS)
+
+    def testNestedMulticall(self):
+        results = self._call('system.multicall', [{ 'methodName' : 'system.multicall', 'params' : [[{ 'methodName' : 'Status', 'params' : ['urn:a'] }]] },
+                                                  { 'methodName' : 'Status', 'params' : ['urn:a'] }])
+        self.assertEqual(results[0]['faultCode'], 1)
+        self.assertTrue('nested' in results[0]['faultString'])
+        self.assertEqual(results[1], [{ 'urn' : 'urn:a' }])
+
+    def testPrivateAndServiceInterfaceMethods(self):
+        for method in ['setDelegate', 'requestCertificate', '_dispatch', '_listMethods']:
+            self.assertFault(1, method)
+            self.assertEqual(self._call('system.multicall', [{ 'methodName' : method, 'params' : [] }])[0]['faultCode'], 1)
+
+    def testIntrospection(self):
+        methods = self._call('system.listMethods')
+        self.assertTrue('Status' in methods)
+        self.assertTrue('system.multicall' in methods)
+        for method in ['setDelegate', 'requestCertificate', '_dispatch']:
+            self.assertFalse(method in methods)
+        self.assertEqual(self._call('system.methodHelp', 'Status'), "Returns the status of the slice.")
+        self.assertEqual(self._call('system.methodHelp', 'setDelegate'), "")
+
+class FastCodecMulticallTest(MulticallTest):
+    codec = 'fast'
+
+if __name__ == '__main__':
+    unittest.main()
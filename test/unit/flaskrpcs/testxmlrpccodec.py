@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import sys
+import datetime
+import threading
+import unittest
+import xmlrpclib
+from os.path import dirname, join, normpath
+
+sys.path.insert(0, normpath(join(dirname(__file__), '..')))
+import amsoiltest
+amsoiltest.addPluginPath('flaskrpcs')
+import xmlrpccodec
+
+class Resource(object):
+    def __init__(self):
+        self.name = 'r1'
+        self.size = 3
+
+LARGE = 'x<&>' * xmlrpccodec.LARGE_STRING
+
+VALUES = [
+    'plain', '', 'a<b & c>d', LARGE, u'unicode \xe9€', u'ascii unicode',
+    0, -1, 2**31 - 1, -2**31, 5L, True, False, 1.5, -0.1, 1e100,
+    [], [1, 'a', [2, []]], (1, 2), {}, { 'a' : 1, u'\xe9' : [u'\xe9'], 'a<b' : { 'c' : LARGE } },
+    xmlrpclib.DateTime('20130102T03:04:05'), datetime.datetime(2013, 1, 2, 3, 4, 5), xmlrpclib.Binary('\x00\xff binary'),
+    Resource(),
+    [{ 'geni_sliver_urn' : 'urn:publicid:IDN+am+sliver+1', 'geni_expires' : '2013-01-02T03:04:05Z' }] * 3 ]
+
+class FastCodecTest(unittest.TestCase):
+    def setUp(self):
+        self._fast = xmlrpccodec.FastCodec()
+        self._reference = xmlrpccodec.XmlrpclibCodec()
+
+    def assertSameDump(self, params, **kwargs):
+        self.assertEqual(self._fast.dumps(params, **kwargs), self._reference.dumps(params, **kwargs))
+
+    def assertSameLoad(self, data):
+        self.assertEqual(self._fast.loads(data), self._reference.loads(data))
+
+    def testDumpsIsByteIdentical(self):
+        for value in VALUES:
+            self.assertSameDump((value,), methodresponse=1)
+            self.assertSameDump((value,), methodname='ListResources')
+            self.assertSameDump((value,), methodresponse=1, encoding='iso-8859-1')
+        self.assertSameDump(tuple(VALUES), methodname=u'Describe')
+        self.assertSameDump(([None, { 'a' : None }],), methodresponse=1, allow_none=True)
+        self.assertSameDump((1, 'a'))
+
+    def testDumpsFault(self):
+        self.assertSameDump(xmlrpclib.Fault(2, 'a <fault> \xe9'))
+        self.assertSameDump(xmlrpclib.Fault(2, u'a <fault> \xe9'), encoding='iso-8859-1')
+
+    def testDumpsErrors(self):
+        recursive = []
+        recursive.append(recursive)
+        for value, error in [(None, TypeError), (2**31, OverflowError), (2L**31, OverflowError), (object(), TypeError),
+                             (type('S', (str,), {})('s'), TypeError), ({ 1 : 'a' }, TypeError), (recursive, TypeError)]:
+            self.assertRaises(error, self._reference.dumps, (value,))
+            self.assertRaises(error, self._fast.dumps, (value,))
+        self.assertRaises(AssertionError, self._fast.dumps, (1, 2), methodresponse=1)
+
+    def testLoadsRoundTrip(self):
+        for value in VALUES:
+            self.assertSameLoad(xmlrpclib.dumps((value,), methodname='Describe'))
+            self.assertSameLoad(xmlrpclib.dumps((value,), methodresponse=1))
+        self.assertSameLoad(xmlrpclib.dumps(([None, { 'a' : None }],), methodresponse=1, allow_none=True))
+        self.assertSameLoad(xmlrpclib.dumps((u'\xe9',), methodname='GetVersion', encoding='iso-8859-1'))
+
+    def testLoadsTypes(self):
+        params, method = self._fast.loads(xmlrpclib.dumps(('a', u'\xe9', 1, True, {}), methodname='GetVersion'))
+        self.assertEqual(method, 'GetVersion')
+        self.assertEqual([type(value) for value in params], [str, unicode, int, bool, dict])
+
+    def testLoadsUntypedValuesAndIntegerVariants(self):
+        data = """<?xml version='1.0'?><methodCall><methodName>m</methodName><params>
+            <param><value>untyped</value></param><param><value><i4>1</i4></value></param><param><value><i8>2</i8></value></param>
+            <param><value><string></string></value></param><param><value><array><data></data></array></value></param>
+            </params></methodCall>"""
+        self.assertEqual(self._fast.loads(data), (('untyped', 1, 2, '', []), 'm'))
+
+    def testLoadsFault(self):
+        data = xmlrpclib.dumps(xmlrpclib.Fault(3, 'failed'))
+        self.assertRaises(xmlrpclib.Fault, self._fast.loads, data)
+        try:
+            self._fast.loads(data)
+        except xmlrpclib.Fault, e:
+            self.assertEqual((e.faultCode, e.faultString), (3, 'failed'))
+
+    def testLoadsRejectsUnknownTypes(self):
+        data = "<?xml version='1.0'?><methodCall><methodName>m</methodName><params><param><value><unknown>1</unknown></value></param></params></methodCall>"
+        self.assertRaises(xmlrpclib.ResponseError, self._fast.loads, data)
+
+    def testLoadsRejectsBadValues(self):
+        for value in ['<boolean>2</boolean>', '<int>a</int>']:
+            data = "<?xml version='1.0'?><methodCall><methodName>m</methodName><params><param><value>%s</value></param></params></methodCall>" % (value,)
+            self.assertRaises((TypeError, ValueError), self._fast.loads, data)
+
+    def testLoadsDoesNotResolveEntities(self):
+        data = """<?xml version='1.0'?><!DOCTYPE m [<!ENTITY e SYSTEM "file:///etc/passwd">]>
+            <methodCall><methodName>m</methodName><params><param><value><string>&e;</string></value></param></params></methodCall>"""
+        try:
+            params, method = self._fast.loads(data)
+        except Exception:
+            return # rejecting the document is fine, too
+        self.assertFalse('root' in repr(params))
+
+    def testLoadsFromSeveralThreads(self):
+        data = [xmlrpclib.dumps(({ 'thread' : i, 'values' : range(100) },), 'm%i' % (i,)) for i in range(8)]
+        failures = []
+        def load(i):
+            try:
+                for n in range(50):
+                    params, method = self._fast.loads(data[i])
+                    if (method != 'm%i' % (i,)) or (params[0]['thread'] != i):
+                        failures.append((i, method, params))
+            except Exception, e:
+                failures.append((i, e))
+        threads = [threading.Thread(target=load, args=(i,)) for i in range(len(data))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+
+    def testGetCodec(self):
+        self.assertTrue(isinstance(xmlrpccodec.getCodec('fast'), xmlrpccodec.FastCodec))
+        self.assertTrue(isinstance(xmlrpccodec.getCodec('xmlrpclib'), xmlrpccodec.XmlrpclibCodec))
+        self.assertEqual(type(xmlrpccodec.getCodec('unknown')), xmlrpccodec.CODECS[xmlrpccodec.DEFAULT_CODEC])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import sys
+import zlib
+import time
+import base64
+import Queue
+import threading
+import unittest
+from os.path import dirname, join, normpath
+
+sys.path.insert(0, normpath(join(dirname(__file__), '..')))
+import amsoiltest
+amsoiltest.addPluginPath('geniv3rpc')
+
+from g3rpc import adcache
+
+ADVERTISEMENT = '<rspec type="advertisement">%s</rspec>' % ('<node/>' * 100,)
+
+class Builder(object):
+    """Counts the calls and returns a new advertisement each time."""
+    def __init__(self, prefix=ADVERTISEMENT):
+        self.prefix = prefix
+        self.calls = 0
+    def __call__(self):
+        self.calls += 1
+        return self.prefix + str(self.calls)
+
+class AdvertisementCacheTest(amsoiltest.TestCase):
+    def setUp(self):
+        self._config = self.registerService('config', amsoiltest.ConfigStub({ 'geniv3rpc.ad_cache_ttl' : 60, 'geniv3rpc.ad_cache_generation' : 'initial', 'geniv3rpc.compress_level' : 6 }))
+        self._cache = adcache.AdvertisementCache()
+        self._build = Builder()
+
+    def testHit(self):
+        first = self._cache.get(('geni', '3'), self._build)
+        self.assertEqual(self._cache.get(('geni', '3'), self._build), first)
+        self.assertEqual(self._build.calls, 1)
+        self._cache.get(('geni', '2'), self._build) # other key
+        self.assertEqual(self._build.calls, 2)
+
+    def testExpiry(self):
+        self._cache.get('key', self._build)
+        self._cache._entries['key'].expires = time.time() - 1
+        self.assertEqual(self._cache.get('key', self._build), ADVERTISEMENT + '2')
+        self.assertEqual(self._build.calls, 2)
+
+    def testDisabled(self):
+        self._config.values['geniv3rpc.ad_cache_ttl'] = 0
+        self._cache.get('key', self._build)
+        self._cache.get('key', self._build)
+        self.assertEqual(self._build.calls, 2)
+        self.assertEqual(zlib.decompress(base64.b64decode(self._cache.get('key', self._build, True))), ADVERTISEMENT + '3')
+
+    def testInvalidate(self):
+        self._cache.get('key', self._build)
+        self._cache.invalidate()
+        self.assertNotEqual(self._config.values['geniv3rpc.ad_cache_generation'], 'initial')
+        self.assertEqual(self._cache.get('key', self._build), ADVERTISEMENT + '2')
+
+    def testInvalidateCreatesNewGenerations(self):
+        generations = set()
+        for index in range(10):
+            self._cache.invalidate()
+            generations.add(self._config.values['geniv3rpc.ad_cache_generation'])
+        self.assertEqual(len(generations), 10)
+
+    def testGenerationChangedByOtherProcess(self):
+        self._cache.get('key', self._build)
+        self._config.values['geniv3rpc.ad_cache_generation'] = 'other'
+        self.assertEqual(self._cache.get('key', self._build), ADVERTISEMENT + '2')
+        self.assertEqual(self._cache.get('key', self._build), ADVERTISEMENT + '2')
+
+    def testInvalidatedWhileBuilding(self):
+        def build():
+            self._config.values['geniv3rpc.ad_cache_generation'] = 'other'
+            return self._build()
+        self.assertEqual(self._cache.get('key', build), ADVERTISEMENT + '1') # the caller gets the result, but it is not cached
+        self.assertEqual(self._cache.get('key', self._build), ADVERTISEMENT + '2')
+
+    def testConcurrentMissesBuildOnce(self):
+        def slowBuild():
+            time.sleep(0.2)
+            return self._build()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self._cache.get('key', slowBuild))) for index in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self._build.calls, 1)
+        self.assertEqual(results, [ADVERTISEMENT + '1'] * 5)
+
+    def _countCompressions(self):
+        """Returns the list of advertisements compressed by this test (the compressor threads of the other tests may still be running)."""
+        self._build = Builder(ADVERTISEMENT + self.id())
+        compressions = []
+        def countingCompress(rspec, compress=adcache.compress):
+            if rspec.startswith(self._build.prefix):
+                compressions.append(rspec)
+            return compress(rspec)
+        adcache.compress = countingCompress
+        self.addCleanup(setattr, adcache, 'compress', countingCompress.func_defaults[0])
+        return compressions
+
+    def testCompressed(self):
+        compressed = self._cache.get('key', self._build, True)
+        self.assertEqual(zlib.decompress(base64.b64decode(compressed)), ADVERTISEMENT + '1')
+        self.assertEqual(compressed, adcache.compress(ADVERTISEMENT + '1'))
+        self.assertEqual(self._cache._entries['key'].compressed, compressed)
+        self.assertEqual(self._cache.get('key', self._build, True), compressed)
+        self.assertEqual(self._cache.get('key', self._build), ADVERTISEMENT + '1')
+        self.assertEqual(self._build.calls, 1)
+
+    def testMissCompressesInline(self):
+        compressions = self._countCompressions()
+        self._cache.get('key', self._build, True)
+        self.assertEqual(compressions, [self._build.prefix + '1'])
+        self.assertEqual(self._cache._pending, None) # nothing was handed to the compressor thread
+
+    def testCompressorTooSlow(self):
+        compressions = self._countCompressions()
+        self._cache._compressorPid = adcache.os.getpid() # pretend the compressor runs, but never compresses
+        self._cache._pending = Queue.Queue()
+        self._cache.get('key', self._build)
+        compressed = self._cache.get('key', self._build, True) # does not wait for the compressor
+        self.assertEqual(zlib.decompress(base64.b64decode(compressed)), self._build.prefix + '1')
+        self._cache._pending.get().getCompressed() # what the compressor would do
+        self.assertEqual(compressions, [self._build.prefix + '1'])
+
+    def testCompressedOnce(self):
+        compressions = self._countCompressions()
+        self._cache.get('key', self._build) # compressed by the compressor thread or by the next request
+        compressed = self._cache.get('key', self._build, True)
+        self.assertEqual(compressed, self._cache.get('key', self._build, True))
+        self.assertEqual(compressions, [self._build.prefix + '1'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import sys
+import time
+import datetime
+import unittest
+from os.path import dirname, join, normpath
+
+from OpenSSL import crypto
+
+sys.path.insert(0, normpath(join(dirname(__file__), '..')))
+import amsoiltest
+amsoiltest.addPluginPath('geniv3rpc')
+
+from g3rpc import credcache
+
+class CertificateStub(object):
+    """Stands in for ext.sfa.trust.certificate.Certificate (only the wrapped pyOpenSSL certificate is used)."""
+    def __init__(self, expires):
+        self.cert = crypto.X509()
+        self.cert.set_notAfter(expires.strftime('%Y%m%d%H%M%SZ'))
+
+class CredentialStub(object):
+    """Stands in for ext.sfa.trust.credential.Credential."""
+    def __init__(self, expires, callerExpires, objectExpires):
+        self._expires, self._callerExpires, self._objectExpires = expires, callerExpires, objectExpires
+    def get_expiration(self):
+        return self._expires
+    def get_gid_caller(self):
+        return CertificateStub(self._callerExpires)
+    def get_gid_object(self):
+        return CertificateStub(self._objectExpires)
+
+def inHours(hours):
+    return (datetime.datetime.utcnow() + datetime.timedelta(hours=hours)).replace(microsecond=0)
+
+class CacheKeyTest(unittest.TestCase):
+    def testSameParameters(self):
+        self.assertEqual(credcache.cache_key('cert', ['c1', 'c2'], 'urn:slice', ('p',), '/roots'),
+                         credcache.cache_key('cert', ['c1', 'c2'], 'urn:slice', ('p',), '/roots'))
+        self.assertEqual(credcache.cache_key(u'cert', [u'c1'], u'urn:slice', (), u'/roots'), credcache.cache_key('cert', ['c1'], 'urn:slice', (), '/roots'))
+        self.assertEqual(credcache.cache_key('cert', ['c1'], None, (), '/roots'), credcache.cache_key('cert', ['c1'], '', (), '/roots'))
+
+    def testDifferentParameters(self):
+        keys = set([
+            credcache.cache_key('cert', ['c1', 'c2'], 'urn:slice', ('p',), '/roots'),
+            credcache.cache_key('cert2', ['c1', 'c2'], 'urn:slice', ('p',), '/roots'),
+            credcache.cache_key('cert', ['c1'], 'urn:slice', ('c2', 'p'), '/roots'), # a credential moved to the privileges
+            credcache.cache_key('cert', ['c1c2'], 'urn:slice', ('p',), '/roots'), # concatenated credentials
+            credcache.cache_key('cert', ['c2', 'c1'], 'urn:slice', ('p',), '/roots'),
+            credcache.cache_key('cert', ['c1', 'c2'], 'urn:slice2', ('p',), '/roots'),
+            credcache.cache_key('cert', ['c1', 'c2'], 'urn:slice', ('p', 'q'), '/roots'),
+            credcache.cache_key('cert', ['c1', 'c2'], 'urn:slice', ('p',), '/roots2')])
+        self.assertEqual(len(keys), 8)
+
+class ExpirationTest(unittest.TestCase):
+    def testEarliestExpiry(self):
+        for earliest in range(4):
+            hours = [10, 10, 10, 10]
+            hours[earliest] = 1
+            credentials = [CredentialStub(inHours(hours[1]), inHours(hours[2]), inHours(hours[3])), CredentialStub(inHours(20), inHours(20), inHours(20))]
+            self.assertEqual(credcache.expiration(CertificateStub(inHours(hours[0])), credentials), inHours(1))
+
+class CredentialCacheTest(amsoiltest.TestCase):
+    def setUp(self):
+        self._config = self.registerService('config', amsoiltest.ConfigStub({ 'geniv3rpc.auth_cache_size' : 2, 'geniv3rpc.auth_cache_ttl' : 3600 }))
+        self._cache = credcache.CredentialCache()
+
+    def testHit(self):
+        self.assertEqual(self._cache.get('a'), None)
+        self._cache.put('a', 'result', inHours(1))
+        self.assertEqual(self._cache.get('a'), 'result')
+
+    def testLeastRecentlyUsedIsDropped(self):
+        self._cache.put('a', 'ra', inHours(1))
+        self._cache.put('b', 'rb', inHours(1))
+        self._cache.get('a')
+        self._cache.put('c', 'rc', inHours(1))
+        self.assertEqual([self._cache.get('a'), self._cache.get('b'), self._cache.get('c')], ['ra', None, 'rc'])
+
+    def testExpired(self):
+        self._cache.put('a', 'result', inHours(-1))
+        self.assertEqual(self._cache.get('a'), None)
+        self._cache.put('b', 'result', datetime.datetime.utcnow() + datetime.timedelta(seconds=0.2))
+        self.assertEqual(self._cache.get('b'), 'result')
+        time.sleep(0.3)
+        self.assertEqual(self._cache.get('b'), None)
+
+    def testTTL(self):
+        self._config.values['geniv3rpc.auth_cache_ttl'] = 0.2
+        self._cache.put('a', 'result', inHours(1))
+        time.sleep(0.3)
+        self.assertEqual(self._cache.get('a'), None)
+
+    def testDisabled(self):
+        self._config.values['geniv3rpc.auth_cache_size'] = 0
+        self._cache.put('a', 'result', inHours(1))
+        self.assertEqual(self._cache.get('a'), None)
+
+    def testClear(self):
+        self._cache.put('a', 'result', inHours(1))
+        self._cache.clear()
+        self.assertEqual(self._cache.get('a'), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+import shutil
+import datetime
+import unittest
+from os.path import dirname, join, normpath
+
+from OpenSSL import crypto
+
+sys.path.insert(0, normpath(join(dirname(__file__), '..')))
+import amsoiltest
+amsoiltest.addPluginPath('geniv3rpc')
+
+from g3rpc import truststore, credcache
+import ext.sfa.trust.gid as gid
+
+def makeCertificate(commonName, issuer=None):
+    """Returns (PEM, key) of a new certificate. It is self-signed, unless {issuer} (certificate, key) is given."""
+    key = crypto.PKey()
+    key.generate_key(crypto.TYPE_RSA, 2048)
+    cert = crypto.X509()
+    cert.get_subject().CN = commonName
+    cert.set_serial_number(int(time.time() * 1000))
+    cert.gmtime_adj_notBefore(0)
+    cert.gmtime_adj_notAfter(3600)
+    cert.set_pubkey(key)
+    if issuer:
+        issuerCert, issuerKey = issuer
+        cert.set_issuer(issuerCert.get_subject())
+        cert.sign(issuerKey, 'sha256')
+    else:
+        cert.set_issuer(cert.get_subject())
+        cert.sign(key, 'sha256')
+    return cert, key
+
+def writePEM(path, cert):
+    with open(path, 'w') as f:
+        f.write(crypto.dump_certificate(crypto.FILETYPE_PEM, cert))
+
+class TrustStoreTest(amsoiltest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._rootA = makeCertificate('root-a')
+        cls._rootB = makeCertificate('root-b')
+        cls._user = makeCertificate('user', cls._rootA)
+
+    def setUp(self):
+        self._rootsPath = amsoiltest.mkdtemp()
+        writePEM(join(self._rootsPath, 'a.pem'), self._rootA[0])
+        writePEM(join(self._rootsPath, 'b.pem'), self._rootB[0])
+        self._config = self.registerService('config', amsoiltest.ConfigStub({ 'geniv3rpc.cert_root' : self._rootsPath,
+                                                                              'geniv3rpc.auth_cache_size' : 10, 'geniv3rpc.auth_cache_ttl' : 3600 }))
+        self._store = truststore.TrustStore()
+        userPath = join(amsoiltest.TMP_DIR, 'user.pem')
+        writePEM(userPath, self._user[0])
+        self._userGID = gid.GID(filename=userPath)
+
+    def tearDown(self):
+        shutil.rmtree(self._rootsPath)
+
+    def _touch(self, path):
+        """Moves the modification time forward (the file system's resolution may be too coarse to notice a change otherwise)."""
+        mtime = os.stat(path).st_mtime + 10
+        os.utime(path, (mtime, mtime))
+
+    def testRoots(self):
+        roots = self._store.get_roots()
+        self.assertEqual(len(roots), 2)
+        self.assertEqual(sorted([root.cert.get_subject().CN for root in roots]), ['root-a', 'root-b'])
+        self.assertEqual(roots.get_filenames(), [join(self._rootsPath, 'a.pem'), join(self._rootsPath, 'b.pem')])
+
+    def testIssuers(self):
+        roots = self._store.get_roots()
+        self.assertEqual([root.cert.get_subject().CN for root in roots.get_issuers(self._userGID)], ['root-a'])
+        self.assertEqual([root.cert.get_subject().CN for root in roots.get_issuers(list(roots)[1])], ['root-b'])
+
+    def testSkippedFiles(self):
+        with open(join(self._rootsPath, 'README'), 'w') as f:
+            f.write("not a certificate")
+        with open(join(self._rootsPath, truststore.CATED_CERTS_FILENAME), 'w') as f:
+            f.write(crypto.dump_certificate(crypto.FILETYPE_PEM, self._rootA[0]))
+        os.mkdir(join(self._rootsPath, 'subfolder'))
+        self.assertEqual(len(self._store.get_roots()), 2)
+
+    def testSingleFile(self):
+        self._config.values['geniv3rpc.cert_root'] = join(self._rootsPath, 'a.pem')
+        self.assertEqual(len(self._store.get_roots()), 1)
+
+    def testMissingFolder(self):
+        self._config.values['geniv3rpc.cert_root'] = join(self._rootsPath, 'missing')
+        self.assertRaises(IOError, self._store.get_roots)
+
+    def testHit(self):
+        roots = self._store.get_roots()
+        credcache.cache.put('key', 'result', datetime.datetime.utcnow() + datetime.timedelta(hours=1))
+        self.assertTrue(self._store.get_roots() is roots)
+        self.assertEqual(credcache.cache.get('key'), 'result')
+
+    def testReloadWhenFolderChanges(self):
+        roots = self._store.get_roots()
+        credcache.cache.put('key', 'result', datetime.datetime.utcnow() + datetime.timedelta(hours=1))
+        os.remove(join(self._rootsPath, 'a.pem'))
+        self._touch(self._rootsPath)
+        reloaded = self._store.get_roots()
+        self.assertFalse(reloaded is roots)
+        self.assertEqual(len(reloaded), 1)
+        self.assertEqual(reloaded.get_issuers(self._userGID), [])
+        self.assertEqual(credcache.cache.get('key'), None) # verifications with the old roots are dropped
+
+    def testReloadWhenPathChanges(self):
+        roots = self._store.get_roots()
+        self._config.values['geniv3rpc.cert_root'] = join(self._rootsPath, 'b.pem')
+        self.assertEqual(len(self._store.get_roots()), 1)
+
+    def testExplicitReload(self):
+        roots = self._store.get_roots()
+        self._store.reload()
+        self.assertFalse(self._store.get_roots() is roots)
+
+if __name__ == '__main__':
+    unittest.main()
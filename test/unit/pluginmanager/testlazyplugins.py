@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import shutil
+import threading
+import unittest
+from os.path import dirname, join, normpath
+
+sys.path.insert(0, normpath(join(dirname(__file__), '..')))
+import amsoiltest
+import amsoil.core.pluginmanager as pm
+
+PLUGIN_CODE = """
+import time
+import amsoil.core.pluginmanager as pm
+class Service(object):
+    ready = False
+def setup():
+    service = Service()
+    pm.registerService(%(name)r, service)
+    assert pm.getService(%(name)r) is service # the setup itself gets its service right away
+    time.sleep(%(sleep)r)
+    service.ready = True
+"""
+
+class LazyPluginTest(unittest.TestCase):
+    def setUp(self):
+        self._pluginsPath = amsoiltest.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._pluginsPath)
+
+    def _lazyPlugin(self, sleep=0.0):
+        """Returns the name of the service implemented by a new lazy plugin (which has not been loaded)."""
+        name = 'lazy%s' % (self.id().split('.')[-1],)
+        path = join(self._pluginsPath, name)
+        os.mkdir(path)
+        with open(join(path, 'plugin.py'), 'w') as f:
+            f.write(PLUGIN_CODE % { 'name' : name, 'sleep' : sleep })
+        pluginInfo = pm.PluginInfo(path, { 'implements' : [name], 'loads-after' : [], 'requires' : [], 'lazy' : True })
+        pm._addServiceProviders([pluginInfo])
+        pm._deferredServices[name] = pluginInfo
+        self.addCleanup(pm._serviceProviders.pop, name, None)
+        self.addCleanup(pm._deferredServices.pop, name, None)
+        self.addCleanup(pm._serviceRegistry.pop, name, None)
+        return name
+
+    def testLoadedOnFirstUse(self):
+        name = self._lazyPlugin()
+        self.assertFalse(name in pm._serviceRegistry)
+        self.assertTrue(pm.getService(name).ready)
+        self.assertFalse(name in pm._deferredServices)
+
+    def testProxy(self):
+        name = self._lazyPlugin()
+        proxy = pm.getService(name, lazy=True)
+        self.assertTrue(isinstance(proxy, pm.ServiceProxy))
+        self.assertFalse(name in pm._serviceRegistry) # not loaded until the proxy is used
+        self.assertTrue(proxy.ready)
+        self.assertFalse(isinstance(pm.getService(name, lazy=True), pm.ServiceProxy))
+
+    def testServiceIsHandedOutAfterSetup(self):
+        """A thread asking for the service while the setup is running must wait for the setup, even though the service is registered already."""
+        name = self._lazyPlugin(0.3)
+        ready = []
+        first = threading.Thread(target=lambda: ready.append(pm.getService(name).ready))
+        first.start()
+        while not name in pm._serviceRegistry:
+            time.sleep(0.01)
+        second = threading.Thread(target=lambda: ready.append(pm.getService(name).ready))
+        second.start()
+        first.join()
+        second.join()
+        self.assertEqual(ready, [True, True])
+
+if __name__ == '__main__':
+    unittest.main()
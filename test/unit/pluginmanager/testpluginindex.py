@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import shutil
+import unittest
+from os.path import dirname, join, normpath
+
+sys.path.insert(0, normpath(join(dirname(__file__), '..')))
+import amsoiltest
+import amsoil.core.pluginmanager as pm
+
+class PluginIndexTest(unittest.TestCase):
+    def setUp(self):
+        self._pluginsPath = amsoiltest.mkdtemp()
+        self._indexPath = join(amsoiltest.TMP_DIR, 'plugin_index.json')
+        self._addPlugin('aa', ['A'], [])
+        self._addPlugin('bb', ['B'], ['A'])
+        pm._serviceProviders.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self._pluginsPath)
+        if os.path.exists(self._indexPath):
+            os.remove(self._indexPath)
+        pm._serviceProviders.clear()
+
+    def _addPlugin(self, name, implements, loadsAfter):
+        path = join(self._pluginsPath, name)
+        os.mkdir(path)
+        with open(join(path, 'plugin.py'), 'w') as f:
+            f.write("def setup():\n    pass\n")
+        self._writeManifest(name, implements, loadsAfter)
+
+    def _writeManifest(self, name, implements, loadsAfter):
+        with open(join(self._pluginsPath, name, pm.MANIFEST_FILENAME), 'w') as f:
+            json.dump({ 'implements' : implements, 'loads-after' : loadsAfter, 'requires' : [] }, f)
+
+    def _touch(self, path):
+        """Moves the modification time forward (the file system's resolution may be too coarse to notice a change otherwise)."""
+        mtime = os.stat(path).st_mtime + 10
+        os.utime(path, (mtime, mtime))
+
+    def _writeIndex(self):
+        plugins = pm._readManifests(self._pluginsPath)
+        pm._addServiceProviders(plugins)
+        plugins = pm._SetupScheduler(plugins, 1).loadOrder()
+        pm._writePluginIndex(self._pluginsPath, self._indexPath, plugins)
+        pm._serviceProviders.clear()
+        return plugins
+
+    def testRoundTrip(self):
+        plugins = self._writeIndex()
+        loaded = pm._loadPluginIndex(self._pluginsPath, self._indexPath)
+        self.assertEqual([p.pluginName for p in loaded], [p.pluginName for p in plugins])
+        self.assertEqual([p.manifest for p in loaded], [p.manifest for p in plugins])
+        self.assertEqual(loaded[0].pluginName, 'aa') # in load order
+        loaded[0].setup() # the bootstrap module is found via the index
+        self.assertTrue(loaded[0].loaded)
+
+    def testMissingIndex(self):
+        self.assertEqual(pm._loadPluginIndex(self._pluginsPath, self._indexPath), None)
+
+    def testCorruptIndex(self):
+        with open(self._indexPath, 'w') as f:
+            f.write("{ not json")
+        self.assertEqual(pm._loadPluginIndex(self._pluginsPath, self._indexPath), None)
+
+    def testOtherPluginsPath(self):
+        self._writeIndex()
+        self.assertEqual(pm._loadPluginIndex(join(self._pluginsPath, 'aa'), self._indexPath), None)
+
+    def testChangedManifestInvalidates(self):
+        self._writeIndex()
+        self._writeManifest('bb', ['B', 'B2'], ['A'])
+        self._touch(join(self._pluginsPath, 'bb', pm.MANIFEST_FILENAME))
+        self.assertEqual(pm._loadPluginIndex(self._pluginsPath, self._indexPath), None)
+
+    def testAddedPluginInvalidates(self):
+        self._writeIndex()
+        self._addPlugin('cc', ['C'], [])
+        self._touch(self._pluginsPath)
+        self.assertEqual(pm._loadPluginIndex(self._pluginsPath, self._indexPath), None)
+
+    def testRemovedPluginInvalidates(self):
+        self._writeIndex()
+        shutil.rmtree(join(self._pluginsPath, 'bb'))
+        self._touch(self._pluginsPath)
+        self.assertEqual(pm._loadPluginIndex(self._pluginsPath, self._indexPath), None)
+
+    def testOtherIndexVersion(self):
+        self._writeIndex()
+        with open(self._indexPath) as f:
+            index = json.load(f)
+        index['version'] = pm.PLUGIN_INDEX_VERSION + 1
+        with open(self._indexPath, 'w') as f:
+            json.dump(index, f)
+        self.assertEqual(pm._loadPluginIndex(self._pluginsPath, self._indexPath), None)
+
+if __name__ == '__main__':
+    unittest.main()
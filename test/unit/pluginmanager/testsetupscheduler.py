@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import types
+import shutil
+import unittest
+from os.path import dirname, join, normpath
+
+sys.path.insert(0, normpath(join(dirname(__file__), '..')))
+import amsoiltest
+import amsoil.core.pluginmanager as pm
+
+# the plugins created by the tests record their setup calls here
+setuplog = types.ModuleType('setuplog')
+sys.modules['setuplog'] = setuplog
+
+PLUGIN_CODE = """
+import time
+import setuplog
+def setup():
+    setuplog.started[%(name)r] = time.time()
+    time.sleep(%(sleep)r)
+    if %(fail)r:
+        raise RuntimeError("setup of %(name)s failed")
+    setuplog.finished[%(name)r] = time.time()
+"""
+
+class SetupSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self._pluginsPath = amsoiltest.mkdtemp()
+        setuplog.started = {}
+        setuplog.finished = {}
+        pm._serviceProviders.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self._pluginsPath)
+        pm._serviceProviders.clear()
+
+    def _plugin(self, name, implements, loadsAfter, sleep=0.0, fail=False):
+        path = join(self._pluginsPath, name)
+        os.mkdir(path)
+        with open(join(path, 'plugin.py'), 'w') as f:
+            f.write(PLUGIN_CODE % { 'name' : name, 'sleep' : sleep, 'fail' : fail })
+        return pm.PluginInfo(path, { 'implements' : implements, 'loads-after' : loadsAfter, 'requires' : [] })
+
+    def _diamond(self, sleep=0.0):
+        """a <- b, a <- c, (b, c) <- d"""
+        plugins = [self._plugin('dd', ['D'], ['B', 'C'], sleep), self._plugin('bb', ['B'], ['A'], sleep),
+                   self._plugin('cc', ['C'], ['A'], sleep), self._plugin('aa', ['A'], [], sleep)]
+        pm._addServiceProviders(plugins)
+        return plugins
+
+    def _assertDependenciesFinishedFirst(self, plugins):
+        for pluginInfo in plugins:
+            for serviceName in pluginInfo.loadsAfter:
+                dependency = pm._serviceProviders[serviceName].pluginName
+                self.assertTrue(setuplog.finished[dependency] <= setuplog.started[pluginInfo.pluginName],
+                                "%s was set up before %s" % (pluginInfo.pluginName, dependency))
+
+    def testLoadOrder(self):
+        plugins = self._diamond()
+        order = [p.pluginName for p in pm._SetupScheduler(plugins, 1).loadOrder()]
+        self.assertEqual(order[0], 'aa')
+        self.assertEqual(order[-1], 'dd')
+        self.assertEqual(set(order), set(['aa', 'bb', 'cc', 'dd']))
+
+    def testSequentialSetup(self):
+        plugins = self._diamond()
+        pm._SetupScheduler(plugins, 1).run()
+        self.assertTrue(all([p.loaded for p in plugins]))
+        self._assertDependenciesFinishedFirst(plugins)
+
+    def testConcurrentSetup(self):
+        plugins = self._diamond(sleep=0.2)
+        pm._SetupScheduler(plugins, 4).run()
+        self.assertTrue(all([p.loaded for p in plugins]))
+        self._assertDependenciesFinishedFirst(plugins)
+        # bb and cc do not depend on each other, so they run at the same time
+        self.assertTrue(setuplog.started['cc'] < setuplog.finished['bb'])
+        self.assertTrue(setuplog.started['bb'] < setuplog.finished['cc'])
+
+    def testCycleIsDetectedBeforeAnySetup(self):
+        plugins = [self._plugin('xx', ['X'], ['Y']), self._plugin('yy', ['Y'], ['X']), self._plugin('zz', ['Z'], [])]
+        pm._addServiceProviders(plugins)
+        scheduler = pm._SetupScheduler(plugins, 4)
+        self.assertRaises(pm.PluginLoadAfterResolvingError, scheduler.loadOrder)
+        self.assertRaises(pm.PluginLoadAfterResolvingError, scheduler.run)
+        self.assertEqual(setuplog.started, {})
+
+    def testUnknownService(self):
+        plugins = [self._plugin('xx', ['X'], ['UNKNOWN'])]
+        pm._addServiceProviders(plugins)
+        self.assertRaises(pm.PluginLoadAfterResolvingError, pm._SetupScheduler, plugins, 1)
+
+    def testFailingSetupStopsDependents(self):
+        plugins = [self._plugin('aa', ['A'], [], fail=True), self._plugin('bb', ['B'], ['A']), self._plugin('cc', ['C'], [], sleep=0.1)]
+        pm._addServiceProviders(plugins)
+        self.assertRaises(RuntimeError, pm._SetupScheduler(plugins, 4).run)
+        self.assertFalse('bb' in setuplog.started)
+        self.assertTrue('cc' in setuplog.finished) # independent setups which were running are finished
+
+    def testPluginsOutsideTheListMustBeLoaded(self):
+        plugins = self._diamond()
+        # aa is not in the list and not loaded (e.g. a lazy plugin which has not been set up)
+        self.assertRaises(pm.PluginLoadAfterResolvingError, pm._SetupScheduler, plugins[:3], 1)
+
+if __name__ == '__main__':
+    unittest.main()
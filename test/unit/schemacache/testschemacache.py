@@ -0,0 +1,140 @@
+import sys
+import json
+import shutil
+import urllib2
+import unittest
+from os.path import dirname, join, normpath
+
+from lxml import etree
+
+sys.path.insert(0, normpath(join(dirname(__file__), '..')))
+import amsoiltest
+amsoiltest.addPluginPath('schemacache')
+
+import schemacache
+from amsoil.config import ROOT_PATH
+
+GENI = 'http://www.geni.net/resources/rspec/3'
+CATALOG_PATH = join(ROOT_PATH, 'deploy/schemas')
+
+REQUEST = """<rspec xmlns="http://www.geni.net/resources/rspec/3" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:ext="http://example.org/ext"
+       xsi:schemaLocation="http://www.geni.net/resources/rspec/3 http://www.geni.net/resources/rspec/3/request.xsd" type="request">
+  <node client_id="node-1" exclusive="true">
+    <sliver_type name="raw-pc"/>
+    <interface client_id="node-1:if0"><ip address="10.0.0.1" netmask="255.255.255.0" type="ipv4"/></interface>
+    <ext:extension value="1"/>
+  </node>
+  <link client_id="link-1"><interface_ref client_id="node-1:if0"/></link>
+</rspec>"""
+
+NOTE_SCHEMA = """<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" targetNamespace="http://example.org/note" xmlns:note="http://example.org/note" elementFormDefault="qualified">
+  <xs:include schemaLocation="http://example.org/note-types.xsd"/>
+  <xs:element name="note" type="note:NoteType"/>
+</xs:schema>"""
+
+NOTE_TYPES_SCHEMA = """<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" targetNamespace="http://example.org/note" elementFormDefault="qualified">
+  <xs:complexType name="NoteType"><xs:attribute name="text" use="required" type="xs:string"/></xs:complexType>
+</xs:schema>"""
+
+class URLOpenStub(object):
+    """Stands in for urllib2.urlopen. Counts the downloads and serves the documents in {documents} (url -> data), other URLs fail."""
+    def __init__(self, documents):
+        self.documents = documents
+        self.urls = []
+
+    def __call__(self, url, timeout=None):
+        self.urls.append(url)
+        if url not in self.documents:
+            raise urllib2.URLError("no network in the tests")
+        return self
+
+    def read(self):
+        return self.documents[self.urls[-1]]
+
+class SchemaCacheTest(amsoiltest.TestCase):
+    def setUp(self):
+        self._config = self.registerService('config', amsoiltest.ConfigStub({ 'schemacache.download' : True, 'schemacache.download_timeout' : 1,
+                                                                              'schemacache.negative_ttl' : 300 }))
+        self._urlopen = URLOpenStub({})
+        schemacache.urllib2.urlopen = self._urlopen
+        self.addCleanup(setattr, schemacache.urllib2, 'urlopen', urllib2.urlopen)
+        self._path = amsoiltest.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._path)
+
+    def _writeCatalog(self, documents):
+        """Writes a catalog with the given {documents} (url -> data) into the temporary folder."""
+        catalog = {}
+        for index, (url, data) in enumerate(documents.items()):
+            catalog[url] = 'schema%i.xsd' % (index,)
+            with open(join(self._path, catalog[url]), 'wb') as f:
+                f.write(data)
+        with open(join(self._path, schemacache.CATALOG_FILE), 'wb') as f:
+            json.dump(catalog, f)
+
+    def testShippedCatalogIsPreloaded(self):
+        cache = schemacache.SchemaCache(CATALOG_PATH)
+        for name in ['ad.xsd', 'request.xsd', 'manifest.xsd']:
+            self.assertTrue('%s/%s' % (GENI, name) in cache._schemas)
+        self.assertTrue(cache.getSchema('%s/request.xsd' % (GENI,)) is cache._schemas['%s/request.xsd' % (GENI,)])
+        self.assertEqual(self._urlopen.urls, []) # the includes are resolved from the catalog
+
+    def testIncludesFromTheCatalog(self):
+        self._writeCatalog({ 'http://example.org/note.xsd' : NOTE_SCHEMA, 'http://example.org/note-types.xsd' : NOTE_TYPES_SCHEMA })
+        cache = schemacache.SchemaCache(self._path)
+        schema = cache.getSchema('http://example.org/note.xsd')
+        self.assertTrue(schema.validate(etree.fromstring('<note xmlns="http://example.org/note" text="a"/>')))
+        self.assertFalse(schema.validate(etree.fromstring('<note xmlns="http://example.org/note"/>')))
+        self.assertEqual(self._urlopen.urls, [])
+
+    def testDownloadOnce(self):
+        self._urlopen.documents = { 'http://example.org/note.xsd' : NOTE_SCHEMA, 'http://example.org/note-types.xsd' : NOTE_TYPES_SCHEMA }
+        cache = schemacache.SchemaCache(self._path)
+        schema = cache.getSchema('http://example.org/note.xsd')
+        self.assertFalse(schema is None)
+        self.assertTrue(cache.getSchema('http://example.org/note.xsd') is schema)
+        self.assertEqual(sorted(self._urlopen.urls), ['http://example.org/note-types.xsd', 'http://example.org/note.xsd'])
+        other = schemacache.SchemaCache(self._path) # e.g. another process or a restart
+        self.assertFalse(other.getSchema('http://example.org/note.xsd') is None)
+        self.assertEqual(len(self._urlopen.urls), 2)
+        with open(join(self._path, schemacache.CATALOG_FILE)) as f:
+            self.assertEqual(sorted(json.load(f).keys()), ['http://example.org/note-types.xsd', 'http://example.org/note.xsd'])
+
+    def testFailedDownloadIsNotRepeated(self):
+        cache = schemacache.SchemaCache(self._path)
+        self.assertEqual(cache.getSchema('http://example.org/missing.xsd'), None)
+        self.assertEqual(cache.getSchema('http://example.org/missing.xsd'), None)
+        self.assertEqual(self._urlopen.urls, ['http://example.org/missing.xsd'])
+        cache._failed['http://example.org/missing.xsd'] -= 301 # the negative_ttl has passed
+        self.assertEqual(cache.getSchema('http://example.org/missing.xsd'), None)
+        self.assertEqual(len(self._urlopen.urls), 2)
+
+    def testNoDownloadsIfDisabled(self):
+        self._config.values['schemacache.download'] = False
+        cache = schemacache.SchemaCache(self._path)
+        self.assertEqual(cache.getSchema('http://example.org/note.xsd'), None)
+        self.assertEqual(self._urlopen.urls, [])
+
+    def testValidate(self):
+        cache = schemacache.SchemaCache(CATALOG_PATH)
+        self.assertEqual(cache.validate(etree.fromstring(REQUEST)), [])
+
+    def testValidateReportsProblems(self):
+        cache = schemacache.SchemaCache(CATALOG_PATH)
+        problems = cache.validate(etree.fromstring(REQUEST.replace('<node client_id="node-1" ', '<node ')))
+        self.assertEqual(len(problems), 1)
+        self.assertTrue(problems[0].startswith('%s/request.xsd: line 3: ' % (GENI,)))
+        self.assertTrue('client_id' in problems[0])
+        problems = cache.validate(etree.fromstring(REQUEST.replace('type="request"', 'type="manifest"').replace('request.xsd', 'manifest.xsd')))
+        self.assertEqual(problems, []) # the manifest schema accepts the request elements, too
+        self.assertEqual(len(cache.validate(etree.fromstring(REQUEST.replace('type="request"', 'type="manifest"')))), 1)
+
+    def testValidateWithoutSchema(self):
+        cache = schemacache.SchemaCache(self._path)
+        self.assertEqual(cache.validate(etree.fromstring('<rspec/>')), ["document does not specify any schema locations"])
+        document = etree.fromstring(REQUEST.replace('%s/request.xsd' % (GENI,), 'http://example.org/missing.xsd'))
+        self.assertEqual(cache.validate(document), ["schema http://example.org/missing.xsd is not available"])
+
+if __name__ == '__main__':
+    unittest.main()